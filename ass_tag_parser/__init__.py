@@ -1,7 +1,8 @@
 from .ass_composer import compose_ass
-from .ass_parser import parse_ass
+from .ass_parser import is_plain_text, parse_ass
 from .ass_struct import *
 from .draw_composer import compose_draw_commands
 from .draw_parser import parse_draw_commands
 from .draw_struct import *
 from .errors import *
+from .font_scanner import scan_ass_fonts
@@ -618,3 +618,12 @@ def _parse_ass(ctx: _ParseContext) -> T.Iterable[AssItem]:
 def parse_ass(text: str) -> T.List[AssItem]:
     ctx = _ParseContext(io=MyIO(text))
     return list(_parse_ass(ctx))
+
+
+def is_plain_text(text: str) -> bool:
+    """Whether parse_ass(text) is only the text itself, without any tags.
+
+    Text without curly braces and backslashes needs no parsing, so callers
+    can use it as is instead of calling parse_ass().
+    """
+    return "{" not in text and "}" not in text and "\\" not in text
@@ -0,0 +1,188 @@
+import re
+import typing as T
+
+from ass_tag_parser.ass_parser import (
+    _PARSING_MAP,
+    _animation_args,
+    _fade_complex_args,
+    _fade_simple_args,
+    _move_args,
+    _pos_args,
+)
+from ass_tag_parser.ass_struct import *
+from ass_tag_parser.errors import *
+
+# Tags that change which font the following text is rendered with, plus \p
+# which decides whether the following text is rendered at all.
+_FONT_TAGS = {
+    AssTagFontName,
+    AssTagBold,
+    AssTagItalic,
+    AssTagResetStyle,
+    AssTagDraw,
+}
+_COMPLEX_ARG_FUNCS = {
+    _pos_args,
+    _move_args,
+    _fade_simple_args,
+    _fade_complex_args,
+    _animation_args,
+}
+
+# Tag prefixes grouped by the character after the backslash, in the order
+# parse_ass tries them, so the first matching prefix names the same tag.
+# Each entry is (prefix, class if it is a font tag, takes complex arguments).
+_PREFIXES: T.Dict[str, T.List[T.Tuple[str, T.Optional[type], bool]]] = {}
+for _prefix in (r"\clip", r"\iclip"):
+    _PREFIXES.setdefault(_prefix[1], []).append((_prefix, None, True))
+for _prefix, _cls, _arg_func in _PARSING_MAP:
+    _PREFIXES.setdefault(_prefix[1], []).append(
+        (
+            _prefix,
+            _cls if _cls in _FONT_TAGS else None,
+            _arg_func in _COMPLEX_ARG_FUNCS,
+        )
+    )
+
+_ARG_END = re.compile(r"[\\()]")
+_BRACKET = re.compile(r"[()]")
+_COMMENT_ESCAPES = {"N", "n", "h", "\\"}
+
+
+def _single_arg(
+    text: str, pos: int, end: int, tag: str
+) -> T.Tuple[T.Optional[str], int]:
+    if pos < end and text[pos] == "(":
+        raise BadAssTagArgument(pos, f"{tag} doesn't take complex arguments")
+    match = _ARG_END.search(text, pos, end)
+    arg_end = match.start() if match else end
+    return text[pos:arg_end] or None, arg_end
+
+
+def _positive_int_arg(
+    text: str, pos: int, end: int, tag: str
+) -> T.Tuple[T.Optional[int], int]:
+    arg, pos = _single_arg(text, pos, end, tag)
+    if arg is None:
+        return None, pos
+    try:
+        value = int(arg)
+    except ValueError:
+        raise BadAssTagArgument(pos, f"{tag} requires an integer")
+    if value < 0:
+        raise BadAssTagArgument(pos, f"{tag} takes only positive integers")
+    return value, pos
+
+
+def _scan_font_tag(
+    cls: type, tag: str, text: str, pos: int, end: int
+) -> T.Tuple[AssTag, int]:
+    if cls is AssTagBold:
+        weight, pos = _positive_int_arg(text, pos, end, tag)
+        return (
+            AssTagBold(
+                None if weight is None else weight != 0,
+                None if weight is None or weight in {0, 1} else weight,
+            ),
+            pos,
+        )
+    if cls is AssTagDraw:
+        scale, pos = _positive_int_arg(text, pos, end, tag)
+        return AssTagDraw(scale), pos
+    arg, pos = _single_arg(text, pos, end, tag)
+    if cls is AssTagItalic:
+        if arg is None:
+            return AssTagItalic(None), pos
+        if arg == "0":
+            return AssTagItalic(False), pos
+        if arg == "1":
+            return AssTagItalic(True), pos
+        raise BadAssTagArgument(pos, f"{tag} requires a boolean")
+    return cls(arg), pos
+
+
+def _skip_complex_args(text: str, pos: int, end: int) -> int:
+    if pos >= end or text[pos] != "(":
+        raise BadAssTagArgument(min(pos + 1, end), "expected brace")
+    brackets = 0
+    for match in _BRACKET.finditer(text, pos, end):
+        brackets += 1 if match.group() == "(" else -1
+        if brackets == 0:
+            return match.end()
+    raise BadAssTagArgument(end, "unterminated brace")
+
+
+def _scan_ass_tags(text: str, pos: int, end: int) -> T.Iterator[AssTag]:
+    while True:
+        # Everything up to the next backslash is either a comment or the
+        # argument of a tag this scanner doesn't care about.
+        pos = text.find("\\", pos, end)
+        if pos == -1:
+            return
+        char = text[pos + 1] if pos + 1 < end else ""
+        if char in _COMMENT_ESCAPES:
+            pos += 2
+            continue
+
+        for prefix, cls, complex_args in _PREFIXES.get(char, ()):
+            if text.startswith(prefix, pos, end):
+                break
+        else:
+            raise UnknownTag(pos)
+
+        arg_pos = pos + len(prefix)
+        if cls is not None:
+            tag, pos = _scan_font_tag(cls, prefix, text, arg_pos, end)
+            yield tag
+        elif complex_args:
+            # \t(...) can hold other tags, skip it as a whole.
+            pos = _skip_complex_args(text, arg_pos, end)
+        elif arg_pos < end and text[arg_pos] == "(":
+            raise BadAssTagArgument(
+                arg_pos, f"{prefix} doesn't take complex arguments"
+            )
+        else:
+            pos = arg_pos
+
+
+def scan_ass_fonts(text: str) -> T.Iterator[AssItem]:
+    """Yield only the items of text that decide which font renders what.
+
+    This is a lightweight alternative to parse_ass() for callers that only
+    need fonts: it yields AssTagFontName, AssTagBold, AssTagItalic and
+    AssTagResetStyle in block order, and AssText for text that is actually
+    rendered. Other tags are matched with the same prefix rules as parse_ass()
+    but skipped without parsing their arguments, and \\t(...) is skipped
+    whole. Text after \\p with a positive scale is a drawing and is skipped
+    until \\p0. Items have no meta.
+
+    Malformed curly braces, unknown tags and bad arguments of the yielded
+    tags raise the same errors as parse_ass().
+    """
+    drawing = False
+    length = len(text)
+    pos = 0
+    while pos < length:
+        if text[pos] == "{":
+            end = text.find("}", pos + 1)
+            brace = text.find("{", pos + 1, length if end == -1 else end)
+            if brace != -1:
+                raise UnexpectedCurlyBrace(brace)
+            if end == -1:
+                raise UnterminatedCurlyBrace(length)
+            for tag in _scan_ass_tags(text, pos + 1, end):
+                if isinstance(tag, AssTagDraw):
+                    drawing = bool(tag.scale)
+                else:
+                    yield tag
+            pos = end + 1
+        else:
+            end = text.find("{", pos)
+            if end == -1:
+                end = length
+            brace = text.find("}", pos, end)
+            if brace != -1:
+                raise UnexpectedCurlyBrace(brace)
+            if not drawing:
+                yield AssText(text[pos:end])
+            pos = end
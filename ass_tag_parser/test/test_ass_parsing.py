@@ -844,3 +844,31 @@ def test_parsing_invalid_ass_line(source_line: str, error_msg: str) -> None:
     with pytest.raises(ParseError) as exc_info:
         parse_ass(source_line)
     assert error_msg == str(exc_info.value)
+
+
+@pytest.mark.parametrize(
+    "source_line,expected",
+    [
+        (r"", True),
+        (r"test", True),
+        (r"(test) with, punctuation!", True),
+        (r"日本語のテキスト", True),
+        (r"{}", False),
+        (r"{\b1}test", False),
+        (r"test}", False),
+        (r"\b1", False),
+        (r"line\Nbreak", False),
+        (r"hard\hspace", False),
+    ],
+)
+def test_is_plain_text(source_line: str, expected: bool) -> None:
+    assert expected == is_plain_text(source_line)
+
+
+@pytest.mark.parametrize(
+    "source_line",
+    [r"test", r"(test) with, punctuation!", r"日本語のテキスト", r"  "],
+)
+def test_plain_text_matches_full_parse(source_line: str) -> None:
+    assert is_plain_text(source_line)
+    assert [AssText(source_line)] == parse_ass(source_line)
@@ -0,0 +1,116 @@
+import pytest
+
+from ass_tag_parser import *
+
+
+@pytest.mark.parametrize(
+    "source_line,expected_items",
+    [
+        (r"", []),
+        (r"test", [AssText("test")]),
+        (r"\b1", [AssText(r"\b1")]),
+        (r"{}", []),
+        (r"{comment}test", [AssText("test")]),
+        (
+            r"{\fnArial\b1}a{\i1\b0}b",
+            [
+                AssTagFontName("Arial"),
+                AssTagBold(True),
+                AssText("a"),
+                AssTagItalic(True),
+                AssTagBold(False),
+                AssText("b"),
+            ],
+        ),
+        (r"{\b700}a", [AssTagBold(True, 700), AssText("a")]),
+        (r"{\fn}a", [AssTagFontName(None), AssText("a")]),
+        (r"{\fnMS Gothic}a", [AssTagFontName("MS Gothic"), AssText("a")]),
+        (
+            r"{\rAlt}a{\r}b",
+            [
+                AssTagResetStyle("Alt"),
+                AssText("a"),
+                AssTagResetStyle(None),
+                AssText("b"),
+            ],
+        ),
+        (r"{\bord2\blur1\be1\i1}a", [AssTagItalic(True), AssText("a")]),
+        (r"{\iclip(1,2,3,4)\i0}a", [AssTagItalic(False), AssText("a")]),
+        (r"{\t(0,1,\fnX\b1)}a", [AssText("a")]),
+        (r"{\pos(1,2)\N\h\\\fnX}a", [AssTagFontName("X"), AssText("a")]),
+        (
+            r"{\b1(\fnX)}a",
+            [AssTagBold(True), AssTagFontName("X"), AssText("a")],
+        ),
+        (r"{\p1}m 0 0 l 1 1{\p0}a", [AssText("a")]),
+        (r"{\p1}m 0 0{\fs5}l 1 1{\p0}a", [AssText("a")]),
+        (r"{\p0}a", [AssText("a")]),
+        (r"{\pbo2}a", [AssText("a")]),
+    ],
+)
+def test_scanning_valid_ass_line(
+    source_line: str, expected_items: T.List[AssItem]
+) -> None:
+    assert expected_items == list(scan_ass_fonts(source_line))
+
+
+@pytest.mark.parametrize(
+    "source_line",
+    [
+        r"{\fnArial}a{\fscx50\b1}b{\i1\rAlt}c",
+        r"{\an8\c&HFFFFFF&\fnX}a\Nb{\r\i}c",
+        r"{\t(\i1)\k10\i0}a{\fax1\b0}b",
+        r"{\clip(m 0 0 l 1 1)}a{\fn}b",
+        r"x{\b0}y{\b}z",
+    ],
+)
+def test_scanning_matches_full_parse(source_line: str) -> None:
+    expected_items = [
+        item
+        for item in parse_ass(source_line)
+        if isinstance(
+            item,
+            (
+                AssTagFontName,
+                AssTagBold,
+                AssTagItalic,
+                AssTagResetStyle,
+                AssText,
+            ),
+        )
+    ]
+    assert expected_items == list(scan_ass_fonts(source_line))
+
+
+@pytest.mark.parametrize(
+    "source_line,error_msg",
+    [
+        (r"{", r"syntax error at pos 1: unterminated curly brace"),
+        (r"}", r"syntax error at pos 0: unexpected curly brace"),
+        (r"{{}", r"syntax error at pos 1: unexpected curly brace"),
+        (r"{\zz}", r"syntax error at pos 1: unrecognized tag"),
+        (r"{\b-1}", r"syntax error at pos 5: \b takes only positive integers"),
+        (r"{\b1comment}", r"syntax error at pos 11: \b requires an integer"),
+        (r"{\i2}", r"syntax error at pos 4: \i requires a boolean"),
+        (r"{\p-1}", r"syntax error at pos 5: \p takes only positive integers"),
+        (
+            r"{\fn(x)}",
+            r"syntax error at pos 4: \fn doesn't take complex arguments",
+        ),
+        (
+            r"{\bord(2)}",
+            r"syntax error at pos 6: \bord doesn't take complex arguments",
+        ),
+        (r"{\pos}", r"syntax error at pos 5: expected brace"),
+        (r"{\t(\b1}", r"syntax error at pos 7: unterminated brace"),
+    ],
+)
+def test_scanning_invalid_ass_line(source_line: str, error_msg: str) -> None:
+    with pytest.raises(ParseError) as exc_info:
+        list(scan_ass_fonts(source_line))
+    assert error_msg == str(exc_info.value)
+
+
+def test_scanning_skips_arguments_of_other_tags() -> None:
+    # Arguments of tags that don't affect fonts aren't validated.
+    assert [AssText("a")] == list(scan_ass_fonts(r"{\bord-4\pos(x)}a"))
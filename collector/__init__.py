@@ -0,0 +1,6 @@
+from .cache import DEFAULT_CACHE_FILE, ResultCache
+from .files import walk_subtitles
+from .fonts import DEFAULT_MEMO_SIZE, FontAccumulator, font_style_name
+from .logs import setup_logger
+from .report import CollectionReport, collect_fonts
+from .watch import watch_fonts
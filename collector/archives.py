@@ -0,0 +1,165 @@
+import calendar
+import fnmatch
+import lzma
+import os
+import posixpath
+import tarfile
+import zipfile
+import zlib
+
+# Archives which are walked like directories, their members are read without extracting them
+ARCHIVE_PATTERNS = ['*.zip', '*.tar', '*.tar.gz', '*.tgz', '*.tar.bz2', '*.tbz2', '*.tar.xz', '*.txz']
+
+# Errors of broken archives which are neither OSError nor ValueError
+ARCHIVE_ERRORS = (tarfile.TarError, zipfile.BadZipFile, EOFError, zlib.error, lzma.LZMAError)
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def is_archive_name(name):
+    name = name.lower()
+    return any(fnmatch.fnmatchcase(name, pattern) for pattern in ARCHIVE_PATTERNS)
+
+
+def split_archive_path(full_file_path):
+    """
+    Split the path of an archive member, e.g. /subs/release.zip/Episode 01.ass.
+
+    Returns (archive_path, member_name), or None when the path is not inside an archive.
+    """
+
+    parts = full_file_path.split(os.sep)
+    for i in range(1, len(parts) - 1):
+        if is_archive_name(parts[i]):
+            archive_path = os.sep.join(parts[:i + 1])
+            if os.path.isfile(archive_path):
+                return archive_path, '/'.join(parts[i + 1:])
+    return None
+
+
+class OpenArchive:
+    """
+    A zip or tar archive opened for reading its members.
+
+    members maps every regular file name to its (size, mtime) signature, the
+    mtime of zip members is (mtime_ns, CRC) as zip times are only precise to
+    2 seconds. Zip members are read in any order, tar members are read fastest
+    in the archive order, as compressed tar files are decompressed from the
+    start to go back.
+    """
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.members = {}
+        try:
+            if zipfile.is_zipfile(archive_path):
+                self.zip = zipfile.ZipFile(archive_path)
+                self.tar = None
+                for info in self.zip.infolist():
+                    if not info.is_dir():
+                        mtime = calendar.timegm(info.date_time + (0, 0, 0))
+                        self.members[info.filename] = (info.file_size, (mtime * 1000000000, info.CRC))
+            else:
+                self.zip = None
+                self.tar = tarfile.open(archive_path)
+                self.tar_members = {}
+                for info in self.tar.getmembers():
+                    if info.isfile():
+                        # Names made with tar -C dir . start with ./
+                        name = posixpath.normpath(info.name)
+                        self.members[name] = (info.size, int(info.mtime) * 1000000000)
+                        self.tar_members[name] = info
+        except ARCHIVE_ERRORS as err:
+            raise ArchiveError('Cannot read archive {}: {}'.format(archive_path, err))
+
+    def read(self, member_name):
+        if member_name not in self.members:
+            raise FileNotFoundError('No member {} in archive {}'.format(member_name, self.archive_path))
+        try:
+            if self.zip is not None:
+                return self.zip.read(member_name)
+            return self.tar.extractfile(self.tar_members[member_name]).read()
+        except ARCHIVE_ERRORS as err:
+            raise ArchiveError('Cannot read {} in archive {}: {}'.format(member_name, self.archive_path, err))
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+        else:
+            self.tar.close()
+
+
+# The archive opened last by this process, members of the same archive come one after another
+open_archive_cache = None
+
+
+def open_archive(archive_path):
+    """
+    Open an archive, or return it if it is the one opened last in this process.
+
+    The archive is reopened when it changed since it was opened, and by worker
+    processes which inherited it when forked: a forked file shares its read
+    position with the parent, so both would read at each other's positions.
+    """
+    global open_archive_cache
+
+    stat = os.stat(archive_path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    if open_archive_cache is not None:
+        cached_path, cached_signature, process_id, archive = open_archive_cache
+        open_archive_cache = None
+        if process_id != os.getpid():
+            # Opened by the parent, leave its file alone
+            pass
+        elif cached_path == archive_path and cached_signature == signature:
+            open_archive_cache = (cached_path, cached_signature, process_id, archive)
+            return archive
+        else:
+            archive.close()
+
+    archive = OpenArchive(archive_path)
+    open_archive_cache = (archive_path, signature, os.getpid(), archive)
+    return archive
+
+
+def read_member(full_file_path):
+    # Read the content of an archive member from its path, see split_archive_path()
+    archive_path, member_name = split_archive_path(full_file_path)
+    return open_archive(archive_path).read(member_name)
+
+
+def file_signature(full_file_path):
+    """
+    Get the (size, mtime) signature of a file or of an archive member, see OpenArchive.
+
+    Raises OSError or ArchiveError when the file, the archive or the member cannot be read.
+    """
+
+    archive_member = split_archive_path(full_file_path)
+    if archive_member is None:
+        stat = os.stat(full_file_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    archive_path, member_name = archive_member
+    signature = open_archive(archive_path).members.get(member_name)
+    if signature is None:
+        raise FileNotFoundError('No member {} in archive {}'.format(member_name, archive_path))
+    return signature
+
+
+def walk_archive(archive_path, relative_archive_path):
+    """
+    Yield (full_file_path, relative_path) of every regular file in an archive, in the archive order.
+
+    Paths are the archive path followed by the member name, as if the archive was a directory.
+    Raises OSError or ArchiveError when the archive cannot be read.
+    """
+
+    for member_name in open_archive(archive_path).members:
+        # Unsafe names are skipped, they cannot be read back from their path
+        if member_name.startswith('/') or '..' in member_name.split('/'):
+            continue
+        yield (os.path.join(archive_path, *member_name.split('/')),
+               relative_archive_path + '/' + member_name)
@@ -0,0 +1,35 @@
+import contextlib
+import os
+import pickle
+
+
+@contextlib.contextmanager
+def open_atomically(path, mode='wb', encoding=None):
+    """
+    Open a temporary file which replaces path once the with block is done.
+
+    Readers never see a partly written file, and an interrupted write keeps
+    the old file. The temporary file is path + '.tmp', removed on errors.
+    """
+
+    temporary_path = path + '.tmp'
+    try:
+        with open(temporary_path, mode, encoding=encoding) as fp:
+            yield fp
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporary_path)
+        raise
+    os.replace(temporary_path, path)
+
+
+def pickle_atomically(obj, path):
+    # Pickle obj to path with open_atomically()
+    with open_atomically(path) as fp:
+        pickle.dump(obj, fp, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def save_atomically(subtitle, path):
+    # Write an SSAFile as an ASS file with open_atomically()
+    with open_atomically(path, 'w', encoding='utf-8-sig') as fp:
+        subtitle.to_file(fp, 'ass')
@@ -0,0 +1,101 @@
+import copy
+import logging
+import pickle
+
+from .atomic import pickle_atomically
+from .checkpoint import CheckpointJournal
+from .logs import LogMessage, logger
+
+# Default file where parsed results are kept between runs
+DEFAULT_CACHE_FILE = 'collect_cache.pickle'
+
+
+class ResultCache:
+    """
+    Parsed files results kept on disk between runs.
+
+    Every entry is keyed by the file full path and stores the file signature
+    (size, mtime, content hash), its fonts, its unparsed events, its error,
+    its styles table and the warnings logged while parsing it, so they are logged again when the
+    cached result is used. Matroska files are not hashed, see parse_file_cached().
+
+    New entries are also appended to a checkpoint journal next to the cache file
+    while the run goes, save() removes it. When resume is True, the journal left by
+    an interrupted run is read back, so its files are used as cached results
+    instead of being parsed again, otherwise it is dropped.
+    """
+
+    # Increase this when parse_file() results change, to drop old caches
+    VERSION = 9
+
+    def __init__(self, cache_path, variant=None, resume=False):
+        self.cache_path = cache_path
+        # Options which change parse_file() results, a cache made with other options is dropped
+        self.version = (self.VERSION, variant)
+        self.entries = {}
+        # Entries of files found in this run, only these are saved back
+        self.used_entries = {}
+
+        try:
+            with open(cache_path, 'rb') as fp:
+                version, entries = pickle.load(fp)
+            if version == self.version:
+                self.entries = entries
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError) as err:
+            logger.warning(LogMessage('Cannot read cache file {CACHE_FILE}, it will be rebuilt.\n Error message is "{ERROR}"', {
+                'CACHE_FILE': cache_path,
+                'ERROR': err,
+            }))
+
+        self.journal = CheckpointJournal(cache_path + '.journal', self.version)
+        if resume:
+            journal_entries = self.journal.read()
+            self.entries.update(journal_entries)
+            logger.info(LogMessage('Resuming from checkpoint journal {JOURNAL}, {FILES_COUNT} files were already collected', {
+                'JOURNAL': self.journal.journal_path,
+                'FILES_COUNT': len(journal_entries),
+            }))
+        elif self.journal.segment_names():
+            logger.warning(LogMessage('Dropping the checkpoint journal {JOURNAL} of an interrupted run, '
+                                      'use --resume to continue it', {
+                                          'JOURNAL': self.journal.journal_path,
+                                      }))
+            self.journal.clear()
+
+    def signature(self, full_file_path):
+        entry = self.entries.get(full_file_path)
+        return None if entry is None else entry['signature']
+
+    def get(self, full_file_path, signature):
+        entry = self.entries[full_file_path]
+        entry['signature'] = signature
+        self.used_entries[full_file_path] = entry
+        return entry['fonts'], entry['unparsed'], entry['error'], entry['styles'], entry['records']
+
+    def remove(self, full_file_path):
+        # Forget a deleted file, so its entry is not saved again
+        self.entries.pop(full_file_path, None)
+        self.used_entries.pop(full_file_path, None)
+
+    def put(self, full_file_path, signature, file_fonts, unparsed_events, error, style_table, records):
+        entry = {
+            'signature': signature,
+            'fonts': file_fonts,
+            'unparsed': unparsed_events,
+            'error': error,
+            'styles': style_table,
+            # Copies, the log listener thread may still be formatting the records while they are pickled
+            'records': [copy.copy(record) for record in records if record.levelno >= logging.WARNING],
+        }
+        self.entries[full_file_path] = entry
+        self.used_entries[full_file_path] = entry
+        self.journal.add(full_file_path, entry)
+
+    def save(self):
+        # An interrupted run keeps the old cache
+        pickle_atomically((self.version, self.used_entries), self.cache_path)
+        # Every result is in the cache file now
+        self.journal.clear()
+
@@ -0,0 +1,97 @@
+import os
+import pickle
+import time
+
+from .atomic import pickle_atomically
+from .logs import LogMessage, logger
+
+# How often the new results are appended to the checkpoint journal, by files count or by time
+CHECKPOINT_FILES = 200
+CHECKPOINT_SECONDS = 30.0
+
+
+class CheckpointJournal:
+    """
+    Results of the files collected by the current run, appended to a directory while the run goes.
+
+    Every flush() writes the results added since the last one to a new numbered
+    segment file, written to a temporary file first and renamed, so a killed run
+    leaves only whole segments. read() merges the segments back in order, so an
+    interrupted run can restart where it stopped. Entries are the ResultCache ones.
+    """
+
+    def __init__(self, journal_path, version):
+        self.journal_path = journal_path
+        # Segments made with another version are skipped by read()
+        self.version = version
+        # Entries added since the last flush
+        self.pending_entries = {}
+        self.segments_count = 0
+        self.flushed_at = time.monotonic()
+
+    def segment_names(self):
+        # Names of the written segments in the journal order, temporary files are left out
+        try:
+            names = os.listdir(self.journal_path)
+        except FileNotFoundError:
+            return []
+        return sorted(name for name in names if name.endswith('.pickle'))
+
+    def read(self):
+        """
+        Read the entries of all the segments, the latest entry of every file wins.
+
+        New segments are numbered after the read ones, so the journal keeps growing.
+        """
+
+        entries = {}
+        segment_names = self.segment_names()
+        for name in segment_names:
+            try:
+                with open(os.path.join(self.journal_path, name), 'rb') as fp:
+                    version, segment_entries = pickle.load(fp)
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError) as err:
+                logger.warning(LogMessage('Cannot read checkpoint segment {SEGMENT_FILE}, the next ones are skipped.\n'
+                                          ' Error message is "{ERROR}"', {
+                                              'SEGMENT_FILE': os.path.join(self.journal_path, name),
+                                              'ERROR': err,
+                                          }))
+                break
+            if version == self.version:
+                entries.update(segment_entries)
+
+        if segment_names:
+            self.segments_count = int(segment_names[-1].split('.')[0]) + 1
+        return entries
+
+    def add(self, full_file_path, entry):
+        # Keep the entry of a file, the journal is flushed once enough files or time went by
+        self.pending_entries[full_file_path] = entry
+        if len(self.pending_entries) >= CHECKPOINT_FILES or \
+                time.monotonic() - self.flushed_at >= CHECKPOINT_SECONDS:
+            self.flush()
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        if not self.pending_entries:
+            return
+
+        os.makedirs(self.journal_path, exist_ok=True)
+        segment_path = os.path.join(self.journal_path, '{:08d}.pickle'.format(self.segments_count))
+        # A killed run never leaves half a segment
+        pickle_atomically((self.version, self.pending_entries), segment_path)
+
+        self.segments_count += 1
+        self.pending_entries = {}
+
+    def clear(self):
+        # Remove the journal once its results are saved elsewhere, or to start from zero
+        self.pending_entries = {}
+        self.segments_count = 0
+        try:
+            names = os.listdir(self.journal_path)
+        except FileNotFoundError:
+            return
+        for name in names:
+            os.remove(os.path.join(self.journal_path, name))
+        os.rmdir(self.journal_path)
@@ -0,0 +1,349 @@
+import argparse
+import logging
+import os
+
+from .atomic import open_atomically, save_atomically
+from .cache import DEFAULT_CACHE_FILE, ResultCache
+from .coverage import DEFAULT_COVERAGE_CACHE_FILE, CoverageCache, CoverageChecker, write_coverage
+from .files import walk_subtitles
+from .font_files import DEFAULT_FONT_INDEX_FILE, FontFileIndex
+from .index import IndexWriter, write_index
+from .fonts import DEFAULT_MEMO_SIZE, font_style_name
+from .logs import LogMessage, logger, setup_logger
+from .partials import PartialBuilder, PartialError, default_shard_name, merge_partials, read_partial
+from .prefetch import DEFAULT_PREFETCH_DEPTH
+from .split import DEFAULT_SPLIT_SIZE
+from .report import collect_fonts
+from .watch import watch_fonts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Collect fonts names and used characters from ass files '
+                                                 'in current directory and sub directories.')
+    parser.add_argument('directory', nargs='?', default='.',
+                        help='Directory to search for subtitles files (default: current directory)')
+    parser.add_argument('--include', action='append', metavar='GLOB',
+                        help='Only collect files matching this glob, can be repeated, e.g. *.mkv reads the '
+                             'SubStation tracks of Matroska files (default: *.ass)')
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB',
+                        help='Skip files and directories matching this glob, can be repeated')
+    parser.add_argument('--max-depth', type=int, default=None,
+                        help='How deep sub directories are searched, 0 means the directory only')
+    parser.add_argument('--archives', action='store_true',
+                        help='Search zip and tar archives like directories, their files are read '
+                             'without extracting them, and named ARCHIVE/MEMBER in logs and reports')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of worker processes used to parse files, '
+                             '0 means one for each CPU (default: 1)')
+    parser.add_argument('--prefetch', type=int, default=DEFAULT_PREFETCH_DEPTH, metavar='FILES',
+                        help='Number of files read ahead by threads while a file is parsed, when parsing in '
+                             'one process, 0 disables it (default: %(default)s)')
+    parser.add_argument('--split-size', type=float, default=DEFAULT_SPLIT_SIZE / (1024 * 1024), metavar='MB',
+                        help='With many worker processes, the Dialogues of files larger than this many '
+                             'megabytes are split into parts of this size parsed by all the workers '
+                             'at once, 0 disables it (default: %(default)s)')
+    parser.add_argument('--memory-budget', type=int, metavar='MB',
+                        help='Keep the character counts of the fonts under about this many megabytes, '
+                             'the rest is written to temporary files (in TMPDIR) and merged while the outputs '
+                             'are written, the outputs are the same. Only runs without the result cache are '
+                             'bounded: the cache holds the fonts and characters of every file in memory, so '
+                             'this needs --no-cache, except with --reduce, and cannot be used with --watch or '
+                             '--map, which keep the results in memory too (default: no limit)')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_FILE,
+                        help='File where parsed files results are kept between runs, '
+                             'unchanged files are not parsed again (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Parse all files and do not read or write the cache file')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue an interrupted run, the files collected before it stopped are read '
+                             'from the checkpoint journal kept next to the cache file instead of being parsed again')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='Do not parse again the files with the same content as another file, the files '
+                             'are all listed and the ones sharing a size are hashed before parsing starts, '
+                             'archive members are always parsed')
+    parser.add_argument('--memo-size', type=int, default=DEFAULT_MEMO_SIZE,
+                        help='Number of parsed Dialogues remembered by each process, '
+                             'repeated Dialogues are not parsed again, 0 disables it (default: %(default)s)')
+    parser.add_argument('--loader', default='scan', choices=['scan', 'pysubs2'],
+                        help='How SubStation files are read, scan reads only the styles and the Style and Text '
+                             'of Dialogues, pysubs2 loads the whole file (default: %(default)s)')
+    parser.add_argument('--tags', default='fonts', choices=['fonts', 'full'],
+                        help='How Dialogue tags are parsed, fonts reads only the tags which change the font, '
+                             'full parses every tag, so a Dialogue with any bad tag is written to '
+                             'unparsed_tags.ass (default: %(default)s)')
+    parser.add_argument('--log-level', default='DEBUG', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help='Lowest level of logged messages, INFO and above skip the per Dialogue '
+                             'debug messages entirely (default: %(default)s)')
+    parser.add_argument('--index', metavar='FILE',
+                        help='Also write an SQLite index of the fonts, styles and characters of every file, '
+                             'which can be queried with python -m collector.index')
+    parser.add_argument('--fonts-dir', action='append', metavar='DIRECTORY',
+                        help='Directory of font files, the file of every collected font is found there '
+                             'and written to font_files.txt, can be repeated')
+    parser.add_argument('--font-index', default=DEFAULT_FONT_INDEX_FILE, metavar='FILE',
+                        help='File where the names of the font files are kept between runs, '
+                             'only new and changed font files are read again (default: %(default)s)')
+    parser.add_argument('--check-glyphs', action='store_true',
+                        help='Check that the font file of every font has glyphs for all its characters, '
+                             'the missing ones are written to missing_glyphs.txt, needs --fonts-dir')
+    parser.add_argument('--glyph-cache', default=DEFAULT_COVERAGE_CACHE_FILE, metavar='FILE',
+                        help='File where the characters of the font files are kept between runs, '
+                             'font files are read again only when their content changed (default: %(default)s)')
+    parser.add_argument('--map', metavar='PARTIAL_FILE',
+                        help='Collect the directory into a partial result file instead of writing output.ass, '
+                             'so every storage node collects its own files, see --reduce')
+    parser.add_argument('--shard', default=default_shard_name(),
+                        help='Name of the files of this node in the partial written by --map, '
+                             'files are named SHARD:PATH once merged (default: %(default)s)')
+    parser.add_argument('--reduce', nargs='+', metavar='PARTIAL_FILE',
+                        help='Merge partial result files written by --map into output.ass and the other '
+                             'reports instead of collecting a directory, partials can be given in any order '
+                             'and more than once')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running, and collect again the added, modified and deleted files '
+                             'when the directory changes, until interrupted')
+    parser.add_argument('--poll-interval', type=float, default=1.0, metavar='SECONDS',
+                        help='How often the directory is checked in watch mode (default: %(default)s)')
+    parser.add_argument('--debounce', type=float, default=1.0, metavar='SECONDS',
+                        help='How long the directory must stay unchanged before collecting again '
+                             'in watch mode, so a burst of saves is collected once (default: %(default)s)')
+    args = parser.parse_args()
+    if args.check_glyphs and not args.fonts_dir:
+        parser.error('--check-glyphs needs --fonts-dir')
+    if args.reduce and (args.map or args.watch or args.index or args.check_glyphs):
+        parser.error('--reduce cannot be used with --map, --watch, --index or --check-glyphs')
+    if args.map and (args.watch or args.check_glyphs):
+        parser.error('--map cannot be used with --watch or --check-glyphs')
+    if args.memory_budget is not None and (args.watch or args.map):
+        parser.error('--memory-budget cannot be used with --watch or --map, they keep the results in memory')
+    if args.memory_budget is not None and not args.no_cache and not args.reduce:
+        parser.error('--memory-budget needs --no-cache, the cache keeps the results of every file in memory')
+    if args.resume and args.no_cache:
+        parser.error('--resume cannot be used with --no-cache, the checkpoint journal is kept with the cache')
+
+    listener = setup_logger(getattr(logging, args.log_level))
+    try:
+        if args.watch:
+            watch(args)
+        elif args.reduce:
+            reduce(args)
+        else:
+            run(args)
+    except KeyboardInterrupt:
+        logger.info('Stopped.')
+    finally:
+        # Write the remaining queued log records
+        listener.stop()
+
+
+def results_variant(args):
+    # Options which change parse_file() results, cached results and partials made with others are not used
+    return args.tags, args.loader
+
+
+def memory_budget(args):
+    # --memory-budget in bytes, or None
+    return None if args.memory_budget is None else args.memory_budget * 1024 * 1024
+
+
+def load_font_index(args, jobs):
+    # Read the new and changed font files of --fonts-dir, None when it is not given
+    if not args.fonts_dir:
+        return None
+    font_index = FontFileIndex(args.font_index)
+    font_index.update(args.fonts_dir, jobs)
+    font_index.save()
+    return font_index
+
+
+def write_font_files(font_files):
+    # One 'Fontname[-bold][-italic]<tab>font file<tab>face index' line for every font which has a file
+    lines = []
+    for font_key, font_file in font_files.items():
+        if font_file is None:
+            logger.warning(LogMessage('Cannot find a font file for {FONT}', {'FONT': font_style_name(font_key)}))
+        else:
+            lines.append('{}\t{}\t{}\n'.format(font_style_name(font_key), *font_file))
+
+    with open_atomically('font_files.txt', 'w', encoding='utf-8') as fp:
+        fp.writelines(lines)
+
+
+def write_frequencies(fonts, path='character_frequencies.txt'):
+    """
+    Write how many times every font uses each of its characters, the most used first.
+
+    Every character has a 'Fontname[-bold][-italic]<tab>U+XXXX<tab>character<tab>count'
+    line, the character is left empty when it is not printable, e.g. a tab.
+    """
+
+    # Written one font at a time, spilled counts are merged while they are written
+    with open_atomically(path, 'w', encoding='utf-8') as fp:
+        for font_key, frequencies in fonts.frequencies():
+            for character, count in frequencies:
+                fp.write('{}\tU+{:04X}\t{}\t{}\n'.format(font_style_name(font_key), ord(character),
+                                                          character if character.isprintable() else '', count))
+
+
+def write_outputs(report, cache=None, font_index=None, checker=None):
+    if cache is not None:
+        cache.save()
+
+    # The collection variable is where organized data will be stored, see CollectionReport.collection()
+    # Spilled fonts are merged one at a time while output.ass is written instead, and are not logged
+    collection = None
+    if not report.fonts.spilled:
+        collection = report.collection()
+
+        # Log the collection of styles info
+        logger.debug(collection)
+
+    # Finally save the data to one ass file, and the unparsed Dialogues to another
+    save_atomically(report.output_ass(collection), 'output.ass')
+    save_atomically(report.unparsed_ass(), 'unparsed_tags.ass')
+    write_frequencies(report.fonts)
+
+    if font_index is not None:
+        write_font_files(font_index.resolve_all(report.fonts))
+
+    if checker is not None:
+        write_coverage(checker)
+        checker.cache.save()
+
+
+def run(args):
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+
+    cache = None if args.no_cache else ResultCache(args.cache, results_variant(args), args.resume)
+
+    font_index = load_font_index(args, jobs)
+
+    # Get all ass files in directory and sub directories, while they are found
+    found_subtitles = walk_subtitles(args.directory, args.include or ['*.ass'], args.exclude, args.max_depth,
+                                       args.archives)
+
+    checker = CoverageChecker(font_index, CoverageCache(args.glyph_cache)) if args.check_glyphs else None
+
+    # Files are added to the index and checked as they are parsed
+    on_file_callbacks = []
+    if checker is not None:
+        on_file_callbacks.append(checker.add_file)
+    index = IndexWriter(args.index) if args.index else None
+    if index is not None:
+        on_file_callbacks.append(index.add_file)
+    partial = PartialBuilder(args.shard, results_variant(args)) if args.map else None
+    if partial is not None:
+        on_file_callbacks.append(partial.add_file)
+        # The warnings and errors are written by --reduce, with the reports
+        logger.addHandler(partial.records)
+
+    def on_file(*file_result):
+        for callback in on_file_callbacks:
+            callback(*file_result)
+
+    try:
+        report = collect_fonts(found_subtitles, jobs=jobs, cache=cache, memo_size=args.memo_size,
+                               scan=args.loader == 'scan', full_tags=args.tags == 'full',
+                               dedupe=args.dedupe, prefetch_depth=args.prefetch,
+                               split_size=int(args.split_size * 1024 * 1024),
+                               memory_budget=memory_budget(args),
+                               on_file=on_file)
+    except BaseException:
+        if index is not None:
+            index.abort()
+        # Keep what was collected so far, so --resume starts from there
+        if cache is not None:
+            cache.journal.flush()
+        raise
+    finally:
+        if partial is not None:
+            logger.removeHandler(partial.records)
+    if index is not None:
+        index.close()
+
+    # The reports are written by --reduce, an empty shard still writes its partial
+    if partial is not None:
+        if cache is not None:
+            cache.save()
+        partial.save(args.map)
+        return
+
+    # Check if there any ass files found
+    if report.files:
+        logger.debug(LogMessage('Found {ASS_FILES_COUNT} ass files', {'ASS_FILES_COUNT': len(report.files)}))
+    else:
+        logger.warning('Cannot find any ass files.')
+        return
+
+    write_outputs(report, cache, font_index, checker)
+
+    # Report the run summary
+    logger.info(LogMessage('Dialogue memo: {HITS} hits, {MISSES} misses', {
+        'HITS': report.summary['memo_hits'],
+        'MISSES': report.summary['memo_misses'],
+    }))
+    if report.summary['prefetch_stalls']:
+        logger.info(LogMessage('Prefetch: waited {STALL_SECONDS:.2f} seconds for {STALLS} files not read yet', {
+            'STALL_SECONDS': report.summary['prefetch_stall_seconds'],
+            'STALLS': report.summary['prefetch_stalls'],
+        }))
+    if report.summary['split_files']:
+        logger.info(LogMessage('{SPLIT_COUNT} large files were split into parts parsed at once', {
+            'SPLIT_COUNT': report.summary['split_files'],
+        }))
+    if report.summary['duplicate_files']:
+        logger.info(LogMessage('{DUPLICATES_COUNT} files have the same content as another file, '
+                               'they were not parsed again', {
+                                   'DUPLICATES_COUNT': report.summary['duplicate_files'],
+                               }))
+
+
+def reduce(args):
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+
+    try:
+        report = merge_partials((read_partial(path) for path in args.reduce), memory_budget(args))
+    except PartialError as err:
+        logger.error(LogMessage('Cannot merge the partial files\n Error message is "{ERROR}"', {'ERROR': err}))
+        return
+
+    if not report.files:
+        logger.warning('Cannot find any ass files.')
+        return
+
+    write_outputs(report, None, load_font_index(args, jobs))
+
+
+def watch(args):
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+
+    cache = None if args.no_cache else ResultCache(args.cache, results_variant(args), args.resume)
+
+    font_index = load_font_index(args, jobs)
+    glyph_cache = CoverageCache(args.glyph_cache) if args.check_glyphs else None
+
+    logger.info(LogMessage('Watching {DIRECTORY} for changes, press Ctrl+C to stop', {
+        'DIRECTORY': os.path.abspath(args.directory),
+    }))
+
+    # The written files must not be collected, or every write would be seen as a change
+    ignored = {os.path.abspath(path) for path in ('output.ass', 'unparsed_tags.ass')}
+
+    def write(report, collection):
+        # Check every file again, the glyph cache keeps it cheap
+        checker = None
+        if glyph_cache is not None:
+            checker = CoverageChecker(font_index, glyph_cache)
+            for file_result in collection.file_results(report.files):
+                checker.add_file(*file_result)
+        write_outputs(report, cache, font_index, checker)
+        if args.index:
+            write_index(args.index, collection.file_results(report.files))
+
+    watch_fonts(args.directory, write,
+                include=args.include or ['*.ass'], exclude=args.exclude, max_depth=args.max_depth,
+                archives=args.archives, ignored=ignored,
+                jobs=jobs, cache=cache, memo_size=args.memo_size,
+                scan=args.loader == 'scan', full_tags=args.tags == 'full', dedupe=args.dedupe,
+                prefetch_depth=args.prefetch, split_size=int(args.split_size * 1024 * 1024),
+                interval=args.poll_interval, debounce=args.debounce)
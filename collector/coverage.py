@@ -0,0 +1,186 @@
+import os
+import pickle
+import struct
+import unicodedata
+
+from .atomic import open_atomically, pickle_atomically
+from .fonts import font_style_name
+from .logs import LogMessage, logger
+from .parsing import file_hash
+from .sfnt import covers, read_font_coverage
+
+# Default file where the parsed cmaps of font files are kept between runs
+DEFAULT_COVERAGE_CACHE_FILE = 'glyph_cache.pickle'
+
+# Control and format characters are never drawn, so fonts do not need glyphs for them
+IGNORED_CATEGORIES = {'Cc', 'Cf'}
+
+
+class CoverageCache:
+    """
+    Codepoints covered by the faces of font files, kept on disk between runs.
+
+    Coverages are keyed by the font file content hash, so a font copied in many
+    directories is parsed once. The hash of every path is kept with the file
+    signature (size, mtime), files are hashed again only when it changed.
+    """
+
+    # Increase this when read_font_coverage() results change, to drop old caches
+    VERSION = 1
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path
+        # (signature, hash) of every font file path
+        self.hashes = {}
+        # Ranges of every face, see read_font_coverage(), or None when unreadable, keyed by hash
+        self.coverages = {}
+
+        if cache_path is None:
+            return
+        try:
+            with open(cache_path, 'rb') as fp:
+                version, hashes, coverages = pickle.load(fp)
+            if version == self.VERSION:
+                self.hashes = hashes
+                self.coverages = coverages
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError) as err:
+            logger.warning(LogMessage('Cannot read glyph cache file {CACHE_FILE}, it will be rebuilt.\n'
+                                      ' Error message is "{ERROR}"', {
+                                          'CACHE_FILE': cache_path,
+                                          'ERROR': err,
+                                      }))
+
+    def font_coverage(self, full_file_path):
+        """
+        Get the codepoint ranges of every face of a font file, reading its cmap tables only when needed.
+
+        Returns None when the file cannot be read.
+        """
+
+        try:
+            stat = os.stat(full_file_path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            entry = self.hashes.get(full_file_path)
+            if entry is not None and entry[0] == signature:
+                content_hash = entry[1]
+            else:
+                content_hash = file_hash(full_file_path)
+                self.hashes[full_file_path] = (signature, content_hash)
+        except OSError as err:
+            logger.warning(LogMessage('Cannot read font file {FILE_NAME}\n Error message is "{ERROR}"', {
+                'FILE_NAME': full_file_path,
+                'ERROR': err,
+            }))
+            return None
+
+        if content_hash not in self.coverages:
+            try:
+                self.coverages[content_hash] = read_font_coverage(full_file_path)
+            except (OSError, ValueError, struct.error) as err:
+                logger.warning(LogMessage('Cannot read the characters of font file {FILE_NAME}\n'
+                                          ' Error message is "{ERROR}"', {
+                                              'FILE_NAME': full_file_path,
+                                              'ERROR': err,
+                                          }))
+                self.coverages[content_hash] = None
+        return self.coverages[content_hash]
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        # Only keep the coverages of files still known, so removed fonts do not grow the cache forever
+        used_hashes = {content_hash for _, content_hash in self.hashes.values()}
+        coverages = {content_hash: coverage for content_hash, coverage in self.coverages.items()
+                     if content_hash in used_hashes}
+        # An interrupted run keeps the old cache
+        pickle_atomically((self.VERSION, self.hashes, coverages), self.cache_path)
+
+
+class CoverageChecker:
+    """
+    Characters used with every font which its font file has no glyph for.
+
+    Fonts are resolved with a FontFileIndex, fonts without a file are not checked.
+    add_file() takes the results of parse_files(), so it can be the on_file of
+    collect_fonts() and files are checked while they are collected. missing_by_file
+    maps every file to {font_key: missing characters}, and missing_by_font every
+    font to the missing characters of all the files.
+    """
+
+    def __init__(self, font_index, cache):
+        self.font_index = font_index
+        self.cache = cache
+        # (full_file_path, face_index) of every font seen, or None
+        self.font_files = {}
+        self.missing_by_file = {}
+        self.missing_by_font = {}
+
+    def font_file(self, font_key):
+        if font_key not in self.font_files:
+            self.font_files[font_key] = self.font_index.resolve(font_key)
+        return self.font_files[font_key]
+
+    def face_coverage(self, font_key):
+        # Codepoint ranges of the face of a font, or None when it has no readable file
+        font_file = self.font_file(font_key)
+        if font_file is None:
+            return None
+        full_file_path, face_index = font_file
+        coverage = self.cache.font_coverage(full_file_path)
+        if coverage is None or face_index >= len(coverage):
+            return None
+        return coverage[face_index]
+
+    def add_file(self, full_file_path, file_fonts, unparsed_events, error, style_table):
+        file_missing = {}
+        for font_key, characters in file_fonts.fonts.items():
+            # Characters of missing styles have no font
+            if font_key[0] is None:
+                continue
+            ranges = self.face_coverage(font_key)
+            if ranges is None:
+                continue
+
+            missing = {character for character in characters
+                       if unicodedata.category(character) not in IGNORED_CATEGORIES
+                       and not covers(ranges, ord(character))}
+            if missing:
+                file_missing[font_key] = missing
+                self.missing_by_font.setdefault(font_key, set()).update(missing)
+
+        if file_missing:
+            self.missing_by_file[full_file_path] = file_missing
+
+
+def format_characters(characters):
+    # 'abc (U+0061 U+0062 U+0063)', sorted by codepoint
+    characters = sorted(characters)
+    return '{} ({})'.format(''.join(characters), ' '.join('U+{:04X}'.format(ord(character))
+                                                          for character in characters))
+
+
+def write_coverage(checker, path='missing_glyphs.txt'):
+    """
+    Write the characters missing from every font file, then the files which use them.
+
+    Every font has a 'Fontname[-bold][-italic]<tab>font file<tab>face index<tab>characters'
+    line, followed by a '<tab>subtitle file<tab>characters' line for every file using them.
+    """
+
+    lines = []
+    for font_key, missing in checker.missing_by_font.items():
+        logger.warning(LogMessage('Font file of {FONT} has no glyph for {COUNT} characters: {CHARACTERS}', {
+            'FONT': font_style_name(font_key),
+            'COUNT': len(missing),
+            'CHARACTERS': ''.join(sorted(missing)),
+        }))
+        lines.append('{}\t{}\t{}\t{}\n'.format(font_style_name(font_key), *checker.font_files[font_key],
+                                               format_characters(missing)))
+        for full_file_path, file_missing in checker.missing_by_file.items():
+            if font_key in file_missing:
+                lines.append('\t{}\t{}\n'.format(full_file_path, format_characters(file_missing[font_key])))
+
+    with open_atomically(path, 'w', encoding='utf-8') as fp:
+        fp.writelines(lines)
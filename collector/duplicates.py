@@ -0,0 +1,56 @@
+from .archives import ArchiveError, file_signature, split_archive_path
+from .loaders import MATROSKA_EXTENSIONS
+from .parsing import file_hash
+
+
+def find_duplicates(full_file_paths, cache=None):
+    """
+    Find the files which have the same content as an earlier file, so only the first one is parsed.
+
+    Files are grouped by size first, and only the files sharing a size are hashed,
+    using the hash kept by cache, a ResultCache, for files unchanged since they were
+    cached. Matroska files are left out, reading their subtitles costs less than hashing them,
+    and so are archive members: reading them would open the archives in this process,
+    before the worker processes of parse_files() are forked.
+
+    Returns a dict mapping every duplicate to (original, signature), where original is
+    the first file in full_file_paths order with the same content, and signature is
+    the (size, mtime, hash) of the duplicate, as the ResultCache keeps it. Files which
+    cannot be read are left out, parsing them reports the error.
+    """
+
+    # (full_file_path, mtime) of every file, by size, in files order
+    files_by_size = {}
+    for full_file_path in full_file_paths:
+        if full_file_path.lower().endswith(MATROSKA_EXTENSIONS):
+            continue
+        if split_archive_path(full_file_path) is not None:
+            continue
+        try:
+            size, mtime = file_signature(full_file_path)
+        except (OSError, ArchiveError):
+            continue
+        files_by_size.setdefault(size, []).append((full_file_path, mtime))
+
+    duplicates = {}
+    for size, files in files_by_size.items():
+        if len(files) < 2:
+            continue
+
+        # The first file of every content hash
+        originals = {}
+        for full_file_path, mtime in files:
+            cached_signature = cache.signature(full_file_path) if cache is not None else None
+            if cached_signature is not None and cached_signature[:2] == (size, mtime):
+                digest = cached_signature[2]
+            else:
+                try:
+                    digest = file_hash(full_file_path)
+                except (OSError, ArchiveError):
+                    continue
+            original = originals.setdefault(digest, full_file_path)
+            if original != full_file_path:
+                duplicates[full_file_path] = (original, (size, mtime, digest))
+
+    return duplicates
+
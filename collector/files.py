@@ -0,0 +1,104 @@
+import fnmatch
+import os
+
+from .archives import ARCHIVE_ERRORS, ArchiveError, is_archive_name, walk_archive
+from .logs import LogMessage, logger
+
+
+def matches_any(name, relative_path, patterns):
+    # Patterns with a slash are matched against the path relative to the walked directory,
+    # other patterns are matched against the name only
+    for pattern in patterns:
+        if fnmatch.fnmatch(relative_path if '/' in pattern else name, pattern):
+            return True
+    return False
+
+
+def walk_subtitles(root='.', include=('*.ass',), exclude=(), max_depth=None, archives=False):
+    """
+    Yield the full path of every matching file under root as soon as it is found.
+
+    Directories are read with os.scandir one at a time, so nothing is listed ahead.
+    Symbolic links to directories are followed, but every directory is walked once
+    so symbolic link loops are skipped. Excluded directories are not walked at all,
+    and max_depth limits how deep sub directories are walked (0 is root only).
+    When archives is True, zip and tar archives are walked like directories,
+    their members are yielded as the archive path followed by the member name.
+    """
+
+    root = os.path.abspath(root)
+
+    # (device, inode) of every walked directory
+    visited_directories = set()
+
+    # Directories waiting to be walked, with their relative path and depth
+    pending_directories = [(root, '', 0)]
+
+    while pending_directories:
+        directory, relative_directory, depth = pending_directories.pop()
+
+        try:
+            directory_stat = os.stat(directory)
+            directory_id = (directory_stat.st_dev, directory_stat.st_ino)
+            if directory_id in visited_directories:
+                logger.debug(LogMessage('Skipping directory {DIRECTORY}, it was already walked (symbolic link loop?)', {
+                    'DIRECTORY': directory,
+                }))
+                continue
+            visited_directories.add(directory_id)
+
+            sub_directories = []
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    relative_path = relative_directory + entry.name
+                    try:
+                        if entry.is_dir():
+                            if max_depth is not None and depth >= max_depth:
+                                continue
+                            if matches_any(entry.name, relative_path, exclude):
+                                continue
+                            sub_directories.append((entry.path, relative_path + '/', depth + 1))
+                        elif entry.is_file():
+                            if archives and is_archive_name(entry.name):
+                                if not matches_any(entry.name, relative_path, exclude):
+                                    yield from walk_archive_members(entry.path, relative_path, depth,
+                                                                    include, exclude, max_depth)
+                            elif matches_any(entry.name, relative_path, include) and \
+                                    not matches_any(entry.name, relative_path, exclude):
+                                yield entry.path
+                    except OSError:
+                        # Broken entries are skipped like a missing file
+                        continue
+
+            # Walk sub directories in the order they were found
+            pending_directories.extend(reversed(sub_directories))
+
+        except OSError as err:
+            logger.warning(LogMessage('Cannot read directory {DIRECTORY}\n Error message is "{ERROR}"', {
+                'DIRECTORY': directory,
+                'ERROR': err,
+            }))
+
+
+def walk_archive_members(archive_path, relative_archive_path, depth, include, exclude, max_depth):
+    # Yield the matching members of an archive found at depth, the archive counts as a directory
+    try:
+        for full_file_path, relative_path in walk_archive(archive_path, relative_archive_path):
+            # Directories inside the archive, with their relative paths
+            member_directories = relative_path[len(relative_archive_path) + 1:].split('/')[:-1]
+            if max_depth is not None and depth + 1 + len(member_directories) > max_depth:
+                continue
+            directory_path = relative_archive_path
+            excluded = False
+            for name in member_directories:
+                directory_path += '/' + name
+                excluded = excluded or matches_any(name, directory_path, exclude)
+            name = relative_path.rsplit('/', 1)[-1]
+            if not excluded and matches_any(name, relative_path, include) and \
+                    not matches_any(name, relative_path, exclude):
+                yield full_file_path
+    except (OSError, ArchiveError) + ARCHIVE_ERRORS as err:
+        logger.warning(LogMessage('Cannot read archive {ARCHIVE}\n Error message is "{ERROR}"', {
+            'ARCHIVE': archive_path,
+            'ERROR': err,
+        }))
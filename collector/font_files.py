@@ -0,0 +1,185 @@
+import multiprocessing
+import os
+import pickle
+import struct
+
+from .atomic import pickle_atomically
+from .files import walk_subtitles
+from .logs import LogMessage, logger
+from .sfnt import read_faces, read_font_faces
+
+# Default file where the faces of font files are kept between runs
+DEFAULT_FONT_INDEX_FILE = 'font_index.pickle'
+
+# Font files, the patterns are matched case sensitively on some systems
+FONT_FILE_PATTERNS = ['*.ttf', '*.otf', '*.ttc', '*.otc', '*.TTF', '*.OTF', '*.TTC', '*.OTC']
+
+# How many font files are sent to a worker process at once
+FONT_CHUNK_SIZE = 64
+
+
+def read_font_file(full_file_path):
+    """
+    Read the faces of a font file, see read_font_faces().
+
+    Returns (full_file_path, signature, faces, error), signature is (size, mtime)
+    or None when the file is gone, faces is None and error the error message when
+    the file cannot be read. Nothing is logged, so it can run in worker processes.
+    """
+    try:
+        stat = os.stat(full_file_path)
+    except OSError as err:
+        return full_file_path, None, None, str(err)
+
+    signature = (stat.st_size, stat.st_mtime_ns)
+    try:
+        return full_file_path, signature, read_font_faces(full_file_path), None
+    except (OSError, ValueError, struct.error) as err:
+        return full_file_path, signature, None, str(err)
+
+
+class FontFileIndex:
+    """
+    Faces of every font file found in some directories, kept on disk between runs.
+
+    Every entry is keyed by the file full path and stores the file signature
+    (size, mtime) and its faces, see read_font_faces(), files are read again
+    only when their signature changed. Files which cannot be read are kept
+    with no faces, so they are not read again either.
+    """
+
+    # Increase this when read_font_faces() results change, to drop old indexes
+    VERSION = 1
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+        self.entries = {}
+        # Faces by lower case font name, built when fonts are resolved
+        self.faces_by_name = None
+
+        if index_path is None:
+            return
+        try:
+            with open(index_path, 'rb') as fp:
+                version, entries = pickle.load(fp)
+            if version == self.VERSION:
+                self.entries = entries
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError) as err:
+            logger.warning(LogMessage('Cannot read font index file {INDEX_FILE}, it will be rebuilt.\n'
+                                      ' Error message is "{ERROR}"', {
+                                          'INDEX_FILE': index_path,
+                                          'ERROR': err,
+                                      }))
+
+    def update(self, directories, jobs=1):
+        """
+        Find the font files in directories, and read the new and changed files with jobs processes.
+
+        Files which are not in directories anymore are dropped from the index.
+        """
+
+        entries = {}
+        changed_files = []
+        for directory in directories:
+            for full_file_path in walk_subtitles(directory, FONT_FILE_PATTERNS):
+                try:
+                    stat = os.stat(full_file_path)
+                except OSError:
+                    continue
+                entry = self.entries.get(full_file_path)
+                if entry is not None and entry[0] == (stat.st_size, stat.st_mtime_ns):
+                    entries[full_file_path] = entry
+                else:
+                    changed_files.append(full_file_path)
+
+        pool = None
+        if jobs > 1 and len(changed_files) > FONT_CHUNK_SIZE:
+            pool = multiprocessing.Pool(jobs)
+            # Order does not matter, the index is a dict
+            results = pool.imap_unordered(read_font_file, changed_files, chunksize=FONT_CHUNK_SIZE)
+        else:
+            results = map(read_font_file, changed_files)
+
+        try:
+            for full_file_path, signature, faces, error in results:
+                if error is not None:
+                    logger.warning(LogMessage('Cannot read font file {FILE_NAME}\n Error message is "{ERROR}"', {
+                        'FILE_NAME': full_file_path,
+                        'ERROR': error,
+                    }))
+                if signature is not None:
+                    entries[full_file_path] = (signature, faces)
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        self.entries = entries
+        self.faces_by_name = None
+
+        logger.info(LogMessage('Found {FILES_COUNT} font files, read {CHANGED_COUNT} new or changed files', {
+            'FILES_COUNT': len(entries),
+            'CHANGED_COUNT': len(changed_files),
+        }))
+
+    def save(self):
+        if self.index_path is None:
+            return
+        # An interrupted run keeps the old index
+        pickle_atomically((self.VERSION, self.entries), self.index_path)
+
+    def build_names(self):
+        # Map every lower case font name to the (full_file_path, face_index, weight, italic) of its faces
+        faces_by_name = {}
+        for full_file_path, (signature, faces) in self.entries.items():
+            for face_index, names, weight, italic in faces or ():
+                for name in names:
+                    faces_by_name.setdefault(name.lower(), []).append((full_file_path, face_index, weight, italic))
+        self.faces_by_name = faces_by_name
+
+    def resolve(self, font_key):
+        """
+        Find the font file of a (fontname, bold, italic) font.
+
+        Returns (full_file_path, face_index) of the face with this name which is the
+        closest to the wanted style, like renderers choose, or None if no face has this name.
+        """
+
+        if self.faces_by_name is None:
+            self.build_names()
+
+        fontname, bold, italic = font_key
+        # '@' selects the vertical version of the same font
+        faces = self.faces_by_name.get(fontname.lstrip('@').lower())
+        if not faces:
+            return None
+
+        # Same italic first, then the closest weight, then the first file
+        weight = 700 if bold else 400
+        full_file_path, face_index, _, _ = min(
+            faces, key=lambda face: (face[3] != bool(italic), abs(face[2] - weight), face[0], face[1]))
+        return full_file_path, face_index
+
+    def resolve_all(self, font_keys):
+        # Map every (fontname, bold, italic) font to its (full_file_path, face_index), or None
+        return {font_key: self.resolve(font_key) for font_key in font_keys}
+
+
+def embedded_font_index(embedded_fonts):
+    """
+    Build a FontFileIndex of the fonts embedded in a subtitle file, from (name, content) pairs.
+
+    Fonts are read from memory and keyed by their attachment name, so resolve()
+    returns (attachment name, face_index). Returns (font_index, errors), errors
+    maps the name of every attachment which is not a font to the error message.
+    """
+
+    font_index = FontFileIndex()
+    errors = {}
+    for name, content in embedded_fonts:
+        try:
+            font_index.entries[name] = (None, read_faces(content))
+        except (ValueError, struct.error) as err:
+            errors[name] = str(err)
+    return font_index, errors
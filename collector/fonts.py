@@ -0,0 +1,198 @@
+from collections import Counter, OrderedDict
+
+import ass_tag_parser
+
+# Default number of parsed Dialogues kept in memory, see DialogueMemo
+DEFAULT_MEMO_SIZE = 10000
+
+
+def font_style_name(font_key):
+    # The name used for a font in output.ass, 'Fontname[-bold][-italic]'
+    fontname, bold, italic = font_key
+    if bold:
+        fontname += '-bold'
+    if italic:
+        fontname += '-italic'
+    return fontname
+
+
+class FontAccumulator:
+    """
+    Characters used by every font, keyed by (fontname, bold, italic).
+
+    Characters are counted in one Counter per font, so the memory depends on the
+    number of distinct fonts and characters, not on the number of Dialogues.
+    A whole text is counted at once, and accumulators are merged by adding
+    their Counters, e.g. the results of worker processes.
+    """
+
+    def __init__(self):
+        self.fonts = {}
+
+    def add(self, font_key, text):
+        characters = self.fonts.get(font_key)
+        if characters is None:
+            self.fonts[font_key] = Counter(text)
+        else:
+            characters.update(text)
+
+    def merge(self, other):
+        # Add the characters of another accumulator, e.g. the result of one file
+        for font_key, other_characters in other.fonts.items():
+            characters = self.fonts.get(font_key)
+            if characters is None:
+                self.fonts[font_key] = Counter(other_characters)
+            else:
+                characters.update(other_characters)
+
+    def items(self):
+        # Yield (font_key, characters) with characters as one sorted string
+        for font_key, characters in self.fonts.items():
+            yield font_key, ''.join(sorted(characters))
+
+    def frequencies(self):
+        # Yield (font_key, [(character, count), ...]) with the most used characters first
+        for font_key, characters in self.fonts.items():
+            yield font_key, sorted(characters.items(), key=lambda item: (-item[1], item[0]))
+
+    def __iter__(self):
+        # Iterate the font keys
+        return iter(self.fonts)
+
+    def __len__(self):
+        return len(self.fonts)
+
+    # All the counts are in self.fonts, see SpillingFontAccumulator
+    spilled = False
+
+
+# The font of Dialogues which style does not exist, no characters are collected for it
+MISSING_STYLE_FONT = (None, False, False)
+
+
+def build_style_table(styles):
+    """
+    Map every style name to its (fontname, bold, italic) font.
+
+    The table is built once for each file, so resetting the font state
+    while parsing Dialogues is a single dict lookup.
+    """
+    return {name: (style.fontname, style.bold, style.italic) for name, style in styles.items()}
+
+
+def resolve_dialogue(text, base_font, style_table, full_tags=False):
+    """
+    Find the font of every text run in a Dialogue.
+
+    Returns a tuple (runs, reset_styles), runs is a tuple of (font_key, text)
+    for every non empty text run, where the fontname of font_key is None if
+    the Dialogue style does not exist, and reset_styles is a tuple of
+    (style_name, font) for every {\\r} tag with a style name, in order,
+    where font is None if the style does not exist.
+
+    Only the tags which change the font are read, unless full_tags is True,
+    then every tag is parsed with parse_ass and must be valid.
+
+    Raises ass_tag_parser errors when the Dialogue cannot be parsed.
+    """
+
+    runs = []
+    reset_styles = []
+
+    fontname, bold, italic = base_font
+
+    # The font of the current style, it changes with {\r} tags
+    style_font = base_font
+
+    # Parsing the Dialogue, text without tags is used as is
+    if ass_tag_parser.is_plain_text(text):
+        ass_tags = (ass_tag_parser.AssText(text),)
+    elif full_tags:
+        ass_tags = ass_tag_parser.parse_ass(text)
+    else:
+        # Only font tags and rendered text, drawings are skipped
+        ass_tags = ass_tag_parser.scan_ass_fonts(text)
+
+    # Parsing each tag individually
+    for tag in ass_tags:
+
+        # Check if tag is AssTagResetStyle, this tag does one thing of two:
+        # 1 - Use the style of Dialogue.
+        # 2 - Assign a style from Style list in the ass file.
+        if type(tag) == ass_tag_parser.AssTagResetStyle:
+            # If style name is not present, then use the Dialogue style
+            if not tag.style:
+                style_font = base_font
+                fontname, bold, italic = style_font
+
+            # If the style name is not in style list, keep the current font
+            elif tag.style not in style_table:
+                reset_styles.append((tag.style, None))
+
+            # Otherwise the style must be in the style list, then use it.
+            else:
+                style_font = style_table[tag.style]
+                reset_styles.append((tag.style, style_font))
+                fontname, bold, italic = style_font
+
+        elif type(tag) == ass_tag_parser.AssTagBold:
+            bold = style_font[1] if tag.enabled is None else tag.enabled
+        elif type(tag) == ass_tag_parser.AssTagItalic:
+            italic = style_font[2] if tag.enabled is None else tag.enabled
+        elif type(tag) == ass_tag_parser.AssTagFontName:
+            # Font name tag without a name goes back to the current style font
+            fontname = style_font[0] if tag.name is None else tag.name
+        elif type(tag) == ass_tag_parser.AssText:
+            # Check if text is not empty
+            if len(tag.text) > 0:
+                runs.append(((fontname, bold, italic), tag.text))
+
+    return tuple(runs), tuple(reset_styles)
+
+
+class DialogueMemo:
+    """
+    Least recently used memo of resolve_dialogue() results.
+
+    Results are keyed by (text, base_font), so the same sign or karaoke line
+    repeated in every episode is parsed once. A result also depends on the
+    styles used by its {\\r} tags, these are checked against the current
+    style table before the result is used.
+    """
+
+    def __init__(self, max_size, full_tags=False):
+        self.max_size = max_size
+        # Passed to resolve_dialogue()
+        self.full_tags = full_tags
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, text, base_font, style_table):
+        if self.max_size <= 0:
+            return resolve_dialogue(text, base_font, style_table, self.full_tags)
+
+        key = (text, base_font)
+        result = self.entries.get(key)
+        if result is not None:
+            # Make sure {\r} styles are the same in this file
+            if all(style_table.get(style_name) == font for style_name, font in result[1]):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+        self.misses += 1
+        result = resolve_dialogue(text, base_font, style_table, self.full_tags)
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return result
+
+    def flush_stats(self):
+        # Return (hits, misses) since the last call
+        stats = self.hits, self.misses
+        self.hits = 0
+        self.misses = 0
+        return stats
+
@@ -0,0 +1,230 @@
+import argparse
+import os
+import sqlite3
+
+from .fonts import font_style_name
+
+# Increase this when the tables change
+INDEX_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    error TEXT,
+    unparsed INTEGER NOT NULL
+);
+CREATE TABLE fonts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    bold INTEGER NOT NULL,
+    italic INTEGER NOT NULL,
+    UNIQUE (name, bold, italic)
+);
+CREATE TABLE styles (
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    name TEXT NOT NULL,
+    font_id INTEGER NOT NULL REFERENCES fonts (id),
+    PRIMARY KEY (file_id, name)
+) WITHOUT ROWID;
+CREATE TABLE file_fonts (
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    font_id INTEGER NOT NULL REFERENCES fonts (id),
+    characters TEXT NOT NULL,
+    PRIMARY KEY (file_id, font_id)
+) WITHOUT ROWID;
+CREATE TABLE characters (
+    character TEXT NOT NULL,
+    font_id INTEGER NOT NULL REFERENCES fonts (id),
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    PRIMARY KEY (character, font_id, file_id)
+) WITHOUT ROWID;
+'''
+
+# Created after all the rows are inserted, which is faster than updating them on every insert
+INDEXES = '''
+CREATE INDEX fonts_name ON fonts (name COLLATE NOCASE);
+CREATE INDEX styles_font ON styles (font_id);
+CREATE INDEX file_fonts_font ON file_fonts (font_id);
+'''
+
+
+class IndexWriter:
+    """
+    Write the fonts used by every file to a new SQLite index.
+
+    The index is built in a temporary file which replaces index_path on close(),
+    so queries never see a partly written index. add_file() takes the results
+    of parse_files(), so it can be the on_file of collect_fonts().
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.temporary_path = index_path + '.tmp'
+        if os.path.exists(self.temporary_path):
+            os.remove(self.temporary_path)
+
+        self.connection = sqlite3.connect(self.temporary_path)
+        # Nothing to recover if building fails, the temporary file is dropped
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('PRAGMA user_version = {}'.format(INDEX_VERSION))
+        self.connection.executescript(SCHEMA)
+
+        # Row id of every inserted font, keyed by (fontname, bold, italic)
+        self.font_ids = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def font_id(self, font_key):
+        font_id = self.font_ids.get(font_key)
+        if font_id is None:
+            font_id = self.connection.execute('INSERT INTO fonts (name, bold, italic) VALUES (?, ?, ?)',
+                                              font_key).lastrowid
+            self.font_ids[font_key] = font_id
+        return font_id
+
+    def add_file(self, full_file_path, file_fonts, unparsed_events, error, style_table):
+        file_id = self.connection.execute('INSERT INTO files (path, error, unparsed) VALUES (?, ?, ?)',
+                                          (full_file_path, error, len(unparsed_events))).lastrowid
+
+        self.connection.executemany('INSERT INTO styles (file_id, name, font_id) VALUES (?, ?, ?)',
+                                    [(file_id, style_name, self.font_id(font_key))
+                                     for style_name, font_key in style_table.items()])
+
+        for font_key, characters in file_fonts.fonts.items():
+            font_id = self.font_id(font_key)
+            self.connection.execute('INSERT INTO file_fonts (file_id, font_id, characters) VALUES (?, ?, ?)',
+                                    (file_id, font_id, ''.join(sorted(characters))))
+            self.connection.executemany('INSERT INTO characters (character, font_id, file_id) VALUES (?, ?, ?)',
+                                        [(character, font_id, file_id) for character in characters])
+
+    def close(self):
+        self.connection.commit()
+        self.connection.executescript(INDEXES)
+        self.connection.close()
+        os.replace(self.temporary_path, self.index_path)
+
+    def abort(self):
+        self.connection.close()
+        os.remove(self.temporary_path)
+
+
+def write_index(index_path, file_results):
+    # Write an index of (full_file_path, file_fonts, unparsed_events, error, style_table) results
+    with IndexWriter(index_path) as index:
+        for file_result in file_results:
+            index.add_file(*file_result)
+
+
+def open_index(index_path):
+    # Open an existing index for queries, the index is never created here
+    if not os.path.isfile(index_path):
+        raise FileNotFoundError('Index file {} does not exist'.format(index_path))
+    connection = sqlite3.connect('file:{}?mode=ro'.format(index_path), uri=True)
+    version = connection.execute('PRAGMA user_version').fetchone()[0]
+    if version != INDEX_VERSION:
+        connection.close()
+        raise ValueError('Index file {} has version {}, collect again to rebuild it'.format(index_path, version))
+    return connection
+
+
+def query_fonts(connection):
+    # Every font, with the number of files which use it
+    return connection.execute('''
+        SELECT fonts.name, fonts.bold, fonts.italic, COUNT(file_fonts.file_id)
+        FROM fonts LEFT JOIN file_fonts ON file_fonts.font_id = fonts.id
+        GROUP BY fonts.id
+        ORDER BY fonts.name COLLATE NOCASE, fonts.bold, fonts.italic
+    ''').fetchall()
+
+
+def query_font_files(connection, fontname):
+    # Files which use a font, in any bold and italic state, with the number of characters used
+    return connection.execute('''
+        SELECT files.path, fonts.name, fonts.bold, fonts.italic, length(file_fonts.characters)
+        FROM fonts
+        JOIN file_fonts ON file_fonts.font_id = fonts.id
+        JOIN files ON files.id = file_fonts.file_id
+        WHERE fonts.name = ? COLLATE NOCASE
+        ORDER BY files.path, fonts.bold, fonts.italic
+    ''', (fontname,)).fetchall()
+
+
+def query_character_fonts(connection, character):
+    # Fonts which are used for a character, with the number of files
+    return connection.execute('''
+        SELECT fonts.name, fonts.bold, fonts.italic, COUNT(*)
+        FROM characters JOIN fonts ON fonts.id = characters.font_id
+        WHERE characters.character = ?
+        GROUP BY characters.font_id
+        ORDER BY fonts.name COLLATE NOCASE, fonts.bold, fonts.italic
+    ''', (character,)).fetchall()
+
+
+def query_file_fonts(connection, path):
+    # Fonts used by the files with this full path or ending with this relative path
+    suffix = os.sep + os.path.normpath(path)
+    return connection.execute('''
+        SELECT files.path, fonts.name, fonts.bold, fonts.italic, file_fonts.characters
+        FROM files
+        JOIN file_fonts ON file_fonts.file_id = files.id
+        JOIN fonts ON fonts.id = file_fonts.font_id
+        WHERE files.path = ? OR substr(files.path, -length(?)) = ?
+        ORDER BY files.path, fonts.name COLLATE NOCASE, fonts.bold, fonts.italic
+    ''', (path, suffix, suffix)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m collector.index',
+                                     description='Query the fonts index written by collect.py --index.')
+    parser.add_argument('index', help='The index file')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    commands.add_parser('fonts', help='List all fonts with the number of files using them')
+    files_parser = commands.add_parser('files', help='List the files using a font')
+    files_parser.add_argument('fontname', help='Font name, bold and italic variants are included')
+    characters_parser = commands.add_parser('characters', help='List the fonts used for every character')
+    characters_parser.add_argument('text', help='The characters to look up')
+    file_parser = commands.add_parser('file', help='List the fonts used by a file and their characters')
+    file_parser.add_argument('path', help='Full path, or the end of the path of the file')
+    args = parser.parse_args()
+
+    try:
+        connection = open_index(args.index)
+    except (OSError, ValueError, sqlite3.Error) as err:
+        parser.error(str(err))
+
+    with connection:
+        if args.command == 'fonts':
+            for fontname, bold, italic, files_count in query_fonts(connection):
+                print('{}\t{} files'.format(font_style_name((fontname, bold, italic)), files_count))
+
+        elif args.command == 'files':
+            for path, fontname, bold, italic, characters_count in query_font_files(connection, args.fontname):
+                print('{}\t{}\t{} characters'.format(path, font_style_name((fontname, bold, italic)),
+                                                     characters_count))
+
+        elif args.command == 'characters':
+            # Every character once, in the given order
+            for character in dict.fromkeys(args.text):
+                for fontname, bold, italic, files_count in query_character_fonts(connection, character):
+                    print('{}\t{}\t{} files'.format(character, font_style_name((fontname, bold, italic)),
+                                                    files_count))
+
+        elif args.command == 'file':
+            for path, fontname, bold, italic, characters in query_file_fonts(connection, args.path):
+                print('{}\t{}\t{}'.format(path, font_style_name((fontname, bold, italic)), characters))
+
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
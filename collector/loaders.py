@@ -0,0 +1,381 @@
+import mmap
+import os
+import re
+
+import pysubs2
+from pysubs2.formats import autodetect_format
+from pysubs2.substation import uudecode
+
+from .archives import ArchiveError, read_member, split_archive_path
+from .fonts import build_style_table
+
+# Matroska files, read with MatroskaSubtitle
+MATROSKA_EXTENSIONS = ('.mkv', '.mks', '.mka', '.webm')
+
+
+class LoadedSubtitle:
+    """
+    Subtitle file loaded with pysubs2.load, used for files which are not SubStation.
+
+    Has the same interface as AssScanner. subtitle is the already loaded SSAFile, if any.
+    """
+
+    def __init__(self, full_file_path, subtitle=None):
+        self.subtitle = pysubs2.load(full_file_path) if subtitle is None else subtitle
+        self.style_table = build_style_table(self.subtitle.styles)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def dialogues(self):
+        # Yield (style, text, line) for every Dialogue, line is only used by event()
+        for event in self.subtitle.events:
+            if event.type == 'Dialogue':
+                yield event.style, event.text, event
+
+    def event(self, line):
+        return line
+
+    def style(self, style_name):
+        return self.subtitle.styles.get(style_name)
+
+    def embedded_fonts(self):
+        # Yield (name, content) of the font files embedded in the [Fonts] section
+        return self.subtitle.fonts.items()
+
+    def tracks(self):
+        # The subtitles of the file, each one with its own styles
+        return [self]
+
+
+class AssScanner:
+    """
+    Read only the styles and the Dialogues of a SubStation file.
+
+    The file is memory mapped and only the lines which can be styles or events
+    are read, for every Dialogue only the Style and Text fields are decoded.
+    Lines, sections and fields are found the way pysubs2 finds them, so for
+    the files pysubs2 can load the results are the same as pysubs2.load,
+    without building SSAEvent objects and parsing timestamps. Full SSAEvent
+    and SSAStyle objects are built only when they are asked for, e.g. for
+    Dialogues which could not be parsed.
+
+    part is (part_index, parts_count) to read only the Dialogues of one of
+    parts_count parts of about the same size of the file, cut at line starts,
+    see split_task(). The styles are read from the whole file. A file which
+    embeds fonts is read whole by its first part, its other parts have no Dialogues.
+
+    Raises pysubs2.FormatAutodetectionError when the file is not SubStation.
+    """
+
+    # Lone carriage returns end lines too, pysubs2 reads files with universal newlines
+    LONE_CARRIAGE_RETURN = re.compile(rb'\r(?!\n)')
+
+    # Bracketed text which may be a section heading, e.g. [Events], see headings()
+    HEADING_CANDIDATE = re.compile(rb'\[[^\]\r\n]*\]')
+
+    # Encoded lines of embedded files may look like headings, real section names have lower case letters or spaces
+    SECTION_NAME = re.compile(rb'[a-z ]')
+
+    # Number of fields after 'Dialogue:' and the index of the Style field, Text is the last one
+    EVENT_FIELDS_COUNT = 10
+    EVENT_STYLE_FIELD = 3
+
+    def __init__(self, full_file_path, data=None, part=None):
+        if data is not None:
+            # Content already read, e.g. of an archive member or by prefetch_tasks()
+            self.fp = None
+            self.data = data
+            if not data:
+                raise pysubs2.FormatAutodetectionError('No suitable formats')
+        else:
+            self.fp = open(full_file_path, 'rb')
+            try:
+                if os.fstat(self.fp.fileno()).st_size == 0:
+                    raise pysubs2.FormatAutodetectionError('No suitable formats')
+                self.mapped_data = self.data = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+            except BaseException:
+                self.fp.close()
+                raise
+
+        try:
+            if self.data.find(b'\r') != -1 and self.LONE_CARRIAGE_RETURN.search(self.data):
+                # Old Mac line ends, only \n ends lines below
+                self.data = self.data[:].replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+
+            # The same detection pysubs2 does on the first 10000 characters of the file,
+            # other formats are left to pysubs2
+            fragment = self.data[:40000].decode('utf-8', 'replace').replace('\r\n', '\n')[:10000]
+            self.format = autodetect_format(fragment)
+            if self.format not in ('ass', 'ssa'):
+                raise pysubs2.FormatAutodetectionError('Not a SubStation file')
+
+            # pysubs2 reads styles and events anywhere but in the info, Aegisub and attachment sections,
+            # including before the first heading
+            headings = list(self.headings())
+            section_starts = [0] + [heading_end for _, heading_end, _ in headings]
+            section_ends = [heading_start for heading_start, _, _ in headings] + [len(self.data)]
+            section_headings = [''] + [heading for _, _, heading in headings]
+            self.styles_sections = []
+            self.fonts_sections = []
+            for section_start, section_end, heading in zip(section_starts, section_ends, section_headings):
+                if '[Fonts]' in heading:
+                    self.fonts_sections.append((section_start, section_end))
+                elif not ('Info' in heading or 'Aegisub' in heading or '[Graphics]' in heading):
+                    if section_end > section_start:
+                        self.styles_sections.append((section_start, section_end))
+            self.events_sections = list(self.styles_sections)
+
+            # Raw style lines and fonts of every style
+            self.style_lines = {}
+            self.style_table = {}
+            for line in self.find_lines(self.styles_sections, b'Style:'):
+                self.read_style(line.decode('utf-8').strip())
+
+            if part is not None:
+                self.events_sections = self.part_sections(*part)
+        except BaseException:
+            self.close()
+            raise
+
+    def headings(self):
+        """
+        Yield (line_start, line_end, heading) of every section heading line, heading is the stripped line.
+
+        Like pysubs2, a heading is a line with a bracketed name at most 3 characters
+        after its start, inside [Fonts] and [Graphics] sections the name must have
+        a lower case letter or a space, encoded lines can look like headings.
+        line_end is after the line end, where the section starts.
+        """
+
+        data = self.data
+        in_attachments = False
+        heading_line_end = 0
+        for candidate in self.HEADING_CANDIDATE.finditer(data):
+            candidate_start = candidate.start()
+            # Another bracket on a heading line, the line was read already
+            if candidate_start < heading_line_end:
+                continue
+            name = candidate.group()[1:-1]
+            if not (self.SECTION_NAME.search(name) if in_attachments else name):
+                continue
+            line_start = data.rfind(b'\n', 0, candidate_start) + 1
+            if len(data[line_start:candidate_start].decode('utf-8', 'replace').lstrip()) > 3:
+                continue
+
+            line_end = data.find(b'\n', candidate_start)
+            line_end = len(data) if line_end == -1 else line_end + 1
+            heading = data[line_start:line_end].decode('utf-8', 'replace').strip()
+            in_attachments = '[Fonts]' in heading or '[Graphics]' in heading
+            heading_line_end = line_end
+            yield line_start, line_end, heading
+
+    def close(self):
+        if self.fp is not None:
+            self.mapped_data.close()
+            self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def lines(self, sections, prefix):
+        # Yield the lines of the sections which start with prefix once stripped, as bytes
+        data = self.data
+        for section_start, section_end in sections:
+            position = section_start
+            while position < section_end:
+                line_end = data.find(b'\n', position, section_end)
+                if line_end == -1:
+                    line_end = section_end
+                line = data[position:line_end].strip()
+                if line.startswith(prefix):
+                    yield line
+                elif line and (line[0] >= 0x80 or 0x1c <= line[0] <= 0x1f):
+                    # pysubs2 also strips the other Unicode spaces
+                    line = self.unicode_strip(line)
+                    if line.startswith(prefix):
+                        yield line
+                position = line_end + 1
+
+    def find_lines(self, sections, prefix):
+        # Yield the same lines as lines(), searching prefix instead of reading every line
+        data = self.data
+        for section_start, section_end in sections:
+            position = section_start
+            while True:
+                position = data.find(prefix, position, section_end)
+                if position == -1:
+                    break
+                line_start = data.rfind(b'\n', section_start, position) + 1 or section_start
+                line_end = data.find(b'\n', position, section_end)
+                if line_end == -1:
+                    line_end = section_end
+                indent = data[line_start:position]
+                if not indent.strip() or not self.unicode_strip(indent):
+                    yield data[line_start:line_end].strip() if indent.isascii() else \
+                        self.unicode_strip(data[line_start:line_end])
+                position = line_end
+
+    @staticmethod
+    def unicode_strip(line):
+        # Strip the spaces str.strip() strips, undecodable bytes are kept as they are
+        return line.decode('utf-8', 'surrogateescape').strip().encode('utf-8', 'surrogateescape')
+
+    def part_sections(self, part_index, parts_count):
+        # The events sections cut to one of parts_count parts of the file, see __init__()
+        if self.fonts_sections:
+            # The embedded fonts are checked against the fonts of all the Dialogues
+            return self.events_sections if part_index == 0 else []
+
+        part_start = self.line_start(len(self.data) * part_index // parts_count)
+        part_end = self.line_start(len(self.data) * (part_index + 1) // parts_count)
+        return [(max(section_start, part_start), min(section_end, part_end))
+                for section_start, section_end in self.events_sections
+                if section_start < part_end and section_end > part_start]
+
+    def line_start(self, position):
+        # Start of the first line at or after position, sections start and end at line starts too
+        if position == 0:
+            return 0
+        line_end = self.data.find(b'\n', position - 1)
+        return len(self.data) if line_end == -1 else line_end + 1
+
+    def read_style(self, line):
+        name, *fields = line[len('Style:'):].strip().split(',')
+        self.style_lines[name] = line
+        if len(fields) < 8:
+            # Let pysubs2 fill the missing fields with the defaults
+            style = self.style(name)
+            self.style_table[name] = (style.fontname, style.bold, style.italic)
+        else:
+            self.style_table[name] = (fields[0], fields[6] == '-1', fields[7] == '-1')
+
+    def dialogues(self):
+        # Yield (style, text, line) for every Dialogue, line is only used by event()
+        for line in self.lines(self.events_sections, b'Dialogue:'):
+            fields = line[len(b'Dialogue:'):].lstrip().split(b',', self.EVENT_FIELDS_COUNT - 1)
+            if len(fields) < self.EVENT_FIELDS_COUNT or fields[0][:1] >= b'\x80' or \
+                    b'\x1c' <= fields[0][:1] <= b'\x1f':
+                # Missing fields, pysubs2 uses the defaults, or spaces which only pysubs2 strips
+                event = self.event(line)
+                yield event.style, event.text, line
+            else:
+                # pysubs2 strips the decoded line, which may end with non ASCII spaces
+                yield (fields[self.EVENT_STYLE_FIELD].decode('utf-8'),
+                       fields[-1].decode('utf-8').rstrip(),
+                       line)
+
+    def event(self, line):
+        # Build the full SSAEvent of a Dialogue line
+        return pysubs2.SSAFile.from_string(line.decode('utf-8'), format_=self.format).events[0]
+
+    def style(self, style_name):
+        # Build the full SSAStyle of a style
+        line = self.style_lines.get(style_name)
+        if line is None:
+            return None
+        return pysubs2.SSAFile.from_string(line, format_=self.format).styles[style_name]
+
+    def tracks(self):
+        # The subtitles of the file, each one with its own styles
+        return [self]
+
+    def embedded_fonts(self):
+        # Yield (name, content) of the font files embedded in the [Fonts] sections, like pysubs2 reads them
+        for section_start, section_end in self.fonts_sections:
+            # Encoded lines are ASCII, names are decoded as the rest of the file
+            lines = self.data[section_start:section_end].split(b'\n')
+            name = None
+            encoded_lines = []
+            for line in lines:
+                line = line.strip()
+                if line.startswith(b'fontname:'):
+                    if name is not None:
+                        yield name, uudecode(encoded_lines)
+                    name = line[len(b'fontname:'):].decode('utf-8').strip()
+                    encoded_lines = []
+                elif line and name is not None:
+                    encoded_lines.append(line.decode('ascii'))
+            if name is not None:
+                yield name, uudecode(encoded_lines)
+
+
+class MatroskaSubtitle:
+    """
+    SubStation tracks of a Matroska file, see MatroskaFile.
+
+    Every track is a LoadedSubtitle with its own styles, see tracks(). style_table has
+    the styles of all the tracks, the first track wins when they use the same name.
+    The fonts attached to the file are the embedded fonts, they are read only when asked for.
+    """
+
+    def __init__(self, full_file_path):
+        # Imported here, so python -m collector.matroska does not find it imported by the package
+        from .matroska import MatroskaFile
+
+        self.matroska = MatroskaFile(full_file_path)
+        try:
+            self.matroska.read_events()
+            self.subtitles = [LoadedSubtitle(full_file_path, track.to_ssafile())
+                              for track in self.matroska.tracks.values()]
+        except BaseException:
+            self.close()
+            raise
+
+        self.style_table = {}
+        for subtitle in reversed(self.subtitles):
+            self.style_table.update(subtitle.style_table)
+
+    def close(self):
+        self.matroska.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def tracks(self):
+        return self.subtitles
+
+    def embedded_fonts(self):
+        # Yield (name, content) of the attached fonts, then of the fonts in the tracks [Fonts] sections
+        for name, _, data_position, size in self.matroska.font_attachments():
+            yield name, self.matroska.read_attachment(data_position, size)
+        for subtitle in self.subtitles:
+            yield from subtitle.embedded_fonts()
+
+
+def open_subtitle(full_file_path, scan=True, data=None):
+    """
+    Open a subtitle file to read its styles and Dialogues.
+
+    Matroska files are read with MatroskaSubtitle. SubStation files are read
+    with AssScanner when scan is True, other files and all files when scan is
+    False are loaded with pysubs2. Archive members are read in memory first.
+    data is the file content when it was already read, then the file is not read again.
+    """
+    in_archive = split_archive_path(full_file_path) is not None
+    if data is None and in_archive:
+        data = read_member(full_file_path)
+
+    if full_file_path.lower().endswith(MATROSKA_EXTENSIONS):
+        if in_archive:
+            raise ArchiveError('Matroska files are not read from archives')
+        return MatroskaSubtitle(full_file_path)
+    if scan:
+        try:
+            return AssScanner(full_file_path, data)
+        except pysubs2.FormatAutodetectionError:
+            pass
+    if data is not None:
+        # The same universal newlines pysubs2.load reads files with
+        text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        return LoadedSubtitle(full_file_path, pysubs2.SSAFile.from_string(text))
+    return LoadedSubtitle(full_file_path)
@@ -0,0 +1,123 @@
+import copy
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# The collector logger, handlers are attached in setup_logger()
+# so importing the collector (which worker processes do) creates no files.
+logger = logging.getLogger('collector')
+logger.addHandler(logging.NullHandler())
+
+
+class LogMessage:
+    """
+    Log message template formatted with str.format_map only when it is written.
+    """
+
+    __slots__ = ('template', 'fields')
+
+    def __init__(self, template, fields):
+        self.template = template
+        self.fields = fields
+
+    def __str__(self):
+        return self.template.format_map(self.fields)
+
+
+class BackgroundLogHandler(QueueHandler):
+    """
+    Send log records to the QueueListener thread which writes them to the log files.
+
+    Records stay in this process, so unlike QueueHandler they are not formatted
+    before being queued, formatting happens in the listener thread.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logger(level=logging.DEBUG):
+    """
+    Attach the log files and console handlers to the collector logger.
+
+    The handlers run on a background thread, returns the started QueueListener
+    which must be stopped at the end of the run to flush the remaining records.
+    """
+
+    # Start preparing the logger
+    # Warnings are always made, so the cached results and partials keep them for runs with a lower level,
+    # the queue handler drops the records below level, messages below both are not even prepared
+    logger.setLevel(min(level, logging.WARNING))
+    logger_formatter = logging.Formatter('%(asctime)s: %(levelname)s : ~ %(message)s')  # Setup custom logger message
+    file_handler = logging.FileHandler('log.txt', encoding='utf-8')  # Setup file handler where logs will be stored
+    file_handler.setLevel(logging.DEBUG)  # Set file handler log level
+    file_handler.setFormatter(logger_formatter)  # Assign the custom format to warning file handler
+    warning_file_handler = logging.FileHandler('warnings.txt', encoding='utf-8')  # Setup warning file handler where logs will be stored
+    warning_file_handler.setLevel(logging.WARNING)  # Set warning file handler log level
+    warning_file_handler.setFormatter(logger_formatter)  # Assign the custom format to file handler
+    error_file_handler = logging.FileHandler('missing styles.txt', encoding='utf-8')  # Setup error file handler where logs will be stored
+    error_file_handler.setLevel(logging.ERROR)  # Set warning file handler log level
+    error_file_handler.setFormatter(logger_formatter)  # Assign the custom format to file handler
+    stream_handler = logging.StreamHandler()  # Setup Stream handler
+    stream_handler.setLevel(logging.INFO)  # Set stream handler log level
+    stream_handler.setFormatter(logger_formatter)  # Assign Custom format to stream handler
+    log_queue = queue.SimpleQueue()  # Records are queued by the logger and written by the listener thread
+    listener = QueueListener(log_queue,
+                             file_handler,  # Add file handler to the listener
+                             warning_file_handler,  # Add file handler to the listener
+                             error_file_handler,  # Add file handler to the listener
+                             stream_handler,  # Add stream handler to the listener
+                             respect_handler_level=True)
+    queue_handler = BackgroundLogHandler(log_queue)
+    queue_handler.setLevel(level)  # Only the records of the wanted level are written
+    logger.addHandler(queue_handler)  # Add queue handler to the logger
+    listener.start()
+    # End preparing the logger
+
+    return listener
+
+
+def replay_records(records):
+    # Log records made in another process or cached, skipping the disabled levels
+    for record in records:
+        if logger.isEnabledFor(record.levelno):
+            logger.handle(record)
+
+
+def rename_records(records, old_path, new_path):
+    # Copy log records made for one file for another file with the same content, with its path in the messages
+    renamed_records = []
+    for record in records:
+        record = copy.copy(record)
+        record.msg = record.getMessage().replace(old_path, new_path)
+        record.args = None
+        renamed_records.append(record)
+    return renamed_records
+
+
+class RecordBuffer(logging.Handler):
+    """
+    Keep log records in memory instead of writing them.
+
+    Worker processes log into this buffer, and the records of each file
+    are sent back to the parent which replays them through its own handlers,
+    this way the log files are written in the same order as a serial run.
+    """
+
+    def __init__(self, level=1):
+        super().__init__(level=level)
+        self.records = []
+
+    def emit(self, record):
+        # Format the message now, the arguments may not be picklable
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        self.records.append(record)
+
+    def flush_records(self):
+        records = self.records
+        self.records = []
+        return records
+
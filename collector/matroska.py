@@ -0,0 +1,614 @@
+import argparse
+import os
+import struct
+import zlib
+
+import pysubs2
+from pysubs2.substation import EVENT_FORMAT_LINE, ms_to_timestamp
+
+# Element IDs, with their length marker as they are written
+EBML = 0x1A45DFA3
+DOC_TYPE = 0x4282
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+CODEC_ID = 0x86
+CODEC_PRIVATE = 0x63A2
+TRACK_NAME = 0x536E
+TRACK_LANGUAGE = 0x22B59C
+CONTENT_ENCODINGS = 0x6D80
+CONTENT_ENCODING = 0x6240
+CONTENT_ENCODING_SCOPE = 0x5032
+CONTENT_COMPRESSION = 0x5034
+CONTENT_COMP_ALGO = 0x4254
+CONTENT_COMP_SETTINGS = 0x4255
+CONTENT_ENCRYPTION = 0x5035
+CUES = 0x1C53BB6B
+CUE_POINT = 0xBB
+CUE_TRACK_POSITIONS = 0xB7
+CUE_TRACK = 0xF7
+CUE_CLUSTER_POSITION = 0xF1
+CUE_RELATIVE_POSITION = 0xF0
+CLUSTER = 0x1F43B675
+CLUSTER_TIMECODE = 0xE7
+SIMPLE_BLOCK = 0xA3
+BLOCK_GROUP = 0xA0
+BLOCK = 0xA1
+BLOCK_DURATION = 0x9B
+ATTACHMENTS = 0x1941A469
+ATTACHED_FILE = 0x61A7
+FILE_NAME = 0x466E
+FILE_MIME_TYPE = 0x4660
+FILE_DATA = 0x465C
+
+# Elements which can follow a Cluster of unknown size in a Segment
+TOP_LEVEL_IDS = {SEEK_HEAD, INFO, TRACKS, CUES, CLUSTER, ATTACHMENTS, 0x1043A770, 0x1254C367}
+
+# Codecs of SubStation tracks, their blocks are Dialogues without the Start and End fields
+SUBSTATION_CODECS = {'S_TEXT/ASS': 'ass', 'S_TEXT/SSA': 'ssa', 'S_ASS': 'ass', 'S_SSA': 'ssa'}
+
+# Attachments which are fonts, by MIME type or by extension
+FONT_MIME_TYPES = {'application/x-truetype-font', 'application/x-font-ttf', 'application/x-font-otf',
+                   'application/x-font-opentype', 'application/vnd.ms-opentype', 'application/font-sfnt',
+                   'font/ttf', 'font/otf', 'font/sfnt', 'font/collection'}
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+
+# Blocks timecodes are in TimecodeScale nanoseconds, 1 ms by default
+DEFAULT_TIMECODE_SCALE = 1000000
+
+
+class MatroskaError(ValueError):
+    pass
+
+
+class MatroskaTruncatedError(MatroskaError, EOFError):
+    # Raised when an element goes past the end of the file, walking elements stops there
+    pass
+
+
+def read_vint(fp, keep_marker=False):
+    # Read a variable size integer, returns (value, length), value is None for an unknown size
+    first = fp.read(1)
+    if not first:
+        raise MatroskaTruncatedError('Truncated Matroska file')
+    first = first[0]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        raise MatroskaError('Bad variable size integer')
+
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = first & (mask - 1) == mask - 1
+    rest = fp.read(length - 1)
+    if len(rest) != length - 1:
+        raise MatroskaTruncatedError('Truncated Matroska file')
+    for byte in rest:
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    if all_ones and not keep_marker:
+        return None, length
+    return value, length
+
+
+def read_element_header(fp):
+    # Read an element ID and size, returns (element_id, size, data_position), size is None when unknown
+    element_id, _ = read_vint(fp, keep_marker=True)
+    size, _ = read_vint(fp)
+    return element_id, size, fp.tell()
+
+
+def children(fp, start, end):
+    """
+    Yield (element_id, size, data_position) of the child elements between start and end.
+
+    The file position is moved to the end of every child before reading the next one,
+    so the caller may read the child data or not. Children of unknown size end the iteration.
+    """
+
+    position = start
+    while end is None or position < end:
+        fp.seek(position)
+        try:
+            element_id, size, data_position = read_element_header(fp)
+        except EOFError:
+            return
+        yield element_id, size, data_position
+        if size is None:
+            return
+        position = data_position + size
+
+
+def read_uint(fp, size):
+    return int.from_bytes(fp.read(size), 'big')
+
+
+def read_string(fp, size):
+    return fp.read(size).rstrip(b'\x00').decode('utf-8', errors='replace')
+
+
+def decode_content(compression, data):
+    # Undo the (algorithm, settings) compression of a track, see MatroskaFile.read_content_encodings()
+    algorithm, settings = compression
+    if algorithm == 0:
+        try:
+            return zlib.decompress(data)
+        except zlib.error as err:
+            raise MatroskaError('Cannot decompress: {}'.format(err))
+    # Header stripping, the removed bytes are the settings
+    return settings + data
+
+
+class MatroskaTrack:
+    """
+    A SubStation track of a Matroska file.
+
+    header is the decoded CodecPrivate, which holds the [Script Info] and styles
+    sections, and events is a list of (read_order, start, end, fields) built
+    from the blocks, fields being the Dialogue fields after End.
+    """
+
+    def __init__(self, number, codec_id, header, name, language, compression):
+        self.number = number
+        self.codec_id = codec_id
+        self.format = SUBSTATION_CODECS[codec_id]
+        self.header = header
+        self.name = name
+        self.language = language
+        # (algorithm, settings) of the blocks compression, or None
+        self.compression = compression
+        self.events = []
+
+    def add_block(self, payload, start, duration):
+        if self.compression is not None:
+            payload = decode_content(self.compression, payload)
+        # Fields are ReadOrder, Layer, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+        fields = payload.decode('utf-8', errors='replace').split(',', 8)
+        if len(fields) < 9:
+            raise MatroskaError('Bad SubStation block in track {}'.format(self.number))
+        read_order = int(fields[0]) if fields[0].strip().isdigit() else len(self.events)
+        self.events.append((read_order, start, start + duration, fields[1:]))
+
+    def to_string(self):
+        """
+        Rebuild the subtitle file, the CodecPrivate header followed by the Dialogues in read order.
+        """
+
+        lines = [self.header.rstrip('\r\n')]
+        if '[Events]' not in self.header:
+            lines.append('')
+            lines.append('[Events]')
+            lines.append(EVENT_FORMAT_LINE[self.format])
+        for _, start, end, fields in sorted(self.events, key=lambda event: event[0]):
+            layer, rest = fields[0], ','.join(fields[1:])
+            lines.append('Dialogue: {},{},{},{}'.format(layer, ms_to_timestamp(start), ms_to_timestamp(end), rest))
+        return '\n'.join(lines) + '\n'
+
+    def to_ssafile(self):
+        return pysubs2.SSAFile.from_string(self.to_string(), format_=self.format)
+
+
+class MatroskaFile:
+    """
+    Read the SubStation tracks and the attachments of a Matroska file without reading the video.
+
+    Only the element headers are read to find the Segment elements, with the
+    SeekHead when there is one. Subtitle blocks are found with the Cues when
+    they have entries for the subtitle tracks, as mkvmerge writes one for every
+    subtitle block, so only these clusters are read. Otherwise every Cluster is
+    walked, reading only the track number of the other blocks.
+
+    Raises MatroskaError or OSError when the file cannot be read.
+    """
+
+    def __init__(self, full_file_path):
+        self.full_file_path = full_file_path
+        self.fp = open(full_file_path, 'rb')
+        try:
+            self.file_size = os.fstat(self.fp.fileno()).st_size
+            self.read_segment()
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def read_segment(self):
+        fp = self.fp
+        element_id, size, data_position = read_element_header(fp)
+        if element_id != EBML or size is None:
+            raise MatroskaError('Not a Matroska file')
+        doc_type = None
+        for child_id, child_size, _ in children(fp, data_position, data_position + size):
+            if child_id == DOC_TYPE:
+                doc_type = read_string(fp, child_size)
+        if doc_type not in ('matroska', 'webm'):
+            raise MatroskaError('Not a Matroska file')
+
+        fp.seek(data_position + size)
+        element_id, size, self.segment_position = read_element_header(fp)
+        if element_id != SEGMENT:
+            raise MatroskaError('No Segment in Matroska file')
+        self.segment_end = self.file_size if size is None else min(self.file_size, self.segment_position + size)
+
+        # Position of the first element of each kind, found before the first Cluster or with the SeekHeads
+        self.positions = {}
+        # Positions of all the Clusters, only known once all the top level elements were walked
+        self.clusters = None
+        self.find_elements()
+
+        self.timecode_scale = DEFAULT_TIMECODE_SCALE
+        if self.element_position(INFO) is not None:
+            for child_id, child_size, _ in self.children_of(INFO):
+                if child_id == TIMECODE_SCALE:
+                    self.timecode_scale = read_uint(fp, child_size)
+
+        self.tracks = {}
+        if self.element_position(TRACKS) is not None:
+            for child_id, child_size, child_position in self.children_of(TRACKS):
+                if child_id == TRACK_ENTRY:
+                    self.read_track(child_position, child_position + child_size)
+
+    def top_level_elements(self):
+        # Yield (element_id, size, position) of the Segment elements, Clusters of unknown size are walked
+        position = self.segment_position
+        while position < self.segment_end:
+            try:
+                element_id, size, data_position = self.element_at(position)
+            except EOFError:
+                return
+            yield element_id, size, position
+            if size is None and element_id == CLUSTER:
+                size = self.unknown_cluster_size(data_position)
+            if size is None:
+                return
+            position = data_position + size
+
+    def unknown_cluster_size(self, data_position):
+        # A Cluster of unknown size ends with the next top level element
+        position = data_position
+        while position < self.segment_end:
+            try:
+                element_id, size, child_position = self.element_at(position)
+            except EOFError:
+                break
+            if element_id in TOP_LEVEL_IDS or size is None:
+                return position - data_position
+            position = child_position + size
+        return self.segment_end - data_position
+
+    def find_elements(self):
+        # Find the elements before the first Cluster, and the ones the SeekHeads point to
+        for element_id, size, position in self.top_level_elements():
+            if element_id == CLUSTER:
+                return
+            self.positions.setdefault(element_id, position)
+            if element_id == SEEK_HEAD:
+                self.read_seek_head(position, set())
+
+    def walk_elements(self):
+        # Walk all the top level elements, reading only their headers
+        self.clusters = []
+        for element_id, size, position in self.top_level_elements():
+            self.positions.setdefault(element_id, position)
+            if element_id == CLUSTER:
+                self.clusters.append(position)
+
+    def element_position(self, element_id):
+        # Position of an element, walking all the top level elements when it was not found yet
+        if element_id not in self.positions and self.clusters is None:
+            self.walk_elements()
+        return self.positions.get(element_id)
+
+    def read_seek_head(self, position, read_seek_heads):
+        # Read the positions of a SeekHead, following the other SeekHeads it points to
+        read_seek_heads.add(position)
+        fp = self.fp
+        _, size, data_position = self.element_at(position)
+        for seek_id, seek_size, seek_position in children(fp, data_position, data_position + size):
+            if seek_id != SEEK:
+                continue
+            target_id = target_position = None
+            for child_id, child_size, _ in children(fp, seek_position, seek_position + seek_size):
+                if child_id == SEEK_ID:
+                    target_id = read_uint(fp, child_size)
+                elif child_id == SEEK_POSITION:
+                    target_position = read_uint(fp, child_size)
+            if target_id is None or target_position is None:
+                continue
+            target_position += self.segment_position
+            if target_id == SEEK_HEAD:
+                if target_position not in read_seek_heads:
+                    self.read_seek_head(target_position, read_seek_heads)
+            else:
+                self.positions.setdefault(target_id, target_position)
+
+    def element_at(self, position):
+        # Read the header of the element at position, returns (element_id, size, data_position)
+        self.fp.seek(position)
+        return read_element_header(self.fp)
+
+    def children_of(self, element_id):
+        element_id, size, data_position = self.element_at(self.positions[element_id])
+        return children(self.fp, data_position, None if size is None else data_position + size)
+
+    def read_track(self, start, end):
+        fp = self.fp
+        number = codec_id = None
+        header = b''
+        name = language = None
+        compression = None
+        for child_id, child_size, child_position in children(fp, start, end):
+            if child_id == TRACK_NUMBER:
+                number = read_uint(fp, child_size)
+            elif child_id == CODEC_ID:
+                codec_id = read_string(fp, child_size)
+            elif child_id == CODEC_PRIVATE:
+                header = fp.read(child_size)
+            elif child_id == TRACK_NAME:
+                name = read_string(fp, child_size)
+            elif child_id == TRACK_LANGUAGE:
+                language = read_string(fp, child_size)
+            elif child_id == CONTENT_ENCODINGS:
+                compression = self.read_content_encodings(child_position, child_position + child_size)
+
+        if codec_id not in SUBSTATION_CODECS or number is None:
+            return
+
+        # The scope tells whether the blocks, the CodecPrivate or both are compressed
+        block_compression = None
+        if compression is not None:
+            algorithm, settings, scope = compression
+            if scope & 1:
+                block_compression = (algorithm, settings)
+            if scope & 2:
+                header = decode_content((algorithm, settings), header)
+
+        self.tracks[number] = MatroskaTrack(number, codec_id, header.decode('utf-8-sig', errors='replace'),
+                                            name, language, block_compression)
+
+    def read_content_encodings(self, start, end):
+        # Returns (algorithm, settings, scope) of the track compression, or None
+        fp = self.fp
+        compression = None
+        for encoding_id, encoding_size, encoding_position in children(fp, start, end):
+            if encoding_id != CONTENT_ENCODING:
+                continue
+            scope = 1
+            for child_id, child_size, child_position in children(fp, encoding_position,
+                                                                  encoding_position + encoding_size):
+                if child_id == CONTENT_ENCODING_SCOPE:
+                    scope = read_uint(fp, child_size)
+                elif child_id == CONTENT_ENCRYPTION:
+                    raise MatroskaError('Encrypted tracks are not supported')
+                elif child_id == CONTENT_COMPRESSION:
+                    algorithm = 0
+                    settings = b''
+                    for setting_id, setting_size, _ in children(fp, child_position, child_position + child_size):
+                        if setting_id == CONTENT_COMP_ALGO:
+                            algorithm = read_uint(fp, setting_size)
+                        elif setting_id == CONTENT_COMP_SETTINGS:
+                            settings = fp.read(setting_size)
+                    if algorithm not in (0, 3):
+                        raise MatroskaError('Compression algorithm {} is not supported'.format(algorithm))
+                    compression = (algorithm, settings, scope)
+        return compression
+
+    def cue_positions(self):
+        """
+        Find the subtitle blocks with the Cues.
+
+        Returns a set of (cluster_position, relative_position) of the cued blocks of the
+        subtitle tracks, relative_position is None when the Cues do not have it, or None
+        when the Cues have no entries for the subtitle tracks.
+        """
+
+        if self.element_position(CUES) is None:
+            return None
+        fp = self.fp
+        positions = set()
+        for point_id, point_size, point_position in self.children_of(CUES):
+            if point_id != CUE_POINT:
+                continue
+            for child_id, child_size, child_position in children(fp, point_position, point_position + point_size):
+                if child_id != CUE_TRACK_POSITIONS:
+                    continue
+                track = cluster_position = relative_position = None
+                for cue_id, cue_size, _ in children(fp, child_position, child_position + child_size):
+                    if cue_id == CUE_TRACK:
+                        track = read_uint(fp, cue_size)
+                    elif cue_id == CUE_CLUSTER_POSITION:
+                        cluster_position = read_uint(fp, cue_size)
+                    elif cue_id == CUE_RELATIVE_POSITION:
+                        relative_position = read_uint(fp, cue_size)
+                if track in self.tracks and cluster_position is not None:
+                    positions.add((self.segment_position + cluster_position, relative_position))
+        return positions or None
+
+    def read_events(self):
+        """
+        Read the Dialogues of every SubStation track from the blocks, see MatroskaTrack.events.
+        """
+
+        if not self.tracks:
+            return
+
+        cued_blocks = self.cue_positions()
+        if cued_blocks is None:
+            # No usable Cues, walk every Cluster
+            if self.clusters is None:
+                self.walk_elements()
+            for cluster_position in self.clusters:
+                self.read_cluster(cluster_position)
+            return
+
+        # Clusters are read once, the blocks without relative position are found by walking their Cluster
+        walked_clusters = {cluster_position for cluster_position, relative_position in cued_blocks
+                           if relative_position is None}
+        for cluster_position in sorted(walked_clusters):
+            self.read_cluster(cluster_position)
+
+        cluster_timecodes = {}
+        for cluster_position, relative_position in sorted(cued_blocks):
+            if relative_position is None or cluster_position in walked_clusters:
+                continue
+            if cluster_position not in cluster_timecodes:
+                cluster_timecodes[cluster_position] = self.cluster_timecode(cluster_position)
+            cluster_timecode, data_position = cluster_timecodes[cluster_position]
+            block_id, block_size, block_position = self.element_at(data_position + relative_position)
+            self.read_block(block_id, block_size, block_position, cluster_timecode)
+
+    def cluster_timecode(self, cluster_position):
+        # Returns (timecode, data_position) of a Cluster, the Timecode is its first element
+        element_id, size, data_position = self.element_at(cluster_position)
+        if element_id != CLUSTER:
+            raise MatroskaError('Cues point to a missing Cluster')
+        for child_id, child_size, _ in children(self.fp, data_position, None if size is None else data_position + size):
+            if child_id == CLUSTER_TIMECODE:
+                return read_uint(self.fp, child_size), data_position
+            if child_id in (SIMPLE_BLOCK, BLOCK_GROUP):
+                break
+        raise MatroskaError('Cluster without Timecode')
+
+    def read_cluster(self, cluster_position):
+        # Read the subtitle blocks of a Cluster, the other blocks are skipped after their track number
+        element_id, size, data_position = self.element_at(cluster_position)
+        if element_id != CLUSTER:
+            raise MatroskaError('Cues point to a missing Cluster')
+        end = self.segment_end if size is None else data_position + size
+        cluster_timecode = 0
+        position = data_position
+        while position < end:
+            self.fp.seek(position)
+            try:
+                child_id, child_size, child_position = read_element_header(self.fp)
+            except EOFError:
+                return
+            if child_id in TOP_LEVEL_IDS or child_size is None:
+                # The end of a Cluster of unknown size
+                return
+            if child_id == CLUSTER_TIMECODE:
+                cluster_timecode = read_uint(self.fp, child_size)
+            else:
+                self.read_block(child_id, child_size, child_position, cluster_timecode)
+            position = child_position + child_size
+
+    def read_block(self, block_id, block_size, block_position, cluster_timecode):
+        fp = self.fp
+        duration = 0
+        if block_id == BLOCK_GROUP:
+            block = None
+            for child_id, child_size, child_position in children(fp, block_position, block_position + block_size):
+                if child_id == BLOCK:
+                    block = (child_size, child_position)
+                elif child_id == BLOCK_DURATION:
+                    duration = read_uint(fp, child_size)
+            if block is None:
+                return
+            block_size, block_position = block
+        elif block_id != SIMPLE_BLOCK:
+            return
+
+        fp.seek(block_position)
+        track_number, length = read_vint(fp)
+        track = self.tracks.get(track_number)
+        if track is None:
+            return
+
+        relative_timecode, flags = struct.unpack('>hB', fp.read(3))
+        if flags & 0x06:
+            raise MatroskaError('Laced subtitle blocks are not supported')
+        payload = fp.read(block_size - length - 3)
+
+        # Timecodes are in TimecodeScale nanoseconds
+        start = (cluster_timecode + relative_timecode) * self.timecode_scale // 1000000
+        track.add_block(payload, start, duration * self.timecode_scale // 1000000)
+
+    def attachments(self):
+        """
+        List the attached files, without reading their data.
+
+        Returns a list of (name, mime_type, data_position, size).
+        """
+
+        if self.element_position(ATTACHMENTS) is None:
+            return []
+        fp = self.fp
+        attachments = []
+        for file_id, file_size, file_position in self.children_of(ATTACHMENTS):
+            if file_id != ATTACHED_FILE:
+                continue
+            name = mime_type = data = None
+            for child_id, child_size, child_position in children(fp, file_position, file_position + file_size):
+                if child_id == FILE_NAME:
+                    name = read_string(fp, child_size)
+                elif child_id == FILE_MIME_TYPE:
+                    mime_type = read_string(fp, child_size)
+                elif child_id == FILE_DATA:
+                    data = (child_position, child_size)
+            if name is not None and data is not None:
+                attachments.append((name, mime_type, *data))
+        return attachments
+
+    def font_attachments(self):
+        # The attachments which are fonts, by MIME type or extension, see attachments()
+        return [attachment for attachment in self.attachments()
+                if attachment[1] in FONT_MIME_TYPES or attachment[0].lower().endswith(FONT_EXTENSIONS)]
+
+    def read_attachment(self, data_position, size):
+        self.fp.seek(data_position)
+        return self.fp.read(size)
+
+
+def read_ass_tracks(full_file_path):
+    # Read the SubStation tracks of a Matroska file, returns (tracks, font_attachments), see MatroskaFile
+    with MatroskaFile(full_file_path) as matroska:
+        matroska.read_events()
+        return list(matroska.tracks.values()), matroska.font_attachments()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m collector.matroska',
+                                     description='List the SubStation tracks and font attachments of Matroska files.')
+    parser.add_argument('files', nargs='+', help='Matroska files')
+    parser.add_argument('--extract', action='store_true',
+                        help='Also write every SubStation track next to the file, as NAME.TRACK.ass')
+    args = parser.parse_args()
+
+    for full_file_path in args.files:
+        try:
+            tracks, font_attachments = read_ass_tracks(full_file_path)
+        except (OSError, MatroskaError) as err:
+            print('{}\terror\t{}'.format(full_file_path, err))
+            continue
+
+        for track in tracks:
+            print('{}\ttrack {}\t{}\t{}\t{}\t{} Dialogues'.format(full_file_path, track.number, track.codec_id,
+                                                                 track.language or '', track.name or '',
+                                                                 len(track.events)))
+            if args.extract:
+                path = '{}.{}.{}'.format(os.path.splitext(full_file_path)[0], track.number, track.format)
+                with open(path, 'w', encoding='utf-8-sig') as fp:
+                    fp.write(track.to_string())
+        for name, mime_type, _, size in font_attachments:
+            print('{}\tfont\t{}\t{}\t{} bytes'.format(full_file_path, name, mime_type or '', size))
+
+
+if __name__ == '__main__':
+    main()
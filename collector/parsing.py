@@ -0,0 +1,533 @@
+import hashlib
+import logging
+import multiprocessing
+import threading
+from collections import Counter
+from itertools import chain
+
+import pysubs2
+import ass_tag_parser
+
+from .archives import ArchiveError, file_signature, read_member, split_archive_path
+from .font_files import embedded_font_index
+from .fonts import DEFAULT_MEMO_SIZE, MISSING_STYLE_FONT, DialogueMemo, FontAccumulator, font_style_name
+from .loaders import MATROSKA_EXTENSIONS, AssScanner, open_subtitle
+from .logs import LogMessage, RecordBuffer, logger, rename_records, replay_records
+from .prefetch import DEFAULT_PREFETCH_DEPTH, prefetch_tasks
+from .split import DEFAULT_SPLIT_SIZE, split_task
+
+# How many files are sent to a worker process at once in parallel mode, the parts of split files go one by one
+PARALLEL_CHUNK_SIZE = 8
+
+
+class ParseContext:
+    """
+    Options of one parse_files() call, and the DialogueMemo shared by the files it parses.
+
+    Every call has its own context, so calls made at the same time, e.g. by the
+    threads of a service, or one after another with other options, never
+    change each other's results. See parse_files() for the options.
+    """
+
+    def __init__(self, memo_size=DEFAULT_MEMO_SIZE, scan=True, full_tags=False):
+        # Whether SubStation files are read with AssScanner
+        self.scan = scan
+        self.dialogue_memo = DialogueMemo(memo_size, full_tags)
+
+
+# The buffer and the context of the current worker process, see init_worker()
+worker_log_buffer = None
+worker_context = None
+
+
+def init_worker(memo_size, log_level, scan, full_tags):
+    global worker_log_buffer, worker_context
+
+    # Send all the worker logs to the buffer only
+    worker_log_buffer = RecordBuffer()
+    logger.handlers = [worker_log_buffer]
+    logger.setLevel(log_level)
+    logger.propagate = False
+
+    worker_context = ParseContext(memo_size, scan, full_tags)
+
+
+def parse_file(full_file_path, data=None, part=None, context=None):
+    """
+    Read one subtitle file and collect the fonts used in its Dialogues.
+
+    data is the file content when it was already read, e.g. by prefetch_tasks().
+    context is the ParseContext of the options, the default ones when it is None.
+    part is (part_index, parts_count) to read only one part of the Dialogues
+    of the file, see split_task(), the results of all the parts joined in order
+    are the result of the whole file, see join_parts(). Files which are not
+    SubStation are read whole by their first part.
+
+    Returns a tuple (file_fonts, unparsed_events, error, style_table) where
+    file_fonts is a FontAccumulator with the characters used by every font in
+    this file, unparsed_events is a list of (event, style) for the Dialogues that
+    could not be parsed, style is None when the Dialogue style does not exist,
+    error is the message of the error which stopped reading the file, or None,
+    and style_table is the file styles table, see build_style_table().
+    """
+
+    # Fonts used in this file
+    file_fonts = FontAccumulator()
+
+    # Dialogues which could not be parsed
+    unparsed_events = []
+
+    # Why the file could not be read
+    error = None
+
+    # Fonts of the file styles, empty when the file could not be opened
+    style_table = {}
+
+    if context is None:
+        context = ParseContext()
+
+    # The file is logged once, by its first part
+    first_part = part is None or part[0] == 0
+
+    # Logging the current file
+    if first_part and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(LogMessage('Working on file {FILE_NAME}', {'FILE_NAME': full_file_path}))
+
+    try:
+        # Open the subtitle file and parse it
+        if part is None:
+            subtitle = open_subtitle(full_file_path, context.scan, data)
+        else:
+            try:
+                subtitle = AssScanner(full_file_path, part=part)
+            except pysubs2.FormatAutodetectionError:
+                # The other parts have nothing to read, the first part reports the file
+                if not first_part:
+                    return file_fonts, unparsed_events, error, style_table
+                subtitle = open_subtitle(full_file_path, context.scan)
+        with subtitle:
+            style_table = subtitle.style_table
+            # Matroska files may have many subtitle tracks
+            for track in subtitle.tracks():
+                parse_dialogues(full_file_path, track, file_fonts, unparsed_events, context.dialogue_memo, first_part)
+            check_embedded_fonts(full_file_path, subtitle, file_fonts)
+
+    except (pysubs2.FormatAutodetectionError, pysubs2.Pysubs2Error,
+            pysubs2.UnknownFileExtensionError, pysubs2.UnknownFormatIdentifierError,
+            pysubs2.UnknownFPSError) as errr:
+        logger.warning(LogMessage('Error occurred while parsing file {FILE_NAME}\n Error message is "{ERROR}"', {
+            'FILE_NAME': full_file_path,
+            'ERROR': errr
+        }))
+        error = str(errr)
+    except (OSError, TypeError, ValueError, AttributeError, KeyError) as errrrr:
+        logger.warning(LogMessage('Error occurred while parsing file {FILE_NAME}\n Error message is "{ERROR}"', {
+            'FILE_NAME': full_file_path,
+            'ERROR': errrrr
+        }))
+        error = str(errrrr)
+
+    return file_fonts, unparsed_events, error, style_table
+
+
+def check_embedded_fonts(full_file_path, subtitle, file_fonts):
+    # Warn about the fonts used by a file which embeds fonts, but not these ones, nothing is written to disk
+    try:
+        font_index, errors = embedded_font_index(subtitle.embedded_fonts())
+    except ValueError as err:
+        logger.warning(LogMessage('Cannot decode the fonts embedded in file {FILE_NAME}\n Error message is "{ERROR}"', {
+            'FILE_NAME': full_file_path,
+            'ERROR': err,
+        }))
+        return
+
+    for name, error in errors.items():
+        logger.warning(LogMessage('Embedded font {FONT_FILE} of file {FILE_NAME} cannot be read\n'
+                                  ' Error message is "{ERROR}"', {
+                                      'FONT_FILE': name,
+                                      'FILE_NAME': full_file_path,
+                                      'ERROR': error,
+                                  }))
+
+    # Files without embedded fonts rely on installed fonts
+    if not font_index.entries:
+        return
+
+    for font_key in file_fonts.fonts:
+        # Characters of missing styles have no font
+        if font_key[0] is None:
+            continue
+        font_file = font_index.resolve(font_key)
+        if font_file is None:
+            logger.warning(LogMessage('Font {FONT} is used in file {FILE_NAME} but it is not embedded', {
+                'FONT': font_style_name(font_key),
+                'FILE_NAME': full_file_path,
+            }))
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug(LogMessage('Font {FONT} is embedded as {FONT_FILE}', {
+                'FONT': font_style_name(font_key),
+                'FONT_FILE': font_file[0],
+            }))
+
+
+def parse_dialogues(full_file_path, subtitle, file_fonts, unparsed_events, dialogue_memo, log_styles=True):
+    # Collect the fonts of all the Dialogues of an opened subtitle file, resolved with dialogue_memo,
+    # log_styles is False for the parts of a split file after the first one
+
+    # Check the enabled levels once, so no message is prepared when it would not be logged
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    warning_enabled = logger.isEnabledFor(logging.WARNING)
+    error_enabled = logger.isEnabledFor(logging.ERROR)
+
+    # Fonts of all the styles in this file
+    style_table = subtitle.style_table
+
+    if debug_enabled and log_styles:
+        logger.debug('Loaded the file successfully.')
+        logger.debug(LogMessage('File "{FILE_NAME}" has "{STYLES_NUMBER}" styles, and there names are \n"{STYLES_LIST}"', {
+            'FILE_NAME': full_file_path,
+            'STYLES_NUMBER': len(style_table),
+            'STYLES_LIST': list(style_table)
+        }))
+
+    # For each Dialogue in the subtitle file
+    for event_style, event_text, line in subtitle.dialogues():
+
+        # Check if the Dialogue is not empty
+        if len(event_text) == 0:
+            continue
+
+        if debug_enabled:
+            logger.debug(LogMessage('Processing Dialogue: "{DIALOGUE}"', {
+                'DIALOGUE': event_text
+            }))
+
+        # Prepare font properties from the Dialogue style
+        base_font = style_table.get(event_style, MISSING_STYLE_FONT)
+
+        # Check if Style in Dialogue is in Styles list
+        if base_font is MISSING_STYLE_FONT and error_enabled:
+
+            # If the style used in this Dialogue is not in styles, then show this warning
+            event = subtitle.event(line)
+            logger.error(LogMessage('Style "{STYLE_NAME}" is not in \n"{STYLES_LIST}",\n'
+                                    'This Style used in "{EVENT_TYPE}" '
+                                    'with this content \n"{EVENT_CONTENT}",\n'
+                                    'found in file with this name: "{FILE_NAME}"', {
+                                        'STYLE_NAME': event_style,
+                                        'STYLES_LIST': list(style_table),
+                                        'EVENT_TYPE': event.type,
+                                        'EVENT_CONTENT': event,
+                                        'FILE_NAME': full_file_path,
+                                    }))
+
+        try:
+            runs, reset_styles = dialogue_memo.resolve(event_text, base_font, style_table)
+
+            # Report {\r} tags with styles which are not in the style list
+            for style_name, font in reset_styles:
+                if font is None and error_enabled:
+                    logger.error(LogMessage('The Dialogue \n"{DIALOGUE_TEXT}"\n has {RESET_TAG} tag, '
+                                            'This tag tried to set style to {RESET_TAG_STYLE_NAME}, '
+                                            'But {RESET_TAG_STYLE_NAME} is not is \n{STYLES_LIST},\n'
+                                            'in file {FILE_NAME}', {
+                                                'DIALOGUE_TEXT': event_text,
+                                                'RESET_TAG': r'{\r}',
+                                                'RESET_TAG_STYLE_NAME': style_name,
+                                                'STYLES_LIST': list(style_table),
+                                                'FILE_NAME': full_file_path,
+                                            }))
+
+            for font_key, text in runs:
+                # If no font name selected then style does not exists
+                if font_key[0] is None:
+                    if warning_enabled:
+                        logger.warning(LogMessage('Dialogue with this text \n"{DIALOGUE_TEXT}"\n'
+                                                  ' has a style named "{STYLE_NAME}"'
+                                                  ', but "{STYLE_NAME}" does not exists in '
+                                                  '\n{STYLES_LIST}\n in file "{FILE_NAME}"', {
+                                                      'DIALOGUE_TEXT': event_text,
+                                                      'STYLE_NAME': event_style,
+                                                      'STYLES_LIST': list(style_table),
+                                                      'FILE_NAME': full_file_path,
+                                                  }))
+
+                # If there is a font
+                else:
+                    # Add all used characters in this text to the font
+                    file_fonts.add(font_key, text)
+
+        except (ass_tag_parser.BaseError, ass_tag_parser.ParseError,
+                ass_tag_parser.UnexpectedCurlyBrace, ass_tag_parser.UnknownTag,
+                ass_tag_parser.UnterminatedCurlyBrace, ass_tag_parser.BadAssTagArgument) as errrr:
+            logger.warning(LogMessage('Error occurred while parsing {DIALOGUE}\nin file {FILE_NAME}\n Error message is "{ERROR}"', {
+                'DIALOGUE': event_text,
+                'FILE_NAME': full_file_path,
+                'ERROR': errrr
+            }))
+
+            # add the unparsed tag to unparsed list with its style if exists
+            unparsed_events.append((subtitle.event(line), subtitle.style(event_style)))
+
+
+def file_hash(full_file_path, data=None):
+    # Hash the file content, used when size or modification time changed, data is the content if already read
+    digest = hashlib.blake2b(digest_size=20)
+    if data is None and split_archive_path(full_file_path) is not None:
+        data = read_member(full_file_path)
+    if data is not None:
+        digest.update(data)
+        return digest.hexdigest()
+    with open(full_file_path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_file_cached(full_file_path, cached_signature, use_cache, data=None, part=None, context=None):
+    """
+    Parse the file unless it did not change since it was cached.
+
+    data is the file content when it was already read, part the part of
+    the file to parse and context the options, see parse_file().
+
+    Returns a tuple (signature, result), where signature is (size, mtime, hash)
+    of the file, or None if the cache is not used, and result is the return
+    of parse_file(), or None when the cached result is still valid.
+    Matroska files are not hashed, it would read the whole video, their hash
+    is None and they are parsed again whenever their size or mtime changed.
+    """
+
+    if not use_cache:
+        return None, parse_file(full_file_path, data, part, context)
+
+    try:
+        size, mtime = file_signature(full_file_path)
+        # Same size and modification time, no need to read the file
+        if cached_signature is not None and (size, mtime) == cached_signature[:2]:
+            return cached_signature, None
+
+        if full_file_path.lower().endswith(MATROSKA_EXTENSIONS):
+            digest = None
+        else:
+            digest = file_hash(full_file_path, data)
+            # The file was touched, but the content may be the same
+            if cached_signature is not None and digest == cached_signature[2]:
+                return (size, mtime, digest), None
+    except (OSError, ArchiveError):
+        # Let parse_file() report the problem
+        return None, parse_file(full_file_path, data, part, context)
+
+    return (size, mtime, digest), parse_file(full_file_path, data, part, context)
+
+
+def parse_file_in_process(task, context):
+    # Parse the file in this process, and capture the warnings to be cached with the result,
+    # only the ones of this thread, other threads may be parsing other files
+    warnings_buffer = RecordBuffer(logging.WARNING)
+    thread_id = threading.get_ident()
+    warnings_buffer.addFilter(lambda record: record.thread == thread_id)
+    logger.addHandler(warnings_buffer)
+    try:
+        signature, result = parse_file_cached(*task, context=context)
+    finally:
+        logger.removeHandler(warnings_buffer)
+    return task[0], signature, result, warnings_buffer.flush_records(), context.dialogue_memo.flush_stats()
+
+
+def parse_file_in_worker(task):
+    # Parse the file and send its log records back with the result
+    signature, result = parse_file_cached(*task, context=worker_context)
+    return task[0], signature, result, worker_log_buffer.flush_records(), worker_context.dialogue_memo.flush_stats()
+
+
+def parse_batch_in_worker(batch):
+    # Parse a batch of files, see batch_tasks(), and send the results back together
+    return [parse_file_in_worker(task) for task in batch]
+
+
+def batch_tasks(tasks, split_size, parts_counts):
+    # Group the tasks by PARALLEL_CHUNK_SIZE, like the chunks of imap, but split the large files and give
+    # every part its own batch, so the parts go to all the workers, the parts count of every file is kept
+    # in parts_counts for join_parts()
+    batch = []
+    for task in tasks:
+        part_tasks = split_task(task, split_size) if split_size > 0 else None
+        if part_tasks is None:
+            batch.append(task)
+            if len(batch) >= PARALLEL_CHUNK_SIZE:
+                yield batch
+                batch = []
+            continue
+
+        if batch:
+            yield batch
+            batch = []
+        parts_counts[task[0]] = len(part_tasks)
+        for part_task in part_tasks:
+            yield [part_task]
+
+    if batch:
+        yield batch
+
+
+def join_parts(results, parts_counts, summary):
+    """
+    Join the results of the parts of every split file, see batch_tasks(), into one result of the whole file.
+
+    results are the results of parse_file_in_worker() in tasks order. The fonts,
+    unparsed events and log records of the parts are joined in order, up to the
+    part which stopped on an error, as reading the whole file stops there. The
+    signature is the one of the first part. Split files are counted as
+    split_files in summary, a Counter, if given.
+    """
+
+    results = iter(results)
+    for full_file_path, signature, result, records, memo_stats in results:
+        parts_count = parts_counts.pop(full_file_path, None)
+        if parts_count is None:
+            yield full_file_path, signature, result, records, memo_stats
+            continue
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(LogMessage('File {FILE_NAME} was parsed in {PARTS_COUNT} parts', {
+                'FILE_NAME': full_file_path,
+                'PARTS_COUNT': parts_count,
+            }))
+        if summary is not None:
+            summary['split_files'] += 1
+
+        file_fonts = FontAccumulator()
+        unparsed_events = []
+        error = None
+        style_table = result[3]
+        file_records = []
+        memo_hits = memo_misses = 0
+        part_results = chain([(result, records, memo_stats)],
+                             (next(results)[2:] for _ in range(parts_count - 1)))
+        for (part_fonts, part_unparsed_events, part_error, _), part_records, (part_hits, part_misses) in part_results:
+            memo_hits += part_hits
+            memo_misses += part_misses
+            if error is not None:
+                continue
+            file_fonts.merge(part_fonts)
+            unparsed_events.extend(part_unparsed_events)
+            file_records.extend(part_records)
+            error = part_error
+
+        yield (full_file_path, signature, (file_fonts, unparsed_events, error, style_table), file_records,
+               (memo_hits, memo_misses))
+
+
+def parse_results(results, replay, cache, summary):
+    # Yield (full_file_path, file_result, warnings) of the parsed files, from parse_file_in_process() or
+    # parse_file_in_worker(), where file_result is the return of parse_file() and warnings its warning records
+    for full_file_path, signature, result, records, (memo_hits, memo_misses) in results:
+        if replay:
+            replay_records(records)
+
+        if summary is not None:
+            summary['memo_hits'] += memo_hits
+            summary['memo_misses'] += memo_misses
+
+        if result is None:
+            # The file did not change, use the cached result and show its warnings again
+            logger.debug(LogMessage('Using cached result for file {FILE_NAME}', {'FILE_NAME': full_file_path}))
+            file_fonts, unparsed_events, error, style_table, records = cache.get(full_file_path, signature)
+            replay_records(records)
+            result = file_fonts, unparsed_events, error, style_table
+        elif cache is not None and signature is not None:
+            cache.put(full_file_path, signature, *result, records)
+
+        yield full_file_path, result, [record for record in records if record.levelno >= logging.WARNING]
+
+
+def parse_files(subtitles_full_path, jobs=1, cache=None, memo_size=DEFAULT_MEMO_SIZE, summary=None, scan=True,
+                full_tags=False, duplicates=None, prefetch_depth=DEFAULT_PREFETCH_DEPTH, split_size=DEFAULT_SPLIT_SIZE):
+    """
+    Parse all the files, yielding (full_file_path, file_fonts, unparsed_events, error, style_table)
+    in files order, see parse_file().
+
+    When jobs is more than 1 the files are parsed by a pool of worker processes,
+    the log records of every file are replayed here in the same order as a serial run.
+    When a cache is given, files which did not change are not parsed again.
+    memo_size is the number of Dialogues kept by each DialogueMemo, and the
+    memo hits and misses are counted in summary, a Counter, if given.
+    When scan is False, all files are loaded with pysubs2 instead of AssScanner.
+    When full_tags is True, Dialogues are parsed with parse_ass, so a Dialogue
+    with any bad tag is unparsed, instead of reading only the font tags.
+    duplicates maps files to their original, see find_duplicates(), duplicates are
+    not parsed, they get the result and the warnings of their original, and are
+    counted as duplicate_files in summary.
+    In serial mode, the next prefetch_depth files are read by threads while a file
+    is parsed, see prefetch_tasks(), 0 disables it. Worker processes read their
+    own files, so their reads already overlap the parsing of the others.
+    When jobs is more than 1, the Dialogues of files larger than split_size
+    bytes are split into parts parsed by many workers at once, see
+    split_task(), 0 disables it. Files are read with AssScanner to be
+    split, so they are not when scan is False.
+    """
+
+    if duplicates:
+        # Files are listed twice, once for the tasks and once for the results order
+        subtitles_full_path = list(subtitles_full_path)
+
+    # Each task carries the cached signature, so checking it happens in the workers
+    tasks = ((full_file_path, cache.signature(full_file_path) if cache is not None else None, cache is not None)
+             for full_file_path in subtitles_full_path if not duplicates or full_file_path not in duplicates)
+
+    pool = None
+    if jobs <= 1:
+        # Serial mode, parse in this process, the log records were already handled
+        context = ParseContext(memo_size, scan, full_tags)
+        if prefetch_depth > 0:
+            tasks = prefetch_tasks(tasks, prefetch_depth, summary)
+        results = (parse_file_in_process(task, context) for task in tasks)
+    else:
+        pool = multiprocessing.Pool(jobs, initializer=init_worker, initargs=(memo_size, logger.getEffectiveLevel(), scan,
+                                                                              full_tags))
+        # imap keeps the files order, so results are merged the same way as serial mode
+        parts_counts = {}
+        batches = pool.imap(parse_batch_in_worker, batch_tasks(tasks, split_size if scan else 0, parts_counts))
+        results = join_parts(chain.from_iterable(batches), parts_counts, summary)
+
+    try:
+        parsed_results = parse_results(results, pool is not None, cache, summary)
+        if not duplicates:
+            for full_file_path, file_result, _ in parsed_results:
+                yield (full_file_path, *file_result)
+            return
+
+        # Results and warnings of the originals which have duplicates still to come
+        original_results = {}
+        pending_duplicates = Counter(original for original, _ in duplicates.values())
+
+        for full_file_path in subtitles_full_path:
+            if full_file_path not in duplicates:
+                _, file_result, warnings = next(parsed_results)
+                if pending_duplicates[full_file_path]:
+                    original_results[full_file_path] = (file_result, warnings)
+                yield (full_file_path, *file_result)
+                continue
+
+            original, signature = duplicates[full_file_path]
+            file_result, warnings = original_results[original]
+            pending_duplicates[original] -= 1
+            if not pending_duplicates[original]:
+                del original_results[original]
+
+            logger.debug(LogMessage('File {FILE_NAME} has the same content as {ORIGINAL_FILE}, using its result', {
+                'FILE_NAME': full_file_path,
+                'ORIGINAL_FILE': original,
+            }))
+            records = rename_records(warnings, original, full_file_path)
+            replay_records(records)
+            if summary is not None:
+                summary['duplicate_files'] += 1
+            if cache is not None:
+                cache.put(full_file_path, signature, *file_result, records)
+
+            yield (full_file_path, *file_result)
+    finally:
+        if pool is not None:
+            pool.terminate()
@@ -0,0 +1,146 @@
+import copy
+import logging
+import pickle
+import socket
+from collections import Counter
+
+from .atomic import pickle_atomically
+from .fonts import FontAccumulator, font_style_name
+from .logs import LogMessage, RecordBuffer, logger, replay_records
+from .report import CollectionReport
+from .spill import SpillingFontAccumulator
+
+# Increase this when the partial content changes, partials of other versions cannot be merged
+PARTIAL_VERSION = 3
+
+
+class PartialError(ValueError):
+    pass
+
+
+def default_shard_name():
+    # Shards are named after the machine they run on, so the same path on two machines is two files
+    return socket.gethostname()
+
+
+class RecordCopies(RecordBuffer):
+    # Keep copies of the records, the other handlers of the logger still format the originals
+    def emit(self, record):
+        super().emit(copy.copy(record))
+
+
+class PartialBuilder:
+    """
+    Partial result of collecting one shard, e.g. the subtree of one storage node, for merge_partials().
+
+    add_file() takes the results of parse_files(), so it can be the on_file of
+    collect_fonts(). The partial keeps the character counts of all the files of
+    the shard added together, so its size depends on the fonts and characters,
+    not on the number of files, with the path of every file, the errors, the
+    unparsed events and, once records is attached to the logger, the warning and
+    error records logged while collecting, which --reduce writes to its log files.
+    """
+
+    def __init__(self, shard, variant=None):
+        self.shard = shard
+        # Partials made with other options collect other characters, see ResultCache
+        self.variant = variant
+        self.fonts = FontAccumulator()
+        self.files = []
+        # Only the files which could not be read
+        self.errors = {}
+        self.unparsed_events = []
+        self.records = RecordCopies(logging.WARNING)
+
+    def add_file(self, full_file_path, file_fonts, unparsed_events, error, style_table):
+        self.fonts.merge(file_fonts)
+        self.files.append(full_file_path)
+        if error is not None:
+            self.errors[full_file_path] = error
+        self.unparsed_events.extend(unparsed_events)
+
+    def save(self, path):
+        partial = {
+            'version': (PARTIAL_VERSION, self.variant),
+            'shard': self.shard,
+            'fonts': {font_key: dict(characters) for font_key, characters in self.fonts.fonts.items()},
+            'files': self.files,
+            'errors': self.errors,
+            'unparsed': self.unparsed_events,
+            'records': self.records.records,
+        }
+        # A failed shard never leaves half a partial to merge
+        pickle_atomically(partial, path)
+
+        logger.info(LogMessage('Wrote the partial result of shard {SHARD} to {PARTIAL_FILE}, '
+                               '{FILES_COUNT} files and {FONTS_COUNT} fonts', {
+                                   'SHARD': self.shard,
+                                   'PARTIAL_FILE': path,
+                                   'FILES_COUNT': len(self.files),
+                                   'FONTS_COUNT': len(self.fonts),
+                               }))
+
+
+def read_partial(path):
+    # Read a partial written by PartialBuilder.save(), raises PartialError when it cannot be merged
+    try:
+        with open(path, 'rb') as fp:
+            partial = pickle.load(fp)
+        version = partial['version']
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError, KeyError) as err:
+        raise PartialError('Cannot read partial file {}: {}'.format(path, err))
+    if version[0] != PARTIAL_VERSION:
+        raise PartialError('Partial file {} has version {}, only version {} can be merged'.format(
+            path, version[0], PARTIAL_VERSION))
+    return partial
+
+
+def merge_partials(partials, memory_budget=None):
+    """
+    Merge partials from read_partial() into a CollectionReport, like collect_fonts() of all the shards.
+
+    Files are named SHARD:PATH. Partials are keyed by their shard, so a partial
+    merged twice, e.g. a retried shard, changes nothing, the one read last is
+    kept. Shards are merged in name order and the report lists fonts sorted, so
+    the result does not depend on the partials order either. The warning and
+    error records of every shard are logged again. When memory_budget is given,
+    the character counts are kept under about this many bytes like in
+    collect_fonts(). Raises PartialError when partials were made with other options.
+    """
+
+    variant = None
+    shards = {}
+    for partial in partials:
+        if shards and partial['version'][1] != variant:
+            raise PartialError('Partials of shard {} were collected with other options ({} and {})'.format(
+                partial['shard'], partial['version'][1], variant))
+        variant = partial['version'][1]
+        shards[partial['shard']] = partial
+
+    # Fonts sorted by name
+    font_keys = sorted({font_key for partial in shards.values() for font_key in partial['fonts']},
+                       key=lambda font_key: (font_style_name(font_key), font_key))
+    report = CollectionReport()
+    if memory_budget is not None:
+        report.fonts = SpillingFontAccumulator(memory_budget, font_keys=font_keys)
+    else:
+        report.fonts.fonts = {font_key: Counter() for font_key in font_keys}
+    for shard in sorted(shards):
+        partial = shards[shard]
+        shard_fonts = FontAccumulator()
+        shard_fonts.fonts = partial['fonts']
+        report.fonts.merge(shard_fonts)
+        report.files.extend('{}:{}'.format(shard, full_file_path) for full_file_path in partial['files'])
+        for full_file_path, error in partial['errors'].items():
+            report.errors['{}:{}'.format(shard, full_file_path)] = error
+        report.unparsed_events.extend(partial['unparsed'])
+        replay_records(partial['records'])
+    if memory_budget is not None:
+        report.fonts.finish()
+
+    logger.info(LogMessage('Merged {PARTIALS_COUNT} partials, {FILES_COUNT} files and {FONTS_COUNT} fonts', {
+        'PARTIALS_COUNT': len(shards),
+        'FILES_COUNT': len(report.files),
+        'FONTS_COUNT': len(report.fonts),
+    }))
+    return report
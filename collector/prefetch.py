@@ -0,0 +1,76 @@
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .archives import ArchiveError, file_signature, split_archive_path
+from .loaders import MATROSKA_EXTENSIONS
+
+# Default number of files read ahead of the parsed one, see prefetch_tasks()
+DEFAULT_PREFETCH_DEPTH = 8
+
+# Most threads reading files at once, a few are enough to keep a disk or a network share busy
+PREFETCH_THREADS = 4
+
+# Larger files are read when they are parsed, so the queue never holds much memory
+PREFETCH_MAX_SIZE = 16 * 1024 * 1024
+
+
+def read_task_data(task):
+    """
+    Read the content of the file of a parse_file_cached() task, or return None when it is better left unread.
+
+    Files whose cached signature did not change are not parsed, so they are not
+    read. Matroska files are read by seeking, archive members are read from their
+    open archive, and large files are read when parsed. Errors are left for
+    parse_file() to report.
+    """
+
+    full_file_path, cached_signature, use_cache = task
+    if full_file_path.lower().endswith(MATROSKA_EXTENSIONS):
+        return None
+    try:
+        if split_archive_path(full_file_path) is not None:
+            return None
+        size, mtime = file_signature(full_file_path)
+        if size > PREFETCH_MAX_SIZE:
+            return None
+        if use_cache and cached_signature is not None and (size, mtime) == cached_signature[:2]:
+            return None
+        with open(full_file_path, 'rb') as fp:
+            return fp.read()
+    except (OSError, ArchiveError):
+        return None
+
+
+def prefetch_tasks(tasks, depth=DEFAULT_PREFETCH_DEPTH, summary=None):
+    """
+    Read the files of upcoming tasks on a thread pool while the current one is parsed.
+
+    Yields every task with the file content appended, see read_task_data(),
+    in tasks order. At most depth files are read ahead. Every time the content
+    of a file is not read yet when it is needed, prefetch_stalls is counted in
+    summary, a Counter, and the waited seconds in prefetch_stall_seconds.
+    """
+
+    with ThreadPoolExecutor(min(depth, PREFETCH_THREADS), thread_name_prefix='prefetch') as executor:
+        # (task, future) of the files being read, in tasks order
+        queue = collections.deque()
+        tasks = iter(tasks)
+        while True:
+            # Fill the queue first, then the parser waits only when the disk is slower
+            for task in tasks:
+                queue.append((task, executor.submit(read_task_data, task)))
+                if len(queue) >= depth:
+                    break
+            if not queue:
+                return
+
+            task, future = queue.popleft()
+            if not future.done() and summary is not None:
+                waited_from = time.perf_counter()
+                data = future.result()
+                summary['prefetch_stalls'] += 1
+                summary['prefetch_stall_seconds'] += time.perf_counter() - waited_from
+            else:
+                data = future.result()
+            yield (*task, data)
@@ -0,0 +1,176 @@
+import logging
+from collections import Counter
+
+import pysubs2
+
+from .fonts import DEFAULT_MEMO_SIZE, FontAccumulator, font_style_name
+from .duplicates import find_duplicates
+from .logs import logger
+from .parsing import parse_files
+from .prefetch import DEFAULT_PREFETCH_DEPTH
+from .spill import SpillingFontAccumulator
+from .split import DEFAULT_SPLIT_SIZE
+
+
+class CollectionReport:
+    """
+    Fonts and characters collected from subtitle files, returned by collect_fonts().
+
+    fonts is a FontAccumulator with the characters used by every font of all files,
+    unparsed_events is a list of (event, style) for the Dialogues that could not be parsed,
+    errors maps the full path of every file which could not be read to the error message,
+    files is the list of collected files and summary counts the memo hits and misses.
+    """
+
+    def __init__(self):
+        self.fonts = FontAccumulator()
+        self.unparsed_events = []
+        self.errors = {}
+        self.files = []
+        self.summary = Counter()
+
+    def add_file(self, full_file_path, file_fonts, unparsed_events, error):
+        # Merge the result of one file
+        self.files.append(full_file_path)
+        self.fonts.merge(file_fonts)
+        self.unparsed_events.extend(unparsed_events)
+        if error is not None:
+            self.errors[full_file_path] = error
+
+    def collection(self):
+        # The structure will be:
+        # { 'Fontname[-bold][-italic]' : {  # bold and italic depends on style state
+        #       'fontname': "FONT_NAME_GOES_HERE",
+        #       'bold': True or False,
+        #       'italic': True or False,
+        #       'characters': 'abcde...'
+        #    }
+        return dict(self.collection_items())
+
+    def collection_items(self):
+        # Yield the (name, details) items of collection(), the characters of one font at a time
+        for font_key, characters in self.fonts.items():
+            yield font_style_name(font_key), {
+                'fontname': font_key[0],
+                'bold': font_key[1],
+                'italic': font_key[2],
+                'characters': characters,
+            }
+
+    def output_ass(self, collection=None):
+        """
+        Build the output SSAFile, one style for every font and one Dialogue with its characters.
+
+        Without collection, the Dialogues are made while the SSAFile is saved, so
+        the characters of spilled fonts are merged one font at a time, see
+        SpillingFontAccumulator, and the SSAFile can only be saved once.
+        """
+
+        # Prepare the output ass file
+        output_ass = pysubs2.SSAFile()
+
+        # This part is not working, so I will comment it till I find the reason.
+        # output_ass.clear()  # Clear the ass file from all pre-defined styles.
+
+        # Insert all styles and their proper text to one ass file object
+        if collection is not None:
+            for details in collection:
+                output_ass.styles[details] = self.output_style(collection[details])
+                output_ass.append(self.output_event(details, collection[details]))
+            return output_ass
+
+        for font_key in self.fonts:
+            output_ass.styles[font_style_name(font_key)] = self.output_style({
+                'fontname': font_key[0],
+                'bold': font_key[1],
+                'italic': font_key[2],
+            })
+        # Only iterated by SSAFile.save()
+        output_ass.events = (self.output_event(details, collection_details)
+                             for details, collection_details in self.collection_items())
+        return output_ass
+
+    @staticmethod
+    def output_style(collection_details):
+        style = pysubs2.SSAStyle()
+        style.fontname = collection_details['fontname']
+        style.bold = collection_details['bold']
+        style.italic = collection_details['italic']
+        return style
+
+    @staticmethod
+    def output_event(details, collection_details):
+        event = pysubs2.SSAEvent()
+        event.text = collection_details['characters']
+        event.style = details
+        return event
+
+    def unparsed_ass(self):
+        """
+        Build an SSAFile with the unparsed Dialogues and their styles.
+
+        The idea of this file is: if the collector is not able to parse a Dialogue
+        for any reason, the file just stores the original Dialogue with its style,
+        this way all these broken rows can be investigated later.
+        """
+
+        unparsed_ass = pysubs2.SSAFile()
+        for event, style in self.unparsed_events:
+            if style is not None:
+                unparsed_ass.styles[event.style] = style
+
+            unparsed_ass.append(event)
+
+        return unparsed_ass
+
+
+def collect_fonts(paths, *, jobs=1, cache=None, memo_size=DEFAULT_MEMO_SIZE, scan=True, full_tags=False,
+                  dedupe=False, prefetch_depth=DEFAULT_PREFETCH_DEPTH, split_size=DEFAULT_SPLIT_SIZE,
+                  memory_budget=None, on_file=None):
+    """
+    Collect the fonts and characters used by subtitle files, returning a CollectionReport.
+
+    paths is an iterable of subtitle file paths, e.g. walk_subtitles(directory),
+    files are parsed by jobs worker processes when jobs is more than 1.
+    cache is a ResultCache or None, it is updated but not saved, so the same
+    cache can be used by many calls and saved once. See parse_files() for
+    memo_size, scan and full_tags. When dedupe is True, all the paths are listed
+    first and files with the same content as an earlier file are not parsed,
+    see find_duplicates(), they are still reported. See parse_files() for
+    prefetch_depth and split_size. When memory_budget is given, the character counts of the
+    fonts are kept under about this many bytes by spilling them to temporary
+    files, see SpillingFontAccumulator. on_file is called with the result of
+    every file, (full_file_path, file_fonts, unparsed_events, error, style_table)
+    as parse_files() yields it, e.g. IndexWriter.add_file.
+
+    Nothing is written, messages are only sent to the 'collector' logger.
+    """
+
+    report = CollectionReport()
+    if memory_budget is not None:
+        report.fonts = SpillingFontAccumulator(memory_budget)
+
+    duplicates = None
+    if dedupe:
+        paths = list(paths)
+        duplicates = find_duplicates(paths, cache)
+
+    logger.debug('Collected RAW data are:')
+
+    # Merge the result of each file in files order
+    for full_file_path, file_fonts, unparsed_events, error, style_table in parse_files(
+            paths, jobs, cache, memo_size, report.summary, scan, full_tags, duplicates, prefetch_depth, split_size):
+
+        # for each font data
+        if logger.isEnabledFor(logging.DEBUG):
+            for font_key, characters in file_fonts.items():
+                logger.debug([font_style_name(font_key), *font_key, characters])
+
+        report.add_file(full_file_path, file_fonts, unparsed_events, error)
+        if on_file is not None:
+            on_file(full_file_path, file_fonts, unparsed_events, error, style_table)
+
+    if memory_budget is not None:
+        report.fonts.finish()
+
+    return report
@@ -0,0 +1,286 @@
+import array
+import bisect
+import mmap
+import struct
+
+# First bytes of TrueType and OpenType fonts, and of font collections
+SFNT_VERSIONS = {b'\x00\x01\x00\x00', b'true', b'OTTO'}
+COLLECTION_TAG = b'ttcf'
+
+# Name IDs used to select a font: family, full name, PostScript name and typographic family
+FONT_NAME_IDS = {1, 4, 6, 16}
+SUBFAMILY_NAME_ID = 2
+
+# Encodings of Macintosh platform names, by encoding ID
+MAC_ENCODINGS = {0: 'mac_roman', 1: 'shift_jis', 2: 'big5', 3: 'euc_kr', 25: 'gb2312'}
+
+# Windows platform encoding IDs stored as UTF-16, symbol, Unicode BMP and full Unicode
+WINDOWS_UTF16_ENCODINGS = {0, 1, 10}
+
+
+class FontFormatError(ValueError):
+    pass
+
+
+def open_font(full_file_path):
+    # Memory map a font file, returns (file, data), both must be closed
+    fp = open(full_file_path, 'rb')
+    try:
+        return fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Empty files cannot be mapped
+        fp.close()
+        raise FontFormatError('Not a font file')
+
+
+def face_offsets(data):
+    # Offsets of the table directory of every face, one for a font file, more for a collection
+    tag = data[:4]
+    if tag == COLLECTION_TAG:
+        faces_count, = struct.unpack_from('>I', data, 8)
+        return list(struct.unpack_from('>{}I'.format(faces_count), data, 12))
+    if tag in SFNT_VERSIONS:
+        return [0]
+    raise FontFormatError('Not a TrueType or OpenType font')
+
+
+def table_directory(data, offset):
+    # Map every table tag of a face to its (offset, length)
+    sfnt_version, tables_count = struct.unpack_from('>4sH', data, offset)
+    if sfnt_version not in SFNT_VERSIONS:
+        raise FontFormatError('Not a TrueType or OpenType font')
+    tables = {}
+    for i in range(tables_count):
+        tag, _, table_offset, table_length = struct.unpack_from('>4sIII', data, offset + 12 + 16 * i)
+        if table_offset + table_length > len(data):
+            raise FontFormatError('Table {} is out of the file'.format(tag.decode('latin-1')))
+        tables[tag] = (table_offset, table_length)
+    return tables
+
+
+def read_names(data, table):
+    """
+    Read the font names of a 'name' table, (offset, length) from table_directory().
+
+    Returns (names, subfamilies), names is the set of all the family, full,
+    PostScript and typographic family names in every language, and subfamilies
+    the set of subfamily names, e.g. 'Bold Italic'.
+    """
+
+    names = set()
+    subfamilies = set()
+    if table is None:
+        return names, subfamilies
+
+    table_offset, table_length = table
+    _, records_count, strings_offset = struct.unpack_from('>HHH', data, table_offset)
+    strings_start = table_offset + strings_offset
+    for i in range(records_count):
+        platform_id, encoding_id, _, name_id, length, offset = struct.unpack_from('>6H', data,
+                                                                                 table_offset + 6 + 12 * i)
+        if name_id not in FONT_NAME_IDS and name_id != SUBFAMILY_NAME_ID:
+            continue
+
+        if platform_id == 0 or (platform_id == 3 and encoding_id in WINDOWS_UTF16_ENCODINGS):
+            encoding = 'utf-16-be'
+        elif platform_id == 1 and encoding_id in MAC_ENCODINGS:
+            encoding = MAC_ENCODINGS[encoding_id]
+        else:
+            continue
+
+        start = strings_start + offset
+        if start + length > table_offset + table_length:
+            continue
+        name = data[start:start + length].decode(encoding, errors='replace').strip('\x00 ')
+        if not name:
+            continue
+
+        if name_id == SUBFAMILY_NAME_ID:
+            subfamilies.add(name)
+        else:
+            names.add(name)
+
+    return names, subfamilies
+
+
+def read_style(data, table, subfamilies):
+    """
+    Read (weight, italic) of a face from its 'OS/2' table, (offset, length) from table_directory().
+
+    Fonts without an OS/2 table are guessed from their subfamily names.
+    """
+
+    if table is not None and table[1] >= 64:
+        weight, = struct.unpack_from('>H', data, table[0] + 4)
+        selection, = struct.unpack_from('>H', data, table[0] + 62)
+        # fsSelection bit 0 is italic, bit 5 is bold for fonts with a wrong weight class
+        if selection & 0x20 and weight < 600:
+            weight = 700
+        return weight or 400, bool(selection & 0x01)
+
+    subfamily = ' '.join(subfamilies).lower()
+    return (700 if 'bold' in subfamily else 400,
+            'italic' in subfamily or 'oblique' in subfamily)
+
+
+def read_faces(data):
+    """
+    Read the names and style of every face of a font or collection, data is its content as bytes or mmap.
+
+    Returns a list of (face_index, names, weight, italic), where names is a
+    tuple of the font names, see read_names(). Only the table directory and
+    the 'name' and 'OS/2' tables are read.
+
+    Raises FontFormatError or struct.error when the data is not a font.
+    """
+
+    faces = []
+    for face_index, offset in enumerate(face_offsets(data)):
+        tables = table_directory(data, offset)
+        names, subfamilies = read_names(data, tables.get(b'name'))
+        weight, italic = read_style(data, tables.get(b'OS/2'), subfamilies)
+        faces.append((face_index, tuple(sorted(names)), weight, italic))
+    return faces
+
+
+def read_font_faces(full_file_path):
+    """
+    Read the faces of a font file or collection from the memory mapped file, see read_faces().
+
+    Raises FontFormatError, struct.error or OSError when the file cannot be read.
+    """
+
+    fp, data = open_font(full_file_path)
+    try:
+        return read_faces(data)
+    finally:
+        data.close()
+        fp.close()
+
+
+def merge_ranges(ranges):
+    # Sort and merge overlapping and adjacent (start, end) ranges, returns (starts, ends) arrays
+    starts = array.array('I')
+    ends = array.array('I')
+    for start, end in sorted(ranges):
+        if ends and start <= ends[-1] + 1:
+            if end > ends[-1]:
+                ends[-1] = end
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def read_cmap_format_4(data, offset):
+    # Codepoint ranges of a segment mapping to delta values subtable, without the ones mapped to glyph 0
+    segments_count = struct.unpack_from('>H', data, offset + 6)[0] // 2
+    end_codes = struct.unpack_from('>{}H'.format(segments_count), data, offset + 14)
+    start_codes = struct.unpack_from('>{}H'.format(segments_count), data, offset + 16 + 2 * segments_count)
+    deltas_offset = offset + 16 + 4 * segments_count
+    id_deltas = struct.unpack_from('>{}h'.format(segments_count), data, deltas_offset)
+    range_offsets_offset = deltas_offset + 2 * segments_count
+    id_range_offsets = struct.unpack_from('>{}H'.format(segments_count), data, range_offsets_offset)
+
+    ranges = []
+    for i in range(segments_count):
+        start, end = start_codes[i], end_codes[i]
+        if start > end or start == 0xFFFF:
+            continue
+
+        if id_range_offsets[i] == 0:
+            # The glyph is the codepoint plus delta, only one codepoint can land on glyph 0
+            missing = -id_deltas[i] & 0xFFFF
+            if start <= missing <= end:
+                if start < missing:
+                    ranges.append((start, missing - 1))
+                if missing < end:
+                    ranges.append((missing + 1, end))
+            else:
+                ranges.append((start, end))
+            continue
+
+        # Glyphs are in glyphIdArray, look them up one by one, the delta is added to the found glyphs
+        glyphs_offset = range_offsets_offset + 2 * i + id_range_offsets[i]
+        glyphs = struct.unpack_from('>{}H'.format(end - start + 1), data, glyphs_offset)
+        run_start = None
+        for codepoint, glyph in zip(range(start, end + 1), glyphs):
+            if glyph != 0 and (glyph + id_deltas[i]) & 0xFFFF != 0:
+                if run_start is None:
+                    run_start = codepoint
+            elif run_start is not None:
+                ranges.append((run_start, codepoint - 1))
+                run_start = None
+        if run_start is not None:
+            ranges.append((run_start, end))
+
+    return ranges
+
+
+def read_cmap_format_12(data, offset):
+    # Codepoint ranges of a segmented coverage subtable, without the ones mapped to glyph 0
+    groups_count, = struct.unpack_from('>I', data, offset + 12)
+    ranges = []
+    for i in range(groups_count):
+        start, end, start_glyph = struct.unpack_from('>III', data, offset + 16 + 12 * i)
+        if start_glyph == 0:
+            start += 1
+        if start <= end:
+            ranges.append((start, end))
+    return ranges
+
+
+# Preferred Unicode subtables as (platform, encoding, format), full Unicode first
+CMAP_SUBTABLES = [(3, 10, 12), (0, 6, 12), (0, 4, 12), (3, 1, 4), (0, 3, 4), (0, 2, 4), (0, 1, 4), (0, 0, 4)]
+
+
+def read_cmap(data, table):
+    """
+    Read the Unicode codepoints which have a glyph from a 'cmap' table, (offset, length) from table_directory().
+
+    Only format 4 and 12 subtables are read, the best Unicode one is used.
+    Returns the (starts, ends) arrays of merged codepoint ranges, see merge_ranges(),
+    empty when there is no Unicode subtable.
+    """
+
+    subtables = {}
+    if table is not None:
+        table_offset = table[0]
+        _, subtables_count = struct.unpack_from('>HH', data, table_offset)
+        for i in range(subtables_count):
+            platform_id, encoding_id, offset = struct.unpack_from('>HHI', data, table_offset + 4 + 8 * i)
+            subtable_format, = struct.unpack_from('>H', data, table_offset + offset)
+            subtables.setdefault((platform_id, encoding_id, subtable_format), table_offset + offset)
+
+    for subtable in CMAP_SUBTABLES:
+        offset = subtables.get(subtable)
+        if offset is None:
+            continue
+        if subtable[2] == 12:
+            return merge_ranges(read_cmap_format_12(data, offset))
+        return merge_ranges(read_cmap_format_4(data, offset))
+
+    return merge_ranges(())
+
+
+def covers(ranges, codepoint):
+    # Whether a codepoint is in the (starts, ends) ranges of read_cmap()
+    starts, ends = ranges
+    i = bisect.bisect_right(starts, codepoint) - 1
+    return i >= 0 and codepoint <= ends[i]
+
+
+def read_font_coverage(full_file_path):
+    """
+    Read the codepoints ranges of every face of a font file or collection, see read_cmap().
+
+    Returns a list with the ranges of every face, by face index.
+    Raises FontFormatError, struct.error or OSError when the file cannot be read.
+    """
+
+    fp, data = open_font(full_file_path)
+    try:
+        return [read_cmap(data, table_directory(data, offset).get(b'cmap')) for offset in face_offsets(data)]
+    finally:
+        data.close()
+        fp.close()
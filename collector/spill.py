@@ -0,0 +1,202 @@
+import array
+import heapq
+import itertools
+import pickle
+import tempfile
+
+from .fonts import FontAccumulator
+from .logs import LogMessage, logger
+
+# Rough memory used by one character of one font in a Counter: its dict entry, the character and the count
+COUNTER_ENTRY_SIZE = 150
+
+# Number of spill files of the same level merged into one file of the next level, see SpillingFontAccumulator.spill()
+SPILL_MERGE_FAN_IN = 16
+
+
+class CharacterCounts:
+    """
+    Counts of the characters of one font, sorted by character, merged by SpillingFontAccumulator.
+
+    The characters are one string and the counts one array, a few bytes for every
+    character instead of a Counter entry. Iterates and has items() like a Counter.
+    """
+
+    __slots__ = ('characters', 'counts')
+
+    def __init__(self, characters, counts):
+        self.characters = characters
+        self.counts = counts
+
+    def __iter__(self):
+        return iter(self.characters)
+
+    def __len__(self):
+        return len(self.characters)
+
+    def items(self):
+        return zip(self.characters, self.counts)
+
+
+def read_spill(fp):
+    # Yield the (font_index, characters, counts) records of a spill file, in font index order
+    fp.seek(0)
+    while True:
+        try:
+            yield pickle.load(fp)
+        except EOFError:
+            return
+
+
+def merge_spills(spill_files):
+    # Yield (font_index, CharacterCounts) of the fonts of all the spill files in font index order, one font at a time
+    records = heapq.merge(*(read_spill(fp) for fp in spill_files), key=lambda record: record[0])
+    for font_index, font_records in itertools.groupby(records, key=lambda record: record[0]):
+        # Merge the sorted characters of every spill, adding the counts of the same character
+        characters = []
+        counts = array.array('Q')
+        for character, count in heapq.merge(*(zip(record[1], record[2]) for record in font_records)):
+            if characters and characters[-1] == character:
+                counts[-1] += count
+            else:
+                characters.append(character)
+                counts.append(count)
+        yield font_index, CharacterCounts(''.join(characters), counts)
+
+
+class SpillingFontAccumulator(FontAccumulator):
+    """
+    FontAccumulator which keeps about memory_budget bytes of character counts in memory at most.
+
+    When the counts grow over the budget, they are written to a temporary file in
+    directory (the system one by default), sorted by font then character, and
+    dropped from memory. Once finish() is called, items() and frequencies() merge
+    the spilled files with a k-way merge while they are iterated, so only the
+    counts of one font are in memory at a time, and they give the same results
+    as a FontAccumulator of the same files. Fonts keep the order they were first
+    used in, or the order of font_keys for the fonts known in advance.
+
+    Every spill makes a file of level 0, and SPILL_MERGE_FAN_IN files of the same
+    level are merged into one file of the next level, so the number of open
+    files only grows with the logarithm of the number of spills.
+    """
+
+    def __init__(self, memory_budget, directory=None, font_keys=()):
+        super().__init__()
+        self.memory_budget = memory_budget
+        self.directory = directory
+        # Index of every font in the order fonts were first used, spill files refer to fonts by index
+        self.font_indexes = {font_key: font_index for font_index, font_key in enumerate(font_keys)}
+        # Number of (font, character) counts in memory
+        self.entries_count = 0
+        self.spills_count = 0
+        # Open spill files and their levels, the levels never increase along the list
+        self.spill_files = []
+        self.spill_levels = []
+
+    def add(self, font_key, text):
+        self.font_indexes.setdefault(font_key, len(self.font_indexes))
+        characters = self.fonts.get(font_key)
+        entries_count = len(characters) if characters is not None else 0
+        super().add(font_key, text)
+        self.counted(len(self.fonts[font_key]) - entries_count)
+
+    def merge(self, other):
+        for font_key in other.fonts:
+            self.font_indexes.setdefault(font_key, len(self.font_indexes))
+        entries_count = sum(len(self.fonts.get(font_key, ())) for font_key in other.fonts)
+        super().merge(other)
+        self.counted(sum(len(self.fonts[font_key]) for font_key in other.fonts) - entries_count)
+
+    def counted(self, new_entries_count):
+        self.entries_count += new_entries_count
+        if self.entries_count * COUNTER_ENTRY_SIZE > self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        # Write the counts in memory to a new temporary file, one record for every font, and forget them
+        if not self.fonts:
+            return
+        fp = tempfile.TemporaryFile(prefix='collector-spill-', dir=self.directory)
+        for font_key in sorted(self.fonts, key=self.font_indexes.get):
+            characters = self.fonts[font_key]
+            sorted_characters = sorted(characters)
+            pickle.dump((self.font_indexes[font_key], ''.join(sorted_characters),
+                         array.array('Q', [characters[character] for character in sorted_characters])),
+                        fp, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spill_files.append(fp)
+        self.spill_levels.append(0)
+        self.spills_count += 1
+
+        logger.debug(LogMessage('Spilled {ENTRIES_COUNT} character counts of {FONTS_COUNT} fonts to disk', {
+            'ENTRIES_COUNT': self.entries_count,
+            'FONTS_COUNT': len(self.fonts),
+        }))
+        self.fonts = {}
+        self.entries_count = 0
+
+        while len(self.spill_files) >= SPILL_MERGE_FAN_IN and \
+                self.spill_levels[-SPILL_MERGE_FAN_IN] == self.spill_levels[-1]:
+            self.merge_last_spills(SPILL_MERGE_FAN_IN)
+
+    def merge_last_spills(self, count):
+        # Merge the last count spill files, which have the same level, into one file of the next level
+        fp = tempfile.TemporaryFile(prefix='collector-spill-', dir=self.directory)
+        for font_index, characters in merge_spills(self.spill_files[-count:]):
+            pickle.dump((font_index, characters.characters, characters.counts), fp, protocol=pickle.HIGHEST_PROTOCOL)
+        for merged_fp in self.spill_files[-count:]:
+            merged_fp.close()
+        level = self.spill_levels[-1] + 1
+        del self.spill_files[-count:]
+        del self.spill_levels[-count:]
+        self.spill_files.append(fp)
+        self.spill_levels.append(level)
+
+    def finish(self):
+        """
+        Spill the counts left in memory when others were spilled, call it once every file was added.
+
+        When nothing was spilled, the counts stay in memory in the fonts order.
+        """
+
+        if self.spill_files:
+            self.spill()
+            logger.info(LogMessage('The character counts were spilled {SPILLS_COUNT} times to {FILES_COUNT} '
+                                   'temporary files, they are merged while the outputs are written', {
+                                       'SPILLS_COUNT': self.spills_count,
+                                       'FILES_COUNT': len(self.spill_files),
+                                   }))
+        else:
+            self.fonts = {font_key: self.fonts[font_key] for font_key in self.font_indexes if font_key in self.fonts}
+
+    def merged_counts(self):
+        # Yield (font_key, CharacterCounts) of every spilled font in fonts order, merging one font at a time
+        font_keys = list(self.font_indexes)
+        for font_index, characters in merge_spills(self.spill_files):
+            yield font_keys[font_index], characters
+
+    # The spill files are read from their start by every iteration, iterate one of these at a time
+
+    def __iter__(self):
+        return iter(self.font_indexes if self.spill_files else self.fonts)
+
+    def items(self):
+        if not self.spill_files:
+            yield from super().items()
+            return
+        for font_key, characters in self.merged_counts():
+            yield font_key, characters.characters
+
+    def frequencies(self):
+        if not self.spill_files:
+            yield from super().frequencies()
+            return
+        for font_key, characters in self.merged_counts():
+            yield font_key, sorted(characters.items(), key=lambda item: (-item[1], item[0]))
+
+    def __len__(self):
+        return len(self.font_indexes) if self.spill_files else len(self.fonts)
+
+    @property
+    def spilled(self):
+        return bool(self.spill_files)
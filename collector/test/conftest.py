@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from collector import parsing
+
+# Script Info and styles of the subtitles written by the tests, Default is Arial and Sign is bold Meiryo
+STYLES = (
+    "[Script Info]\nScriptType: v4.00+\n\n"
+    "[V4+ Styles]\n"
+    "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+    "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, "
+    "MarginR, MarginV, Encoding\n"
+    "Style: Default,Arial,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1\n"
+    "Style: Sign,Meiryo,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1\n"
+)
+
+HEADER = STYLES + "\n[Events]\n"
+
+
+def dialogue(text, style="Default"):
+    return "Dialogue: 0,0:00:01.00,0:00:02.00,{},,0,0,0,,{}\n".format(style, text)
+
+
+def subtitle(*lines):
+    # A subtitle with a Dialogue for every line, a text of the Default style or a (style, text) pair
+    return HEADER + "".join(dialogue(line) if isinstance(line, str) else dialogue(line[1], line[0])
+                            for line in lines)
+
+
+def write_subtitle(path, *lines, mtime=None):
+    """
+    Write subtitle(*lines) to path, a pathlib path, creating its directory.
+
+    mtime is the modification time in nanoseconds, for tests which change files
+    faster than the file system time resolution. Returns the path as a string.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(subtitle(*lines), encoding="utf-8")
+    if mtime is not None:
+        os.utime(str(path), ns=(mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def parsed_files(monkeypatch):
+    # Names of the files really parsed, not taken from the cache, in parsing order
+    parsed = []
+    parse_file = parsing.parse_file
+
+    def counting_parse_file(full_file_path, *args, **kwargs):
+        parsed.append(os.path.basename(full_file_path))
+        return parse_file(full_file_path, *args, **kwargs)
+
+    monkeypatch.setattr(parsing, "parse_file", counting_parse_file)
+    return parsed
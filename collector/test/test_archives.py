@@ -0,0 +1,61 @@
+import os
+import zipfile
+
+from collector import archives
+from collector.archives import file_signature
+from collector.duplicates import find_duplicates
+from collector.files import walk_subtitles
+from collector.report import collect_fonts
+from collector.test.conftest import subtitle
+
+
+def write_archive(tmp_path, members=200):
+    archive_path = tmp_path / "subs.zip"
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i in range(members):
+            # Text which compresses badly, so reads at a wrong position fail
+            text = "".join(chr(0x4e00 + (i * 7919 + j * 104729) % 20000) for j in range(500))
+            archive.writestr("{:03}.ass".format(i), subtitle("{{\\fnFont {}}}{}".format(i % 10, text)))
+    return archive_path
+
+
+def collect(tmp_path, jobs):
+    paths = sorted(walk_subtitles(str(tmp_path), archives=True))
+    # The parent reads the archive before the workers are forked, as the cache signatures do
+    file_signature(paths[0])
+    report = collect_fonts(paths, jobs=jobs, prefetch_depth=0)
+    return dict(report.fonts.items()), report.errors, len(report.files)
+
+
+def test_workers_do_not_share_the_archive_of_the_parent(tmp_path):
+    write_archive(tmp_path)
+    serial = collect(tmp_path, 1)
+    assert not serial[1] and serial[2] == 200 and len(serial[0]) == 10
+    assert collect(tmp_path, 4) == serial
+
+
+def test_archive_is_reopened_after_fork(tmp_path):
+    archive_path = write_archive(tmp_path, members=1)
+    member_path = os.path.join(str(archive_path), "000.ass")
+    file_signature(member_path)
+    parent_archive = archives.open_archive_cache[-1]
+
+    pid = os.fork()
+    if pid == 0:
+        reopened = archives.open_archive(str(archive_path)) is not parent_archive
+        os._exit(0 if reopened else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert archives.open_archive(str(archive_path)) is parent_archive
+
+
+def test_duplicates_do_not_open_archives(tmp_path):
+    archive_path = write_archive(tmp_path, members=3)
+    (tmp_path / "copy.ass").write_bytes(zipfile.ZipFile(archive_path).read("000.ass"))
+    (tmp_path / "copy 2.ass").write_bytes((tmp_path / "copy.ass").read_bytes())
+    paths = sorted(walk_subtitles(str(tmp_path), archives=True))
+    archives.open_archive_cache = None
+    duplicates = find_duplicates(paths)
+    assert list(duplicates) == [str(tmp_path / "copy.ass")]
+    assert duplicates[str(tmp_path / "copy.ass")][0] == str(tmp_path / "copy 2.ass")
+    assert archives.open_archive_cache is None
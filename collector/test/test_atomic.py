@@ -0,0 +1,24 @@
+import pickle
+
+import pytest
+
+from collector.atomic import open_atomically, pickle_atomically
+
+
+def test_failed_writes_keep_the_old_file(tmp_path):
+    path = str(tmp_path / "data.pickle")
+    pickle_atomically({"a": 1}, path)
+    with open(path, "rb") as fp:
+        assert pickle.load(fp) == {"a": 1}
+
+    with pytest.raises(KeyboardInterrupt):
+        with open_atomically(path) as fp:
+            fp.write(b"half")
+            raise KeyboardInterrupt
+    with open(path, "rb") as fp:
+        assert pickle.load(fp) == {"a": 1}
+    assert [child.name for child in tmp_path.iterdir()] == ["data.pickle"]
+
+    with open_atomically(path, "w", encoding="utf-8") as fp:
+        fp.write("new")
+    assert (tmp_path / "data.pickle").read_text(encoding="utf-8") == "new"
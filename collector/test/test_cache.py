@@ -0,0 +1,96 @@
+import logging
+import os
+
+import pytest
+
+from collector.cache import ResultCache
+from collector.report import collect_fonts
+from collector.test.conftest import write_subtitle
+
+
+def write_cached_subtitle(tmp_path, name, text="world"):
+    # A file with a warning, for a style which does not exist
+    return write_subtitle(tmp_path / name, "Hello {\\fnMeiryo}" + text, ("Gone", "Lost"))
+
+
+def collect(paths, cache):
+    report = collect_fonts(paths, cache=cache, prefetch_depth=0)
+    cache.save()
+    return report.collection()
+
+
+def test_unchanged_files_are_not_parsed_again(tmp_path, parsed_files, caplog):
+    paths = [write_cached_subtitle(tmp_path, "a.ass"), write_cached_subtitle(tmp_path, "b.ass", "again")]
+    cache_path = str(tmp_path / "cache.pickle")
+    first = collect(paths, ResultCache(cache_path))
+    assert parsed_files == ["a.ass", "b.ass"]
+    warnings = [record.getMessage() for record in caplog.records if record.levelno >= logging.WARNING]
+    assert warnings
+
+    caplog.clear()
+    assert collect(paths, ResultCache(cache_path)) == first
+    assert parsed_files == ["a.ass", "b.ass"]
+    # The warnings of cached files are logged again
+    assert [record.getMessage() for record in caplog.records if record.levelno >= logging.WARNING] == warnings
+
+
+def test_touched_files_with_the_same_content_are_not_parsed_again(tmp_path, parsed_files):
+    path = write_cached_subtitle(tmp_path, "a.ass")
+    cache_path = str(tmp_path / "cache.pickle")
+    first = collect([path], ResultCache(cache_path))
+    size, mtime, digest = ResultCache(cache_path).signature(path)
+
+    os.utime(path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    assert collect([path], ResultCache(cache_path)) == first
+    assert parsed_files == ["a.ass"]
+    # The new modification time is kept, so the file is not hashed again by the next run
+    assert ResultCache(cache_path).signature(path) == (size, mtime + 10 ** 9, digest)
+
+
+def test_changed_files_are_parsed_again(tmp_path, parsed_files):
+    path = write_cached_subtitle(tmp_path, "a.ass", "world")
+    cache_path = str(tmp_path / "cache.pickle")
+    collect([path], ResultCache(cache_path))
+    mtime = os.stat(path).st_mtime_ns
+
+    # Same size, the content and the modification time changed
+    write_cached_subtitle(tmp_path, "a.ass", "words")
+    os.utime(path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    assert "s" in collect([path], ResultCache(cache_path))["Meiryo"]["characters"]
+    assert parsed_files == ["a.ass", "a.ass"]
+
+
+@pytest.mark.parametrize("variant, version, parsed_again", [
+    (None, ResultCache.VERSION, False),
+    ("full_tags", ResultCache.VERSION, True),
+    (None, ResultCache.VERSION + 1, True),
+], ids=["same", "other variant", "other version"])
+def test_caches_of_other_options_are_dropped(tmp_path, parsed_files, monkeypatch, variant, version, parsed_again):
+    path = write_cached_subtitle(tmp_path, "a.ass")
+    cache_path = str(tmp_path / "cache.pickle")
+    collect([path], ResultCache(cache_path))
+    monkeypatch.setattr(ResultCache, "VERSION", version)
+    collect([path], ResultCache(cache_path, variant))
+    assert parsed_files == ["a.ass"] * (2 if parsed_again else 1)
+
+
+def test_only_files_of_the_run_are_saved(tmp_path, parsed_files):
+    kept = write_cached_subtitle(tmp_path, "a.ass")
+    removed = write_cached_subtitle(tmp_path, "b.ass")
+    cache_path = str(tmp_path / "cache.pickle")
+    collect([kept, removed], ResultCache(cache_path))
+    os.remove(removed)
+    collect([kept], ResultCache(cache_path))
+    assert list(ResultCache(cache_path).entries) == [kept]
+    assert parsed_files == ["a.ass", "b.ass"]
+
+
+def test_unreadable_cache_is_rebuilt(tmp_path, parsed_files, caplog):
+    path = write_cached_subtitle(tmp_path, "a.ass")
+    cache_path = tmp_path / "cache.pickle"
+    cache_path.write_bytes(b"not a pickle")
+    cache = ResultCache(str(cache_path))
+    assert not cache.entries
+    assert "Cannot read cache file" in caplog.text
+    collect([path], cache)
+    assert list(ResultCache(str(cache_path)).entries) == [path]
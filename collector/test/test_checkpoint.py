@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from collector import checkpoint
+from collector.cache import ResultCache
+from collector.checkpoint import CheckpointJournal
+from collector.report import collect_fonts
+from collector.test.conftest import write_subtitle
+
+
+def write_subtitles(tmp_path, count):
+    return [write_subtitle(tmp_path / "{}.ass".format(i), "{{\\fnFont {}}}{}".format(i % 3, chr(0x4e00 + i) * (i + 1)))
+            for i in range(count)]
+
+
+def test_journal_segments_are_read_in_order(tmp_path):
+    journal_path = str(tmp_path / "cache.pickle.journal")
+    journal = CheckpointJournal(journal_path, 1)
+    journal.add("a", "first a")
+    journal.add("b", "b")
+    journal.flush()
+    journal.add("a", "second a")
+    journal.flush()
+    # Nothing added, no empty segment
+    journal.flush()
+    assert journal.segment_names() == ["00000000.pickle", "00000001.pickle"]
+
+    # Half written segments are left out, new segments come after the read ones
+    (tmp_path / "cache.pickle.journal" / "00000002.pickle.tmp").write_bytes(b"killed")
+    journal = CheckpointJournal(journal_path, 1)
+    assert journal.read() == {"a": "second a", "b": "b"}
+    journal.add("c", "c")
+    journal.flush()
+    assert journal.segment_names()[-1] == "00000002.pickle"
+    assert CheckpointJournal(journal_path, 1).read() == {"a": "second a", "b": "b", "c": "c"}
+
+    # Segments of another version are skipped
+    assert CheckpointJournal(journal_path, 2).read() == {}
+
+    journal.clear()
+    assert not os.path.exists(journal_path)
+
+
+def test_unreadable_segment_stops_the_journal(tmp_path, caplog):
+    journal_path = str(tmp_path / "journal")
+    journal = CheckpointJournal(journal_path, 1)
+    for name in ("a", "b", "c"):
+        journal.add(name, name)
+        journal.flush()
+    with open(os.path.join(journal_path, "00000001.pickle"), "wb") as fp:
+        fp.write(b"broken")
+
+    assert CheckpointJournal(journal_path, 1).read() == {"a": "a"}
+    assert "Cannot read checkpoint segment" in caplog.text
+
+
+def test_journal_is_flushed_by_files_count(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_FILES", 2)
+    journal = CheckpointJournal(str(tmp_path / "journal"), 1)
+    for name in "abcde":
+        journal.add(name, name)
+    assert len(journal.segment_names()) == 2
+    assert list(journal.pending_entries) == ["e"]
+
+
+class Interrupt(Exception):
+    pass
+
+
+def interrupted_run(paths, cache_path, stop_after):
+    # Stop the collection like a KeyboardInterrupt after some files, and flush the journal like run() does
+    cache = ResultCache(cache_path)
+    collected = []
+
+    def on_file(full_file_path, *_):
+        collected.append(full_file_path)
+        if len(collected) == stop_after:
+            raise Interrupt
+
+    with pytest.raises(Interrupt):
+        collect_fonts(paths, cache=cache, prefetch_depth=0, on_file=on_file)
+    cache.journal.flush()
+    assert not os.path.exists(cache_path)
+
+
+def test_resumed_run_does_not_parse_the_collected_files(tmp_path, parsed_files):
+    paths = write_subtitles(tmp_path, 6)
+    expected = collect_fonts(paths, prefetch_depth=0).collection()
+    del parsed_files[:]
+
+    cache_path = str(tmp_path / "cache.pickle")
+    interrupted_run(paths, cache_path, 4)
+    assert parsed_files == ["0.ass", "1.ass", "2.ass", "3.ass"]
+
+    cache = ResultCache(cache_path, resume=True)
+    assert collect_fonts(paths, cache=cache, prefetch_depth=0).collection() == expected
+    assert parsed_files == ["0.ass", "1.ass", "2.ass", "3.ass", "4.ass", "5.ass"]
+    cache.save()
+    assert not os.path.exists(cache_path + ".journal")
+    assert sorted(ResultCache(cache_path).entries) == sorted(paths)
+
+
+def test_journal_is_dropped_without_resume(tmp_path, parsed_files, caplog):
+    paths = write_subtitles(tmp_path, 3)
+    cache_path = str(tmp_path / "cache.pickle")
+    interrupted_run(paths, cache_path, 2)
+
+    cache = ResultCache(cache_path)
+    assert "use --resume to continue it" in caplog.text
+    assert not os.path.exists(cache_path + ".journal")
+    collect_fonts(paths, cache=cache, prefetch_depth=0)
+    assert parsed_files == ["0.ass", "1.ass", "0.ass", "1.ass", "2.ass"]
@@ -0,0 +1,61 @@
+import random
+
+import pysubs2
+import pytest
+from pysubs2.substation import UUENCODED_LINE_LENGTH, uudecode, uuencode
+
+from collector.loaders import AssScanner
+
+
+@pytest.mark.parametrize("data, lines", [
+    (b"", []),
+    (b"a", ["91"]),
+    (b"ab", ["97)"]),
+    (b"abc", ["97*D"]),
+    (b"\x00\x00\x00", ["!!!!"]),
+    (b"\xff\xff\xff", ["````"]),
+])
+def test_uuencode_known_values(data, lines):
+    assert uuencode(data) == lines
+    assert uudecode(lines) == data
+
+
+@pytest.mark.parametrize("size", list(range(0, 10)) + [59, 60, 61, 1000, 4096])
+def test_uudecode_reverses_uuencode(size):
+    data = bytes(random.Random(size).randrange(256) for _ in range(size))
+    lines = uuencode(data)
+    assert all(len(line) == UUENCODED_LINE_LENGTH for line in lines[:-1])
+    assert uudecode(lines) == data
+    # Line ends and indentation are not part of the data
+    assert uudecode(["  " + line + "\r\n" for line in lines]) == data
+
+
+def test_uudecode_ignores_a_lone_last_character():
+    assert uudecode(["97*D9"]) == b"abc"
+
+
+def test_embedded_files_round_trip():
+    subs = pysubs2.SSAFile()
+    subs.append(pysubs2.SSAEvent(text="Hello"))
+    subs.fonts["a.ttf"] = bytes(range(256)) * 3
+    subs.fonts["b.otf"] = b"x"
+    subs.graphics["c.png"] = b"\x89PNG" + bytes(100)
+
+    loaded = pysubs2.SSAFile.from_string(subs.to_string("ass"))
+    assert dict(loaded.fonts) == dict(subs.fonts)
+    assert dict(loaded.graphics) == dict(subs.graphics)
+    assert [event.text for event in loaded.events] == ["Hello"]
+
+
+def test_scanner_reads_the_embedded_fonts(tmp_path):
+    subs = pysubs2.SSAFile()
+    subs.append(pysubs2.SSAEvent(text="Hello"))
+    subs.fonts["a.ttf"] = bytes(range(256))
+    subs.fonts["b.ttf"] = b"[Events]" * 10
+    subs.graphics["c.png"] = b"not a font"
+    path = tmp_path / "fonts.ass"
+    subs.save(str(path))
+
+    with AssScanner(str(path)) as scanner:
+        assert dict(scanner.embedded_fonts()) == dict(subs.fonts)
+        assert [text for _, text, _ in scanner.dialogues()] == ["Hello"]
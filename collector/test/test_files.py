@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from collector.files import walk_subtitles
+
+TREE = ["a.ass", "b.srt", "notes.txt", "season1/ep1.ass", "season1/extras/ep1e.ass", "season2/ep2.ass",
+        "season2/draft/old.ass", "season2/draft/deep/older.ass"]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "subs"
+    for name in TREE:
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("", encoding="utf-8")
+    return root
+
+
+def walk(root, *args, **kwargs):
+    # Relative paths of the walked files, sorted
+    return sorted(os.path.relpath(path, str(root)).replace(os.sep, "/")
+                  for path in walk_subtitles(str(root), *args, **kwargs))
+
+
+def test_symbolic_link_loops_are_walked_once(tree):
+    # Links to the root, to a parent and to a directory also walked by its own name
+    os.symlink(str(tree), str(tree / "loop"))
+    os.symlink("..", str(tree / "season1" / "up"))
+    os.symlink(str(tree / "season2"), str(tree / "season1" / "extras" / "other season"))
+
+    real_paths = [os.path.realpath(path) for path in walk_subtitles(str(tree))]
+    assert len(real_paths) == len(set(real_paths))
+    assert sorted(os.path.relpath(path, os.path.realpath(str(tree))) for path in real_paths) == sorted(
+        os.path.normpath(name) for name in TREE if name.endswith(".ass"))
+
+
+def test_include_and_exclude_patterns(tree):
+    assert walk(tree) == ["a.ass", "season1/ep1.ass", "season1/extras/ep1e.ass", "season2/draft/deep/older.ass",
+                          "season2/draft/old.ass", "season2/ep2.ass"]
+    assert walk(tree, ["*.srt", "*.txt"]) == ["b.srt", "notes.txt"]
+    # Patterns without a slash match names, directories included, patterns with one match relative paths
+    assert walk(tree, exclude=["draft"]) == ["a.ass", "season1/ep1.ass", "season1/extras/ep1e.ass",
+                                             "season2/ep2.ass"]
+    assert walk(tree, exclude=["season1/*"]) == ["a.ass", "season2/draft/deep/older.ass",
+                                                 "season2/draft/old.ass", "season2/ep2.ass"]
+    assert walk(tree, ["season2/*/*.ass"], exclude=["*/deep"]) == ["season2/draft/old.ass"]
+    assert walk(tree, ["ep?.ass"], exclude=["season1/ep1.ass"]) == ["season2/ep2.ass"]
+
+
+@pytest.mark.parametrize("max_depth, expected", [
+    (0, ["a.ass"]),
+    (1, ["a.ass", "season1/ep1.ass", "season2/ep2.ass"]),
+    (2, ["a.ass", "season1/ep1.ass", "season1/extras/ep1e.ass", "season2/draft/old.ass", "season2/ep2.ass"]),
+    (None, ["a.ass", "season1/ep1.ass", "season1/extras/ep1e.ass", "season2/draft/deep/older.ass",
+            "season2/draft/old.ass", "season2/ep2.ass"]),
+])
+def test_max_depth(tree, max_depth, expected):
+    assert walk(tree, max_depth=max_depth) == expected
+
+
+def test_unreadable_directories_are_skipped(tree, caplog):
+    assert walk(tree / "missing") == []
+    assert "Cannot read directory" in caplog.text
@@ -0,0 +1,78 @@
+import pytest
+
+from collector import fonts
+from collector.fonts import DialogueMemo
+from collector.report import collect_fonts
+from collector.test.conftest import write_subtitle
+
+ARIAL = ("Arial", False, False)
+STYLE_TABLE = {"Default": ARIAL, "Sign": ("Meiryo", True, False)}
+
+
+@pytest.fixture
+def resolved_texts(monkeypatch):
+    # Texts really resolved, not taken from the memo
+    resolved = []
+    resolve_dialogue = fonts.resolve_dialogue
+
+    def counting_resolve_dialogue(text, *args):
+        resolved.append(text)
+        return resolve_dialogue(text, *args)
+
+    monkeypatch.setattr(fonts, "resolve_dialogue", counting_resolve_dialogue)
+    return resolved
+
+
+def test_least_recently_used_entries_are_evicted(resolved_texts):
+    memo = DialogueMemo(2)
+    for text in ("a", "b", "a", "c", "a", "b"):
+        assert memo.resolve(text, ARIAL, STYLE_TABLE) == (((ARIAL, text),), ())
+    # "a" was used again before "c" was added, so "b" was evicted first
+    assert resolved_texts == ["a", "b", "c", "b"]
+    assert list(memo.entries) == [("a", ARIAL), ("b", ARIAL)]
+    assert memo.flush_stats() == (2, 4)
+    assert memo.flush_stats() == (0, 0)
+
+
+def test_results_depend_on_the_base_font(resolved_texts):
+    memo = DialogueMemo(10)
+    sign = STYLE_TABLE["Sign"]
+    assert memo.resolve("a", ARIAL, STYLE_TABLE) == (((ARIAL, "a"),), ())
+    assert memo.resolve("a", sign, STYLE_TABLE) == (((sign, "a"),), ())
+    assert memo.flush_stats() == (0, 2)
+
+
+def test_reset_styles_are_checked_against_the_style_table(resolved_texts):
+    memo = DialogueMemo(10)
+    text = "a{\\rSign}b"
+    other_table = {"Default": ARIAL, "Sign": ("Other", False, True)}
+
+    assert memo.resolve(text, ARIAL, STYLE_TABLE) == (
+        ((ARIAL, "a"), (("Meiryo", True, False), "b")), (("Sign", ("Meiryo", True, False)),))
+    assert memo.resolve(text, ARIAL, STYLE_TABLE)[0][1][0] == ("Meiryo", True, False)
+    # Another Sign style, or no Sign style at all, cannot use the memo
+    assert memo.resolve(text, ARIAL, other_table)[0][1][0] == ("Other", False, True)
+    assert memo.resolve(text, ARIAL, {"Default": ARIAL}) == (((ARIAL, "a"), (ARIAL, "b")), (("Sign", None),))
+    assert resolved_texts == [text] * 3
+    assert memo.flush_stats() == (1, 3)
+
+
+def test_disabled_memo_resolves_every_dialogue(resolved_texts):
+    memo = DialogueMemo(0)
+    for _ in range(3):
+        memo.resolve("a", ARIAL, STYLE_TABLE)
+    assert resolved_texts == ["a"] * 3
+    assert not memo.entries
+    assert memo.flush_stats() == (0, 0)
+
+
+def test_memo_counts_are_summed_in_the_summary(tmp_path):
+    # The same Dialogue in two files with different Sign styles
+    a = write_subtitle(tmp_path / "a.ass", "same", "{\\rSign}sign", "a")
+    b = tmp_path / "b.ass"
+    write_subtitle(b, "same", "{\\rSign}sign", "b")
+    b.write_text(b.read_text(encoding="utf-8").replace("Sign,Meiryo", "Sign,Other"), encoding="utf-8")
+
+    report = collect_fonts([a, str(b)], prefetch_depth=0)
+    assert (report.summary["memo_hits"], report.summary["memo_misses"]) == (1, 5)
+    assert dict(report.fonts.items())[("Other", True, False)] == "gins"
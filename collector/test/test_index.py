@@ -0,0 +1,100 @@
+import os
+import sqlite3
+
+import pytest
+
+from collector.index import (IndexWriter, open_index, query_character_fonts, query_file_fonts, query_font_files,
+                             query_fonts, write_index)
+from collector.parsing import parse_file
+from collector.report import collect_fonts
+from collector.test.conftest import write_subtitle
+
+
+@pytest.fixture
+def index(tmp_path):
+    # An index of three files written while they are collected, returns (connection, paths)
+    paths = [
+        write_subtitle(tmp_path / "ep01.ass", "ab", ("Sign", "一二")),
+        write_subtitle(tmp_path / "season/ep02.ass", "b{\\fnmeiryo}一", ("Sign", "{\\b0}三")),
+        write_subtitle(tmp_path / "ep03.ass", "{\\i1}c", "{\\bad"),
+    ]
+    index_path = str(tmp_path / "fonts.sqlite")
+    with IndexWriter(index_path) as index_writer:
+        collect_fonts(paths, prefetch_depth=0, on_file=index_writer.add_file)
+    connection = open_index(index_path)
+    yield connection, paths
+    connection.close()
+
+
+def test_query_fonts(index):
+    connection, _ = index
+    assert query_fonts(connection) == [("Arial", 0, 0, 2), ("Arial", 0, 1, 1), ("meiryo", 0, 0, 1),
+                                       ("Meiryo", 0, 0, 1), ("Meiryo", 1, 0, 1)]
+
+
+def test_query_font_files(index):
+    connection, (first, second, _) = index
+    # Font names are matched case insensitively
+    assert query_font_files(connection, "MEIRYO") == [(first, "Meiryo", 1, 0, 2), (second, "meiryo", 0, 0, 1),
+                                                      (second, "Meiryo", 0, 0, 1)]
+    assert query_font_files(connection, "Unknown") == []
+
+
+def test_query_character_fonts(index):
+    connection, _ = index
+    assert query_character_fonts(connection, "b") == [("Arial", 0, 0, 2)]
+    assert query_character_fonts(connection, "一") == [("meiryo", 0, 0, 1), ("Meiryo", 1, 0, 1)]
+    assert query_character_fonts(connection, "z") == []
+
+
+def test_query_file_fonts(index):
+    connection, (first, second, third) = index
+    assert query_file_fonts(connection, first) == [(first, "Arial", 0, 0, "ab"), (first, "Meiryo", 1, 0, "一二")]
+    # The end of the path is enough, on a path separator only
+    assert query_file_fonts(connection, os.path.join("season", "ep02.ass")) == query_file_fonts(connection, second)
+    assert query_file_fonts(connection, "p03.ass") == []
+    assert query_file_fonts(connection, "ep03.ass") == [(third, "Arial", 0, 1, "c")]
+
+
+def test_files_table(index):
+    connection, (first, second, third) = index
+    assert connection.execute("SELECT path, error, unparsed FROM files ORDER BY id").fetchall() == [
+        (first, None, 0), (second, None, 0), (third, None, 1)]
+    assert connection.execute("""
+        SELECT styles.name, fonts.name, fonts.bold FROM styles JOIN fonts ON fonts.id = styles.font_id
+        WHERE file_id = 1 ORDER BY styles.name
+    """).fetchall() == [("Default", "Arial", 0), ("Sign", "Meiryo", 1)]
+
+
+def test_index_is_read_only(index):
+    connection, _ = index
+    with pytest.raises(sqlite3.OperationalError):
+        connection.execute("DELETE FROM files")
+
+
+def test_failed_index_keeps_the_old_one(tmp_path):
+    path = write_subtitle(tmp_path / "a.ass", "a")
+    index_path = str(tmp_path / "fonts.sqlite")
+    write_index(index_path, [(path, *parse_file(path))])
+
+    with pytest.raises(KeyboardInterrupt):
+        with IndexWriter(index_path) as index_writer:
+            index_writer.add_file(path, *parse_file(path))
+            raise KeyboardInterrupt
+    assert sorted(os.listdir(str(tmp_path))) == ["a.ass", "fonts.sqlite"]
+    connection = open_index(index_path)
+    # Fonts of styles are in the index even when no Dialogue uses them
+    assert query_fonts(connection) == [("Arial", 0, 0, 1), ("Meiryo", 1, 0, 0)]
+    connection.close()
+
+
+def test_open_index_errors(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        open_index(str(tmp_path / "missing.sqlite"))
+
+    old_index = str(tmp_path / "old.sqlite")
+    connection = sqlite3.connect(old_index)
+    connection.execute("PRAGMA user_version = 0")
+    connection.close()
+    with pytest.raises(ValueError, match="version 0"):
+        open_index(old_index)
@@ -0,0 +1,136 @@
+import pysubs2
+import pytest
+from pysubs2.substation import uuencode
+
+from collector.fonts import build_style_table
+from collector.loaders import AssScanner, open_subtitle
+
+STYLES = (
+    "[V4+ Styles]\n"
+    "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, "
+    "Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, "
+    "MarginR, MarginV, Encoding\n"
+    "Style: Default,Arial,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1\n"
+    "Style: Sign,Times New Roman,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,0,0,1,2,2,2,"
+    "10,10,10,1\n"
+)
+
+EVENTS = (
+    "[Events]\n"
+    "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+    "Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Hello, world\n"
+    "Comment: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Not a Dialogue\n"
+    "Dialogue: 0,0:00:01.00,0:00:02.00,Sign,,0,0,0,,{\\fnMS Gothic\\i1}Sign\n"
+)
+
+
+def ass_file(*sections):
+    return "[Script Info]\nScriptType: v4.00+\n\n" + "".join(sections)
+
+
+def font_section(name, data):
+    return "[Fonts]\nfontname: {}\n{}\n".format(name, "\n".join(uuencode(data)))
+
+
+EDGE_FILES = [
+    ass_file(STYLES, EVENTS),
+    # Line ends
+    ass_file(STYLES, EVENTS).replace("\n", "\r\n"),
+    ass_file(STYLES, EVENTS).replace("\n", "\r"),
+    ass_file(STYLES).replace("\n", "\r") + EVENTS.replace("\n", "\r\n"),
+    "﻿" + ass_file(STYLES, EVENTS),
+    # Sections in other orders, styles and events are read outside of their sections too
+    ass_file(EVENTS, STYLES),
+    "Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Before the first heading\n" + ass_file(STYLES, EVENTS),
+    ass_file(STYLES + "Dialogue: 0,0:00:01.00,0:00:02.00,Sign,,0,0,0,,In the styles\n", EVENTS),
+    ass_file(STYLES, EVENTS + "Style: Late,Meiryo,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,-1,0,0,100,100,"
+                              "0,0,1,2,2,2,10,10,10,1\n"
+                              "Dialogue: 0,0:00:01.00,0:00:02.00,Late,,0,0,0,,Late style\n"),
+    # Sections which are not read
+    ass_file(STYLES, EVENTS, "[Aegisub Project Garbage]\n"
+                             "Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Garbage\n"),
+    ass_file(STYLES, EVENTS).replace("ScriptType: v4.00+\n",
+                                     "ScriptType: v4.00+\nDialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Info\n"),
+    # Headings
+    ass_file(STYLES, EVENTS.replace("[Events]", "  [Events] ; comment")),
+    ass_file(STYLES, EVENTS.replace("[Events]", "ab [Events]")),
+    ass_file(STYLES, "abcd[Fonts]\n", EVENTS),
+    ass_file(STYLES, EVENTS.replace("[Events]", "[]x[Events]")),
+    ass_file(STYLES, "[Graphics]\n[ABC]\nDialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Encoded\n", EVENTS),
+    # Embedded fonts, with encoded lines which look like headings
+    ass_file(STYLES, EVENTS, font_section("a.ttf", b"[FONT]" + bytes(range(256)))),
+    ass_file(STYLES, font_section("a.ttf", b"abc"), font_section("b.ttf", b"\x00" * 100), EVENTS),
+    # Dialogues
+    ass_file(STYLES, EVENTS, "Dialogue: 0,0:00:01.00,0:00:02.00,Default\n"),
+    ass_file(STYLES, EVENTS, "  \tDialogue:0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Indented  \n"),
+    ass_file(STYLES, EVENTS, "　Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Wide space　\n"),
+    ass_file(STYLES, EVENTS, "\x1cDialogue:　 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Separator\n"),
+    ass_file(STYLES, EVENTS, "Dialogue: 0,0:00:01.00,0:00:02.00,Missing,,0,0,0,,a,b,c\n"),
+    # Styles
+    ass_file(STYLES + "Style: Default,Comic Sans,20\n", EVENTS),
+    ass_file(STYLES.replace("Style: Sign", "　Style: Sign"), EVENTS),
+    ass_file("[V4 Styles]\n"
+             "Style: Default,Arial,20,16777215,255,0,0,0,0,1,2,2,2,10,10,10,0,1\n"
+             "Style: Sign,Times New Roman,20,16777215,255,0,0,-1,-1,1,2,2,2,10,10,10,0,1\n",
+             EVENTS.replace("Dialogue: 0,", "Dialogue: Marked=0,")),
+    # Format detection on the first 10000 characters, not bytes
+    "あ" * 4000 + "\n" + ass_file(STYLES, EVENTS),
+]
+
+
+def pysubs2_result(path):
+    subtitle = pysubs2.load(str(path))
+    return (build_style_table(subtitle.styles),
+            [(event.style, event.text) for event in subtitle.events if event.type == 'Dialogue'],
+            dict(subtitle.fonts))
+
+
+def scanner_result(path):
+    with AssScanner(str(path)) as scanner:
+        return (scanner.style_table,
+                [(style, text) for style, text, _ in scanner.dialogues()],
+                dict(scanner.embedded_fonts()))
+
+
+@pytest.mark.parametrize("content", EDGE_FILES)
+def test_scanner_reads_like_pysubs2(tmp_path, content):
+    path = tmp_path / "edge.ass"
+    path.write_bytes(content.encode("utf-8"))
+    assert scanner_result(path) == pysubs2_result(path)
+
+
+@pytest.mark.parametrize("content", EDGE_FILES)
+def test_scanner_reads_content_like_file(tmp_path, content):
+    path = tmp_path / "edge.ass"
+    path.write_bytes(content.encode("utf-8"))
+    with AssScanner(str(path), content.encode("utf-8")) as scanner:
+        from_data = scanner.style_table, [(style, text) for style, text, _ in scanner.dialogues()]
+    assert from_data == scanner_result(path)[:2]
+
+
+def test_scanner_builds_unparsed_events_like_pysubs2(tmp_path):
+    path = tmp_path / "edge.ass"
+    path.write_text(ass_file(STYLES, EVENTS).replace("\n", "\r"), encoding="utf-8")
+    subtitle = pysubs2.load(str(path))
+    with AssScanner(str(path)) as scanner:
+        events = [scanner.event(line) for _, _, line in scanner.dialogues()]
+        assert scanner.style("Sign") == subtitle.styles["Sign"]
+    assert events == [event for event in subtitle.events if event.type == 'Dialogue']
+
+
+def test_format_is_detected_on_the_first_characters(tmp_path):
+    path = tmp_path / "late.ass"
+    path.write_text("x" * 10000 + "\n" + ass_file(STYLES, EVENTS), encoding="utf-8")
+    with pytest.raises(pysubs2.FormatAutodetectionError):
+        pysubs2.load(str(path))
+    with pytest.raises(pysubs2.FormatAutodetectionError):
+        AssScanner(str(path))
+
+
+def test_other_formats_are_loaded_with_pysubs2(tmp_path):
+    path = tmp_path / "sub.srt"
+    path.write_text("1\n00:00:01,000 --> 00:00:02,000\nHello\n", encoding="utf-8")
+    with pytest.raises(pysubs2.FormatAutodetectionError):
+        AssScanner(str(path))
+    with open_subtitle(str(path)) as subtitle:
+        assert [text for _, text, _ in subtitle.dialogues()] == ["Hello"]
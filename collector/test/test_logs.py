@@ -0,0 +1,46 @@
+import logging
+import os
+
+from collector.cache import ResultCache
+from collector.logs import logger, setup_logger
+from collector.report import collect_fonts
+from collector.test.conftest import write_subtitle
+
+
+def logged_run(directory, level, paths, cache_path=None):
+    # Collect with the log files of setup_logger() in directory, returns the lines of warnings.txt without the times
+    directory.mkdir()
+    handlers = logger.handlers[:]
+    logger_level = logger.level
+    current_directory = os.getcwd()
+    os.chdir(str(directory))
+    listener = setup_logger(level)
+    try:
+        cache = ResultCache(cache_path) if cache_path is not None else None
+        collect_fonts(paths, cache=cache, prefetch_depth=0)
+        if cache is not None:
+            cache.save()
+    finally:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        logger.handlers = handlers
+        logger.setLevel(logger_level)
+        os.chdir(current_directory)
+
+    with open(str(directory / "warnings.txt"), encoding="utf-8") as fp:
+        return [line.split(": ", 1)[1] for line in fp if ": " in line and line[:4].isdigit()]
+
+
+def test_cached_warnings_do_not_depend_on_the_log_level(tmp_path):
+    paths = [write_subtitle(tmp_path / "subs" / "{}.ass".format(i), "ok", ("Gone", "Lost {}".format(i)))
+             for i in range(3)]
+    cache_path = str(tmp_path / "cache.pickle")
+
+    errors_only = logged_run(tmp_path / "errors", logging.ERROR, paths, cache_path)
+    assert errors_only and all(line.startswith("ERROR") for line in errors_only)
+
+    # The cached results of the ERROR run still have their warnings
+    cached = logged_run(tmp_path / "cached", logging.WARNING, paths, cache_path)
+    assert cached == logged_run(tmp_path / "parsed", logging.WARNING, paths)
+    assert any(line.startswith("WARNING") for line in cached)
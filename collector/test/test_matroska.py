@@ -0,0 +1,260 @@
+import os
+import struct
+import zlib
+
+import pysubs2
+import pytest
+
+from collector import matroska, parsing
+from collector.matroska import MatroskaError, MatroskaFile, read_ass_tracks, read_vint
+from collector.cache import ResultCache
+from collector.parsing import parse_file
+from collector.report import collect_fonts
+from collector.test.conftest import STYLES
+
+# (read_order, start_ms, duration_ms, block fields after ReadOrder), in file order
+BLOCKS = [
+    (1, 1000, 500, "0,Sign,,0,0,0,,Second"),
+    (0, 1000, 1000, "0,Default,,0,0,0,,{\\fnMS Gothic}First, with a comma"),
+    (2, 5000, 250, "0,Default,,0,0,0,,Third"),
+]
+
+# The Dialogues of BLOCKS, in read order
+DIALOGUES = [
+    ("Default", "{\\fnMS Gothic}First, with a comma", 1000, 2000),
+    ("Sign", "Second", 1000, 1500),
+    ("Default", "Third", 5000, 5250),
+]
+
+
+def element(element_id, payload=b"", unknown_size=False):
+    # An element with its size written on 8 bytes, all ones when unknown
+    id_bytes = element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+    size = b"\x01\xff\xff\xff\xff\xff\xff\xff" if unknown_size else b"\x01" + len(payload).to_bytes(7, "big")
+    return id_bytes + size + payload
+
+
+def uint(element_id, value, size=None):
+    return element(element_id, value.to_bytes(size or max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def block(track_number, relative_timecode, data, flags=0x80):
+    # Track number, timecode relative to the Cluster, flags, then the data
+    return bytes([0x80 | track_number]) + struct.pack(">hB", relative_timecode, flags) + data
+
+
+def track_entry(number, codec_id, codec_private=b"", encodings=b""):
+    return element(matroska.TRACK_ENTRY, uint(matroska.TRACK_NUMBER, number)
+                   + element(matroska.CODEC_ID, codec_id.encode())
+                   + element(matroska.CODEC_PRIVATE, codec_private) + encodings)
+
+
+def clusters_and_cues(blocks, offset, flags, encode_blocks, unknown_size, video_size):
+    """
+    Build a Cluster for every Dialogue, with a video SimpleBlock before its BlockGroup.
+
+    offset is the position of the first Cluster in the Segment. The CuePoints have
+    positions of a fixed size, so their size does not depend on offset.
+    """
+
+    clusters = b""
+    cue_points = b""
+    for read_order, start, duration, fields in blocks:
+        timecode = uint(matroska.CLUSTER_TIMECODE, start - 10)
+        video = element(matroska.SIMPLE_BLOCK, block(2, 0, b"\x00" * video_size))
+        group = element(matroska.BLOCK_GROUP, element(
+            matroska.BLOCK, block(1, 10, encode_blocks("{},{}".format(read_order, fields).encode()), flags))
+            + uint(matroska.BLOCK_DURATION, duration))
+        cue_points += element(matroska.CUE_POINT, uint(0xB3, start) + element(
+            matroska.CUE_TRACK_POSITIONS, uint(matroska.CUE_TRACK, 1)
+            + uint(matroska.CUE_CLUSTER_POSITION, offset + len(clusters), 8)
+            + uint(matroska.CUE_RELATIVE_POSITION, len(timecode) + len(video), 8)))
+        clusters += element(matroska.CLUSTER, timecode + video + group, unknown_size)
+    return clusters, element(matroska.CUES, cue_points)
+
+
+def build_matroska(blocks=BLOCKS, cues=False, unknown_cluster_size=False, flags=0x80, encodings=b"",
+                   encode_header=bytes, encode_blocks=bytes, attachments=(), video_size=50):
+    # A Matroska file with the SubStation track 1 and the video track 2, returns its content
+    segment = element(matroska.INFO, uint(matroska.TIMECODE_SCALE, 1000000))
+    segment += element(matroska.TRACKS, track_entry(1, "S_TEXT/ASS", encode_header(STYLES.encode()), encodings)
+                       + track_entry(2, "V_MPEG4/ISO/AVC"))
+    if attachments:
+        segment += element(matroska.ATTACHMENTS, b"".join(
+            element(matroska.ATTACHED_FILE, element(matroska.FILE_NAME, name.encode())
+                    + element(matroska.FILE_MIME_TYPE, mime_type.encode())
+                    + element(matroska.FILE_DATA, data))
+            for name, mime_type, data in attachments))
+    if cues:
+        cues_size = len(clusters_and_cues(blocks, 0, flags, encode_blocks, unknown_cluster_size, video_size)[1])
+        clusters, cues_element = clusters_and_cues(blocks, len(segment) + cues_size, flags, encode_blocks,
+                                                   unknown_cluster_size, video_size)
+        segment += cues_element + clusters
+    else:
+        segment += clusters_and_cues(blocks, len(segment), flags, encode_blocks, unknown_cluster_size,
+                                     video_size)[0]
+
+    return element(matroska.EBML, element(matroska.DOC_TYPE, b"matroska")) + element(matroska.SEGMENT, segment)
+
+
+def write(tmp_path, content, name="video.mkv"):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def dialogues(track):
+    subtitle = track.to_ssafile()
+    return [(event.style, event.text, event.start, event.end) for event in subtitle.events]
+
+
+@pytest.mark.parametrize("data, value, length", [
+    (b"\x81", 1, 1),
+    (b"\x40\x02", 2, 2),
+    (b"\x10\x00\x00\x03", 3, 4),
+    (b"\x01\x00\x00\x00\x00\x00\x01\x00", 256, 8),
+    (b"\xff", None, 1),
+    (b"\x7f\xff", None, 2),
+])
+def test_read_vint(tmp_path, data, value, length):
+    path = write(tmp_path, data, "vint")
+    with open(path, "rb") as fp:
+        assert read_vint(fp) == (value, length)
+
+
+@pytest.mark.parametrize("options", [{}, {"cues": True}, {"unknown_cluster_size": True},
+                                     {"cues": True, "unknown_cluster_size": True}],
+                         ids=["walked", "cues", "unknown size", "cues and unknown size"])
+def test_tracks_are_read_in_read_order(tmp_path, options):
+    tracks, font_attachments = read_ass_tracks(write(tmp_path, build_matroska(**options)))
+    assert [track.number for track in tracks] == [1]
+    assert dialogues(tracks[0]) == DIALOGUES
+    assert not font_attachments
+
+
+def content_encodings(scope, algorithm, settings=b""):
+    compression = uint(matroska.CONTENT_COMP_ALGO, algorithm)
+    if settings:
+        compression += element(matroska.CONTENT_COMP_SETTINGS, settings)
+    return element(matroska.CONTENT_ENCODINGS, element(
+        matroska.CONTENT_ENCODING, uint(matroska.CONTENT_ENCODING_SCOPE, scope)
+        + element(matroska.CONTENT_COMPRESSION, compression)))
+
+
+def test_zlib_compressed_track(tmp_path):
+    # Scope 3, the blocks and the CodecPrivate header are compressed
+    content = build_matroska(encodings=content_encodings(3, 0), encode_header=zlib.compress,
+                             encode_blocks=zlib.compress)
+    tracks, _ = read_ass_tracks(write(tmp_path, content))
+    assert dialogues(tracks[0]) == DIALOGUES
+
+
+def test_header_stripped_track(tmp_path):
+    # Every block starts with the stripped bytes, the ReadOrder and Layer here
+    blocks = [(0, start, duration, fields) for _, start, duration, fields in BLOCKS]
+    content = build_matroska(blocks, encodings=content_encodings(1, 3, b"0,0,"),
+                             encode_blocks=lambda data: data[len(b"0,0,"):])
+    tracks, _ = read_ass_tracks(write(tmp_path, content))
+    assert sorted(dialogues(tracks[0])) == sorted(DIALOGUES)
+
+
+def test_encrypted_track_is_an_error(tmp_path):
+    encodings = element(matroska.CONTENT_ENCODINGS, element(
+        matroska.CONTENT_ENCODING, element(matroska.CONTENT_ENCRYPTION)))
+    with pytest.raises(MatroskaError, match="Encrypted"):
+        read_ass_tracks(write(tmp_path, build_matroska(encodings=encodings)))
+
+
+def test_laced_blocks_are_an_error(tmp_path):
+    with pytest.raises(MatroskaError, match="Laced"):
+        read_ass_tracks(write(tmp_path, build_matroska(flags=0x80 | 0x02)))
+
+
+def test_truncated_file_keeps_the_whole_blocks(tmp_path):
+    content = build_matroska()
+    last_cluster = content.rindex(matroska.CLUSTER.to_bytes(4, "big"))
+    for end in (last_cluster, last_cluster + 6, last_cluster + 20):
+        tracks, _ = read_ass_tracks(write(tmp_path, content[:end]))
+        assert dialogues(tracks[0]) == DIALOGUES[:2]
+
+
+@pytest.mark.parametrize("end", [0, 3, 20])
+def test_truncated_header_is_an_error(tmp_path, end):
+    with pytest.raises((MatroskaError, EOFError)):
+        MatroskaFile(write(tmp_path, build_matroska()[:end]))
+
+
+def test_other_files_are_not_matroska(tmp_path):
+    with pytest.raises(MatroskaError):
+        MatroskaFile(write(tmp_path, element(matroska.EBML, element(matroska.DOC_TYPE, b"other")) + b"\x00" * 20))
+
+
+def test_font_attachments(tmp_path):
+    attachments = [("a.ttf", "application/octet-stream", b"font a"),
+                   ("b.bin", "font/otf", b"font b"),
+                   ("cover.jpg", "image/jpeg", b"image")]
+    content = build_matroska(attachments=attachments)
+    with MatroskaFile(write(tmp_path, content)) as matroska_file:
+        fonts = [(name, matroska_file.read_attachment(position, size))
+                 for name, _, position, size in matroska_file.font_attachments()]
+    assert fonts == [("a.ttf", b"font a"), ("b.bin", b"font b")]
+
+
+def test_parse_file_reads_the_tracks_like_the_extracted_file(tmp_path):
+    path = write(tmp_path, build_matroska(cues=True))
+    tracks, _ = read_ass_tracks(path)
+    extracted = tmp_path / "video.1.ass"
+    extracted.write_text(tracks[0].to_string(), encoding="utf-8")
+    assert pysubs2.load(str(extracted)).events[0].text == DIALOGUES[0][1]
+
+    file_fonts, unparsed_events, error, style_table = parse_file(path)
+    assert error is None and not unparsed_events
+    assert file_fonts.fonts == parse_file(str(extracted))[0].fonts
+    assert style_table == {"Default": ("Arial", False, False), "Sign": ("Meiryo", True, False)}
+
+
+class CountingFile:
+    # A file which counts the bytes read from it in read_sizes
+    def __init__(self, fp, read_sizes):
+        self.fp = fp
+        self.read_sizes = read_sizes
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.read_sizes.append(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.fp, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.fp.close()
+
+
+def test_cached_matroska_files_are_never_read_whole(tmp_path, monkeypatch, parsed_files):
+    path = write(tmp_path, build_matroska(cues=True, video_size=1024 * 1024))
+    read_sizes = []
+    for module in (matroska, parsing):
+        monkeypatch.setattr(module, "open", lambda *args, **kwargs: CountingFile(open(*args, **kwargs), read_sizes),
+                            raising=False)
+    cache_path = str(tmp_path / "cache.pickle")
+
+    def collect():
+        cache = ResultCache(cache_path)
+        report = collect_fonts([path], cache=cache, prefetch_depth=0)
+        cache.save()
+        return dict(report.fonts.items())
+
+    # New, unchanged then touched file, the cues lead to the Dialogues without reading the video
+    fonts = collect()
+    assert collect() == fonts
+    mtime = os.stat(path).st_mtime_ns + 10 ** 9
+    os.utime(path, ns=(mtime, mtime))
+    assert collect() == fonts
+    assert sum(read_sizes) < 2 * 1024 * 1024
+    # Without a hash, the touched file is parsed again
+    assert parsed_files == ["video.mkv", "video.mkv"]
+    assert ResultCache(cache_path).signature(path)[1:] == (mtime, None)
@@ -0,0 +1,76 @@
+import logging
+import threading
+
+import pytest
+
+from collector.parsing import ParseContext, parse_file
+from collector.report import collect_fonts
+from collector.test.conftest import write_subtitle
+
+
+def write_broken_tag(tmp_path, name="a.ass"):
+    return write_subtitle(tmp_path / name, "{\\fnMeiryo}ok", "{\\bordx}broken")
+
+
+def test_parse_file_uses_its_context(tmp_path):
+    path = write_broken_tag(tmp_path)
+    file_fonts, unparsed_events, error, _ = parse_file(path, context=ParseContext(full_tags=False))
+    assert error is None and not unparsed_events
+    assert dict(file_fonts.items()) == {("Meiryo", False, False): "ko", ("Arial", False, False): "beknor"}
+
+    file_fonts, unparsed_events, error, _ = parse_file(path, context=ParseContext(full_tags=True))
+    assert error is None and len(unparsed_events) == 1
+    assert dict(file_fonts.items()) == {("Meiryo", False, False): "ko"}
+
+
+def test_calls_at_the_same_time_keep_their_options(tmp_path):
+    paths = [write_broken_tag(tmp_path, "{}.ass".format(i)) for i in range(20)]
+    results = {}
+
+    def collect(full_tags, scan):
+        for _ in range(10):
+            report = collect_fonts(paths, full_tags=full_tags, scan=scan, prefetch_depth=0)
+            results.setdefault((full_tags, scan), set()).add(
+                (tuple(report.fonts.items()), len(report.unparsed_events)))
+
+    threads = [threading.Thread(target=collect, args=options)
+               for options in [(False, True), (True, True), (False, False), (True, False)]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for (full_tags, scan), reports in results.items():
+        assert len(reports) == 1
+        fonts, unparsed_count = reports.pop()
+        assert unparsed_count == (20 if full_tags else 0)
+        assert len(fonts) == (1 if full_tags else 2)
+
+
+def collect_logged(paths, jobs, caplog):
+    # Everything a run writes: fonts, unparsed Dialogues, errors and warnings, in order
+    caplog.clear()
+    report = collect_fonts(paths, jobs=jobs, full_tags=True, prefetch_depth=0)
+    unparsed_events = [(event.text, event.style, style.fontname) for event, style in report.unparsed_events]
+    warnings = [(record.levelname, record.getMessage()) for record in caplog.records
+                if record.levelno >= logging.WARNING]
+    return list(report.fonts.items()), unparsed_events, report.errors, warnings
+
+
+@pytest.mark.parametrize("jobs", [2, 3, 8])
+def test_parallel_runs_are_the_same_as_a_serial_run(tmp_path, caplog, jobs):
+    caplog.set_level(logging.WARNING, logger="collector")
+    paths = [write_subtitle(tmp_path / "{}.ass".format(i), "{{\\fnFont {}}}{}".format(i % 3, chr(0x4e00 + i)),
+                            ("Sign", "sign {}".format(i)), ("Gone", "lost {}".format(i)))
+             for i in range(6)]
+    paths.insert(2, write_broken_tag(tmp_path, "broken.ass"))
+    (tmp_path / "garbage.ass").write_bytes(b"\0\xff not a subtitle")
+    paths.insert(4, str(tmp_path / "garbage.ass"))
+    paths.append(str(tmp_path / "missing.ass"))
+
+    serial = collect_logged(paths, 1, caplog)
+    fonts, unparsed_events, errors, warnings = serial
+    assert len(fonts) == 5 and len(unparsed_events) == 1
+    assert sorted(errors) == [str(tmp_path / "garbage.ass"), str(tmp_path / "missing.ass")]
+    assert any(level == "WARNING" for level, _ in warnings)
+    assert collect_logged(paths, jobs, caplog) == serial
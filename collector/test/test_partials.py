@@ -0,0 +1,107 @@
+import logging
+
+from collector.logs import RecordBuffer, logger
+from collector.partials import PartialBuilder, merge_partials, read_partial
+from collector.report import collect_fonts
+from collector.test.conftest import write_subtitle
+
+
+def write_shard_file(path, text):
+    # A file with a missing style warning
+    return write_subtitle(path, "{\\fnMeiryo}" + text, ("Missing", text))
+
+
+def write_shard(tmp_path, shard, texts):
+    paths = [write_shard_file(tmp_path / shard / "{}.ass".format(i), text) for i, text in enumerate(texts)]
+    (tmp_path / shard / "broken.ass").write_bytes(b"\x00not a subtitle")
+    paths.append(str(tmp_path / shard / "broken.ass"))
+    return paths
+
+
+def map_shard(tmp_path, shard, paths, name=None):
+    partial = PartialBuilder(shard, ("fonts", "scan"))
+    logger.addHandler(partial.records)
+    try:
+        collect_fonts(paths, on_file=partial.add_file, prefetch_depth=0)
+    finally:
+        logger.removeHandler(partial.records)
+    path = str(tmp_path / (name or shard + ".partial"))
+    partial.save(path)
+    return path
+
+
+def reduce(paths):
+    records = RecordBuffer(logging.WARNING)
+    logger.addHandler(records)
+    try:
+        report = merge_partials(read_partial(path) for path in paths)
+    finally:
+        logger.removeHandler(records)
+    return report, sorted(record.getMessage() for record in records.flush_records())
+
+
+def report_result(report):
+    return (dict(report.fonts.fonts), report.files, report.errors,
+            [event.text for event, _ in report.unparsed_events])
+
+
+def test_partials_merge_like_one_run(tmp_path):
+    level = logger.level
+    logger.setLevel(logging.DEBUG)
+    try:
+        a_paths = write_shard(tmp_path, "a", ["abc", "abd"])
+        b_paths = write_shard(tmp_path, "b", ["xyz"])
+        a_partial = map_shard(tmp_path, "a", a_paths)
+        b_partial = map_shard(tmp_path, "b", b_paths)
+
+        records = RecordBuffer(logging.WARNING)
+        logger.addHandler(records)
+        try:
+            whole = collect_fonts(a_paths + b_paths, prefetch_depth=0)
+        finally:
+            logger.removeHandler(records)
+        whole_messages = sorted(record.getMessage() for record in records.flush_records())
+
+        report, messages = reduce([a_partial, b_partial])
+    finally:
+        logger.setLevel(level)
+
+    assert dict(report.fonts.fonts) == dict(whole.fonts.fonts)
+    assert report.files == ["a:" + path for path in a_paths] + ["b:" + path for path in b_paths]
+    assert list(report.errors) == ["a:" + a_paths[-1], "b:" + b_paths[-1]]
+    # The missing style errors and the read warnings of the map runs are logged again
+    assert messages == whole_messages
+    assert any('"Missing"' in message for message in messages)
+
+
+def test_partials_merge_once_in_any_order(tmp_path):
+    a_partial = map_shard(tmp_path, "a", write_shard(tmp_path, "a", ["abc", "abd"]))
+    b_partial = map_shard(tmp_path, "b", write_shard(tmp_path, "b", ["xyz"]))
+
+    report, messages = reduce([a_partial, b_partial])
+    for paths in ([b_partial, a_partial], [a_partial, b_partial, a_partial], [b_partial, a_partial, b_partial]):
+        merged, merged_messages = reduce(paths)
+        assert report_result(merged) == report_result(report)
+        assert merged_messages == messages
+
+
+def test_retried_shard_replaces_its_partial(tmp_path):
+    a_paths = write_shard(tmp_path, "a", ["abc"])
+    first = map_shard(tmp_path, "a", a_paths, "first.partial")
+    write_shard_file(tmp_path / "a" / "0.ass", "q")
+    retried = map_shard(tmp_path, "a", a_paths, "retried.partial")
+
+    report, _ = reduce([first, retried])
+    assert dict(report.fonts.fonts)[("Meiryo", False, False)] == {"q": 1}
+    assert len(report.files) == 2
+
+
+def test_partials_merge_under_a_memory_budget(tmp_path):
+    a_partial = map_shard(tmp_path, "a", write_shard(tmp_path, "a", ["abc", "abd"]))
+    b_partial = map_shard(tmp_path, "b", write_shard(tmp_path, "b", ["xyz", "ab"]))
+
+    report = merge_partials(read_partial(path) for path in [a_partial, b_partial])
+    spilled = merge_partials((read_partial(path) for path in [b_partial, a_partial]), memory_budget=1)
+    assert spilled.fonts.spilled
+    assert list(spilled.fonts.frequencies()) == list(report.fonts.frequencies())
+    assert spilled.output_ass().to_string("ass") == report.output_ass().to_string("ass")
@@ -0,0 +1,79 @@
+import random
+import threading
+import time
+import zipfile
+from collections import Counter
+
+import pytest
+
+from collector import prefetch
+from collector.archives import file_signature
+from collector.prefetch import prefetch_tasks, read_task_data
+from collector.report import collect_fonts
+from collector.test.conftest import subtitle, write_subtitle
+
+
+def test_files_are_yielded_in_tasks_order(monkeypatch):
+    # The first files are the slowest to read
+    def slow_read(task):
+        time.sleep(random.uniform(0, 0.002) * (20 - int(task[0])))
+        return task[0].encode()
+
+    monkeypatch.setattr(prefetch, "read_task_data", slow_read)
+    tasks = [(str(i), None, True) for i in range(20)]
+    assert list(prefetch_tasks(tasks, 6)) == [(*task, task[0].encode()) for task in tasks]
+    assert list(prefetch_tasks([], 6)) == []
+
+
+@pytest.mark.parametrize("depth", [1, 3, 8])
+def test_prefetched_collection_is_the_same(tmp_path, depth):
+    paths = [write_subtitle(tmp_path / "{}.ass".format(i), "{{\\fnFont {}}}{}".format(i % 3, chr(0x4e00 + i)))
+             for i in range(12)]
+    report = collect_fonts(paths, prefetch_depth=depth)
+    assert report.collection() == collect_fonts(paths, prefetch_depth=0).collection()
+    assert list(report.files) == paths
+
+
+def test_only_useful_files_are_read(tmp_path, monkeypatch):
+    path = write_subtitle(tmp_path / "a.ass", "text")
+    data = (tmp_path / "a.ass").read_bytes()
+    assert read_task_data((path, None, True)) == data
+
+    # Unchanged cached files are not parsed, touched ones are
+    size, mtime = file_signature(path)
+    assert read_task_data((path, (size, mtime, "hash"), True)) is None
+    assert read_task_data((path, (size, mtime, "hash"), False)) == data
+    assert read_task_data((path, (size, mtime - 1, "hash"), True)) == data
+
+    # Matroska files and archive members are not read whole, missing files are left for the parser
+    (tmp_path / "video.mkv").write_bytes(b"\x1a\x45\xdf\xa3" + b"\0" * 100)
+    assert read_task_data((str(tmp_path / "video.mkv"), None, True)) is None
+    with zipfile.ZipFile(str(tmp_path / "subs.zip"), "w") as archive:
+        archive.writestr("b.ass", subtitle("text"))
+    assert read_task_data((str(tmp_path / "subs.zip" / "b.ass"), None, True)) is None
+    assert read_task_data((str(tmp_path / "missing.ass"), None, True)) is None
+
+    monkeypatch.setattr(prefetch, "PREFETCH_MAX_SIZE", len(data) - 1)
+    assert read_task_data((path, None, True)) is None
+
+
+def test_stalls_are_counted(monkeypatch):
+    # Only the first file is slow, the parser takes longer than reading the others
+    first_read = threading.Event()
+
+    def read(task):
+        if task[0] == "0":
+            first_read.wait(5)
+        return b""
+
+    monkeypatch.setattr(prefetch, "read_task_data", read)
+    summary = Counter()
+    timer = threading.Timer(0.05, first_read.set)
+    timer.start()
+    try:
+        for _ in prefetch_tasks([(str(i), None, True) for i in range(5)], 3, summary):
+            time.sleep(0.02)
+    finally:
+        timer.cancel()
+    assert summary["prefetch_stalls"] == 1
+    assert 0 < summary["prefetch_stall_seconds"] < 5
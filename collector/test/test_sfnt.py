@@ -0,0 +1,359 @@
+import os
+import struct
+
+import pytest
+
+from collector import coverage, font_files
+from collector.coverage import CoverageCache, CoverageChecker, write_coverage
+from collector.font_files import FontFileIndex, embedded_font_index, read_font_file
+from collector.fonts import MISSING_STYLE_FONT, FontAccumulator
+from collector.sfnt import FontFormatError, covers, merge_ranges, read_faces, read_font_coverage
+
+WINDOWS = (3, 1, 0x409)
+MAC_ROMAN = (1, 0, 0)
+
+
+def build_font(*faces):
+    """
+    Build a font file from the tables of every face, a {tag: content} dict.
+
+    Many faces make a collection. Every face gets its own copy of its tables,
+    placed after all the table directories.
+    """
+
+    header_size = 12 + 4 * len(faces) if len(faces) > 1 else 0
+    directories_size = sum(12 + 16 * len(tables) for tables in faces)
+    table_offset = header_size + directories_size
+    directories = b""
+    face_offsets = []
+    data = b""
+    for tables in faces:
+        face_offsets.append(header_size + len(directories))
+        directories += struct.pack(">4sHHHH", b"\x00\x01\x00\x00", len(tables), 0, 0, 0)
+        for tag, content in tables.items():
+            directories += struct.pack(">4sIII", tag, 0, table_offset + len(data), len(content))
+            # Tables start on 4 bytes boundaries
+            data += content + b"\x00" * (-len(content) % 4)
+    if len(faces) > 1:
+        header = struct.pack(">4sII{}I".format(len(faces)), b"ttcf", 0x10000, len(faces), *face_offsets)
+        return header + directories + data
+    return directories + data
+
+
+def name_table(*records):
+    # records are (platform_id, encoding_id, language_id), name_id, name
+    strings = b""
+    entries = b""
+    for (platform_id, encoding_id, language_id), name_id, name in records:
+        encoded = name.encode("utf-16-be" if platform_id != 1 else "mac_roman")
+        entries += struct.pack(">6H", platform_id, encoding_id, language_id, name_id, len(encoded), len(strings))
+        strings += encoded
+    return struct.pack(">HHH", 0, len(records), 6 + len(entries)) + entries + strings
+
+
+def os2_table(weight, selection=0):
+    # Version 4 table, only usWeightClass and fsSelection are set
+    return struct.pack(">HhH", 4, 0, weight) + b"\x00" * 56 + struct.pack(">H", selection) + b"\x00" * 32
+
+
+def face(family, subfamily="Regular", weight=None, selection=0, names=()):
+    tables = {b"name": name_table((WINDOWS, 1, family), (WINDOWS, 2, subfamily), *names)}
+    if weight is not None:
+        tables[b"OS/2"] = os2_table(weight, selection)
+    return tables
+
+
+def write_font(directory, name, *faces):
+    path = os.path.join(str(directory), name)
+    with open(path, "wb") as fp:
+        fp.write(build_font(*faces))
+    return path
+
+
+def test_font_names():
+    tables = face("Family", names=[
+        (WINDOWS, 4, "Family Regular"),
+        (WINDOWS, 6, "Family-Regular"),
+        (WINDOWS, 16, "Typographic"),
+        (MAC_ROMAN, 1, "Mac Familyé"),
+        ((3, 1, 0x411), 1, "ファミリー"),
+        # Version, copyright, unknown encodings and empty names are not font names
+        (WINDOWS, 5, "Version 1.0"),
+        (WINDOWS, 0, "Copyright"),
+        ((2, 0, 0), 1, "ISO"),
+        (WINDOWS, 1, "\x00 "),
+    ])
+    assert read_faces(build_font(tables)) == [(0, (
+        "Family", "Family Regular", "Family-Regular", "Mac Familyé", "Typographic",
+        "ファミリー"), 400, False)]
+
+
+def test_names_out_of_the_table_are_skipped():
+    table = name_table((WINDOWS, 1, "Family"), (WINDOWS, 4, "Full"))
+    # The last string is cut by the end of the table
+    assert read_faces(build_font({b"name": table[:-2]})) == [(0, ("Family",), 400, False)]
+
+
+@pytest.mark.parametrize("tables, weight, italic", [
+    (face("A", weight=300), 300, False),
+    (face("A", weight=900, selection=0x01), 900, True),
+    # Bold bit with a regular weight class, and no weight class
+    (face("A", weight=400, selection=0x20), 700, False),
+    (face("A", weight=0), 400, False),
+    # Without OS/2 the style is guessed from the subfamily
+    (face("A", "Bold Italic"), 700, True),
+    (face("A", "Oblique"), 400, True),
+    ({b"name": name_table((WINDOWS, 1, "A")), b"OS/2": os2_table(700)[:60]}, 400, False),
+], ids=["light", "black italic", "bold bit", "no weight", "bold italic subfamily", "oblique subfamily",
+        "short OS/2"])
+def test_font_style(tables, weight, italic):
+    assert read_faces(build_font(tables)) == [(0, ("A",), weight, italic)]
+
+
+def test_collection_faces():
+    data = build_font(face("A", weight=400), face("A", "Bold", weight=700), face("B", "Italic", selection=1))
+    assert read_faces(data) == [(0, ("A",), 400, False), (1, ("A",), 700, False), (2, ("B",), 400, True)]
+
+
+@pytest.mark.parametrize("data", [b"", b"wOFF" + b"\x00" * 20, b"ttcf\x00\x01\x00\x00\x00\x00\x00\x01\x00\x00\x00\x10"
+                                  + b"OTHR" + b"\x00" * 20],
+                         ids=["empty", "woff", "collection of other"])
+def test_other_files_are_not_fonts(data):
+    with pytest.raises(FontFormatError):
+        read_faces(data)
+
+
+def test_tables_out_of_the_file_are_an_error():
+    with pytest.raises(FontFormatError, match="name"):
+        read_faces(build_font(face("A"))[:-8])
+
+
+def test_read_font_file_errors(tmp_path):
+    empty = tmp_path / "empty.ttf"
+    empty.write_bytes(b"")
+    full_file_path, signature, faces, error = read_font_file(str(empty))
+    assert signature is not None and faces is None and error
+    assert read_font_file(str(tmp_path / "gone.ttf"))[1:3] == (None, None)
+
+
+def test_font_index_resolves_the_closest_style(tmp_path):
+    regular = write_font(tmp_path, "a.ttf", face("Font A", weight=400))
+    bold = write_font(tmp_path, "ab.ttf", face("Font A", "Bold", weight=700))
+    collection = write_font(tmp_path, "b.ttc", face("Font B", "Italic", weight=400, selection=1),
+                            face("Font B", "Black", weight=900))
+    write_font(tmp_path, "broken.otf", face("Broken"))
+    with open(os.path.join(str(tmp_path), "broken.otf"), "r+b") as fp:
+        fp.truncate(30)
+
+    font_index = FontFileIndex()
+    font_index.update([str(tmp_path)])
+    assert font_index.resolve(("font a", False, False)) == (regular, 0)
+    assert font_index.resolve(("Font A", True, False)) == (bold, 0)
+    # Same italic comes before the closest weight, and '@' is the vertical version
+    assert font_index.resolve(("Font A", False, True)) == (regular, 0)
+    assert font_index.resolve(("@Font B", True, False)) == (collection, 1)
+    assert font_index.resolve(("Font B", True, True)) == (collection, 0)
+    assert font_index.resolve(("Broken", False, False)) is None
+    assert font_index.resolve(("Other", False, False)) is None
+
+
+def test_font_index_reads_only_changed_files(tmp_path, monkeypatch):
+    original_read_font_faces = font_files.read_font_faces
+    fonts_dir = tmp_path / "fonts"
+    fonts_dir.mkdir()
+    kept = write_font(fonts_dir, "kept.ttf", face("Kept"))
+    changed = write_font(fonts_dir, "changed.ttf", face("Old"))
+    removed = write_font(fonts_dir, "removed.ttf", face("Removed"))
+    index_path = str(tmp_path / "font_index.pickle")
+    font_index = FontFileIndex(index_path)
+    font_index.update([str(fonts_dir)])
+    font_index.save()
+
+    os.remove(removed)
+    write_font(fonts_dir, "changed.ttf", face("New Name"))
+    os.utime(changed, ns=(0, 0))
+    read_files = []
+
+    def read_font_faces(full_file_path):
+        read_files.append(full_file_path)
+        return original_read_font_faces(full_file_path)
+
+    monkeypatch.setattr(font_files, "read_font_faces", read_font_faces)
+    font_index = FontFileIndex(index_path)
+    font_index.update([str(fonts_dir)])
+    assert read_files == [changed]
+    assert sorted(font_index.entries) == sorted([kept, changed])
+    assert font_index.resolve(("New Name", False, False)) == (changed, 0)
+    assert font_index.resolve(("Old", False, False)) is None
+    assert font_index.resolve(("Kept", False, False)) == (kept, 0)
+
+
+def test_embedded_font_index():
+    font_index, errors = embedded_font_index([("a.ttf", build_font(face("Embedded"))), ("b.ttf", b"not a font")])
+    assert font_index.resolve(("Embedded", False, False)) == ("a.ttf", 0)
+    assert list(errors) == ["b.ttf"]
+
+
+def cmap_format_4(segments):
+    """
+    Build a format 4 subtable from (start, end, delta, glyphs) segments, glyphs is None for delta segments.
+
+    The last 0xFFFF segment is added.
+    """
+
+    segments = list(segments) + [(0xFFFF, 0xFFFF, 1, None)]
+    count = len(segments)
+    range_offsets = []
+    glyph_ids = []
+    for i, (start, end, delta, glyphs) in enumerate(segments):
+        if glyphs is None:
+            range_offsets.append(0)
+        else:
+            # From the idRangeOffset of this segment to its first glyph in glyphIdArray
+            range_offsets.append(2 * (count - i) + 2 * len(glyph_ids))
+            glyph_ids.extend(glyphs)
+    body = (struct.pack(">{}H".format(count), *(end for _, end, _, _ in segments)) + b"\x00\x00"
+            + struct.pack(">{}H".format(count), *(start for start, _, _, _ in segments))
+            + struct.pack(">{}h".format(count), *(delta for _, _, delta, _ in segments))
+            + struct.pack(">{}H".format(count), *range_offsets)
+            + struct.pack(">{}H".format(len(glyph_ids)), *glyph_ids))
+    return struct.pack(">7H", 4, 14 + len(body), 0, 2 * count, 0, 0, 0) + body
+
+
+def cmap_format_12(groups):
+    # Build a format 12 subtable from (start, end, start_glyph) groups
+    body = b"".join(struct.pack(">III", *group) for group in groups)
+    return struct.pack(">HHIII", 12, 0, 16 + len(body), 0, len(groups)) + body
+
+
+def cmap_table(*subtables):
+    # subtables are ((platform_id, encoding_id), content)
+    header_size = 4 + 8 * len(subtables)
+    records = b""
+    data = b""
+    for (platform_id, encoding_id), content in subtables:
+        records += struct.pack(">HHI", platform_id, encoding_id, header_size + len(data))
+        data += content
+    return struct.pack(">HH", 0, len(subtables)) + records + data
+
+
+FORMAT_4 = cmap_format_4([
+    (0x20, 0x7E, -29, None),
+    # Only 0x3005 lands on glyph 0
+    (0x3000, 0x3010, -0x3005, None),
+    (0x4E00, 0x4E07, 0, [5, 6, 0, 0, 7, 8, 0, 9]),
+    # The delta is added to the glyphs of glyphIdArray too
+    (0x5000, 0x5002, -10, [11, 10, 12]),
+    # Starts after its end
+    (0x6000, 0x5000, 0, None),
+])
+
+FORMAT_4_RANGES = [(0x20, 0x7E), (0x3000, 0x3004), (0x3006, 0x3010), (0x4E00, 0x4E01), (0x4E04, 0x4E05),
+                   (0x4E07, 0x4E07), (0x5000, 0x5000), (0x5002, 0x5002)]
+
+
+@pytest.mark.parametrize("subtables, expected", [
+    ([((3, 1), FORMAT_4)], FORMAT_4_RANGES),
+    ([((0, 3), FORMAT_4)], FORMAT_4_RANGES),
+    # Glyph 0 is only dropped for the first codepoint of a group, adjacent groups are merged
+    ([((3, 10), cmap_format_12([(0x41, 0x43, 0), (0x44, 0x50, 10), (0x1F600, 0x1F64F, 20)]))],
+     [(0x42, 0x50), (0x1F600, 0x1F64F)]),
+    # Full Unicode comes first, whatever the order of the subtables
+    ([((3, 1), FORMAT_4), ((3, 10), cmap_format_12([(0x20000, 0x20010, 1)]))], [(0x20000, 0x20010)]),
+    # Symbol and Macintosh subtables are not Unicode
+    ([((3, 0), FORMAT_4), ((1, 0), FORMAT_4)], []),
+    ([], []),
+], ids=["windows format 4", "unicode format 4", "format 12", "format 12 first", "not unicode", "no subtables"])
+def test_cmap_ranges(tmp_path, subtables, expected):
+    path = write_font(tmp_path, "a.ttf", {b"cmap": cmap_table(*subtables)})
+    face_coverage, = read_font_coverage(path)
+    assert list(zip(*face_coverage)) == expected
+
+
+def test_covers():
+    ranges = merge_ranges([(10, 20), (30, 30), (21, 25), (12, 14)])
+    assert list(zip(*ranges)) == [(10, 25), (30, 30)]
+    assert [codepoint for codepoint in range(40) if covers(ranges, codepoint)] == list(range(10, 26)) + [30]
+    assert not covers(merge_ranges(()), 0)
+
+
+def test_collection_coverage(tmp_path):
+    path = write_font(tmp_path, "a.ttc", {b"cmap": cmap_table(((3, 10), cmap_format_12([(0x41, 0x5A, 1)])))},
+                      {b"name": name_table((WINDOWS, 1, "No cmap"))})
+    assert [list(zip(*face_coverage)) for face_coverage in read_font_coverage(path)] == [[(0x41, 0x5A)], []]
+
+
+def test_coverage_checker(tmp_path):
+    fonts_dir = tmp_path / "fonts"
+    fonts_dir.mkdir()
+    latin = {b"cmap": cmap_table(((3, 1), cmap_format_4([(0x20, 0x7E, 1, None)])))}
+    latin.update(face("Latin"))
+    cjk = {b"cmap": cmap_table(((3, 10), cmap_format_12([(0x4E00, 0x4E10, 1)])))}
+    cjk.update(face("CJK", "Bold", weight=700))
+    # The copy comes first when resolving, but both have the same coverage
+    latin_path = write_font(fonts_dir, "latin copy.ttf", latin)
+    write_font(fonts_dir, "latin.ttf", latin)
+    cjk_path = write_font(fonts_dir, "cjk.ttf", cjk)
+    font_index = FontFileIndex()
+    font_index.update([str(fonts_dir)])
+    cache = CoverageCache(str(tmp_path / "glyph_cache.pickle"))
+    checker = CoverageChecker(font_index, cache)
+
+    first = FontAccumulator()
+    first.add(("Latin", False, False), "Abc\u00e9\u200b\n")
+    first.add(("CJK", True, False), "一丁丠")
+    first.add(("Unknown", False, False), "丠")
+    first.add(MISSING_STYLE_FONT, "丰")
+    checker.add_file("first.ass", first, [], None, {})
+    second = FontAccumulator()
+    second.add(("CJK", True, False), "丁両")
+    checker.add_file("second.ass", second, [], None, {})
+    third = FontAccumulator()
+    third.add(("Latin", False, False), "Abc")
+    checker.add_file("third.ass", third, [], None, {})
+
+    # Zero width space and line breaks need no glyph
+    assert checker.missing_by_file == {
+        "first.ass": {("Latin", False, False): {"é"}, ("CJK", True, False): {"丠"}},
+        "second.ass": {("CJK", True, False): {"両"}},
+    }
+    assert checker.missing_by_font == {("Latin", False, False): {"é"}, ("CJK", True, False): {"丠", "両"}}
+    assert len(cache.coverages) == 2
+
+    output_path = str(tmp_path / "missing_glyphs.txt")
+    write_coverage(checker, output_path)
+    with open(output_path, encoding="utf-8") as fp:
+        assert fp.read() == (
+            "Latin\t{latin}\t0\té (U+00E9)\n"
+            "\tfirst.ass\té (U+00E9)\n"
+            "CJK-bold\t{cjk}\t0\t丠両 (U+4E20 U+4E21)\n"
+            "\tfirst.ass\t丠 (U+4E20)\n"
+            "\tsecond.ass\t両 (U+4E21)\n").format(latin=latin_path, cjk=cjk_path)
+
+
+def test_coverage_cache_reads_copies_once(tmp_path, monkeypatch):
+    content = {b"cmap": cmap_table(((3, 10), cmap_format_12([(0x41, 0x5A, 1)])))}
+    first = write_font(tmp_path, "a.ttf", content)
+    copy = write_font(tmp_path, "b.ttf", content)
+    cache_path = str(tmp_path / "glyph_cache.pickle")
+    cache = CoverageCache(cache_path)
+    assert cache.font_coverage(first) == cache.font_coverage(copy)
+    assert len(cache.hashes) == 2 and len(cache.coverages) == 1
+    cache.save()
+
+    # Files with the same signature are neither hashed nor read again
+    monkeypatch.setattr(coverage, "file_hash", None)
+    monkeypatch.setattr(coverage, "read_font_coverage", None)
+    cache = CoverageCache(cache_path)
+    assert list(zip(*cache.font_coverage(copy)[0])) == [(0x41, 0x5A)]
+
+    # A changed file is hashed again, and its old coverage is dropped on save
+    monkeypatch.undo()
+    write_font(tmp_path, "a.ttf", {b"cmap": cmap_table(((3, 10), cmap_format_12([(0x30, 0x39, 1)])))})
+    write_font(tmp_path, "b.ttf", {b"cmap": cmap_table(((3, 10), cmap_format_12([(0x30, 0x39, 1)])))})
+    os.utime(first, ns=(0, 0))
+    os.utime(copy, ns=(0, 0))
+    assert list(zip(*cache.font_coverage(first)[0])) == [(0x30, 0x39)]
+    cache.font_coverage(copy)
+    cache.save()
+    assert len(CoverageCache(cache_path).coverages) == 1
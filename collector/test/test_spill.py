@@ -0,0 +1,95 @@
+import os
+import random
+import resource
+
+import pytest
+
+from collector import spill
+from collector.fonts import FontAccumulator
+from collector.report import CollectionReport
+from collector.spill import SpillingFontAccumulator
+
+
+def add_texts(accumulator, seed=0, files=50):
+    # Files with overlapping CJK characters in 20 fonts, merged like collect_fonts() does
+    rng = random.Random(seed)
+    for _ in range(files):
+        file_fonts = FontAccumulator()
+        for _ in range(20):
+            font_key = ("Font {}".format(rng.randrange(20)), rng.random() < 0.3, False)
+            file_fonts.add(font_key, "".join(chr(0x4e00 + rng.randrange(300)) for _ in range(30)))
+        accumulator.merge(file_fonts)
+    accumulator.add(("Last", False, False), "abc")
+    return accumulator
+
+
+@pytest.mark.parametrize("memory_budget", [1, 5000, 50000, 10 ** 9])
+def test_spilled_counts_are_the_same_as_in_memory(memory_budget):
+    in_memory = add_texts(FontAccumulator())
+    spilling = add_texts(SpillingFontAccumulator(memory_budget))
+    spilling.finish()
+    assert spilling.spilled == (memory_budget < 10 ** 9)
+
+    assert list(spilling) == list(in_memory)
+    assert len(spilling) == len(in_memory)
+    assert list(spilling.items()) == list(in_memory.items())
+    assert list(spilling.frequencies()) == list(in_memory.frequencies())
+    # Iterating again merges the spill files again
+    assert list(spilling.items()) == list(in_memory.items())
+
+
+def test_spilled_output_ass_is_the_same():
+    in_memory = CollectionReport()
+    add_texts(in_memory.fonts)
+    spilled = CollectionReport()
+    spilled.fonts = add_texts(SpillingFontAccumulator(5000))
+    spilled.fonts.finish()
+
+    assert spilled.fonts.spilled
+    assert spilled.output_ass().to_string("ass") == in_memory.output_ass(in_memory.collection()).to_string("ass")
+
+
+def test_fonts_known_in_advance_keep_their_order():
+    font_keys = [("B", False, False), ("A", True, False)]
+    for memory_budget in (1, 10 ** 9):
+        spilling = SpillingFontAccumulator(memory_budget, font_keys=font_keys)
+        spilling.add(("A", True, False), "xy")
+        spilling.add(("B", False, False), "z")
+        spilling.finish()
+        assert list(spilling.items()) == [(("B", False, False), "z"), (("A", True, False), "xy")]
+
+
+@pytest.mark.parametrize("fan_in", [2, 3, 16])
+def test_spill_files_are_merged_by_levels(monkeypatch, fan_in):
+    monkeypatch.setattr(spill, "SPILL_MERGE_FAN_IN", fan_in)
+    in_memory = add_texts(FontAccumulator(), files=100)
+    # Every file spills
+    spilling = add_texts(SpillingFontAccumulator(1), files=100)
+    spilling.finish()
+
+    assert spilling.spills_count == 101
+    # At most fan_in - 1 files of every level stay open
+    levels = spilling.spill_levels
+    assert levels == sorted(levels, reverse=True)
+    assert all(levels.count(level) < fan_in for level in levels)
+    assert len(spilling.spill_files) == len(levels) < fan_in * len(set(levels))
+    assert list(spilling.items()) == list(in_memory.items())
+    assert list(spilling.frequencies()) == list(in_memory.frequencies())
+
+
+def test_many_spills_stay_under_the_open_files_limit():
+    open_files_count = len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else 20
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    spilling = SpillingFontAccumulator(1)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (open_files_count + 64, hard_limit))
+    try:
+        for i in range(1000):
+            spilling.add(("Font {}".format(i % 5), False, False), chr(0x4e00 + i % 300) * 2)
+        spilling.finish()
+        frequencies = dict(spilling.frequencies())
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft_limit, hard_limit))
+
+    assert spilling.spills_count == 1000
+    assert len(frequencies) == 5
+    assert sum(count for counts in frequencies.values() for _, count in counts) == 2000
@@ -0,0 +1,91 @@
+import pytest
+from pysubs2.substation import uuencode
+
+from collector.fonts import FontAccumulator
+from collector.parsing import ParseContext, parse_file
+from collector.report import collect_fonts
+from collector.split import split_task
+from collector.test.conftest import HEADER, dialogue
+
+
+def dialogues(count):
+    return "".join(dialogue("{{\\fnFont {}}}{}{}".format(i % 7, chr(0x4e00 + i % 500), "{\\bordx}" * (i % 11 == 0)),
+                            ("Default", "Late", "Missing")[i % 3])
+                   for i in range(count))
+
+
+SPLIT_FILES = [
+    HEADER + dialogues(600),
+    # Styles after the events are read by every part, and Dialogues in other sections are read too
+    HEADER + dialogues(300) + "[V4+ Styles]\n"
+    "Style: Late,Meiryo,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,-1,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1\n"
+    "[Aegisub Project Garbage]\n" + dialogues(10) + "[Events]\n" + dialogues(300),
+    (HEADER + dialogues(600)).replace("\n", "\r\n"),
+    (HEADER + dialogues(600)).replace("\n", "\r"),
+]
+
+
+def parse_parts(path, parts_count, full_tags=False):
+    # Join the parts in order like join_parts()
+    file_fonts = FontAccumulator()
+    unparsed_events = []
+    for part_index in range(parts_count):
+        part_fonts, part_unparsed_events, error, _ = parse_file(path, part=(part_index, parts_count),
+                                                               context=ParseContext(full_tags=full_tags))
+        assert error is None
+        file_fonts.merge(part_fonts)
+        unparsed_events.extend(part_unparsed_events)
+    return file_fonts.fonts, [event for event, _ in unparsed_events]
+
+
+@pytest.mark.parametrize("content", SPLIT_FILES, ids=["lf", "sections", "crlf", "cr"])
+@pytest.mark.parametrize("parts_count", [2, 3, 7, 50])
+def test_parts_read_like_the_whole_file(tmp_path, content, parts_count):
+    path = tmp_path / "big.ass"
+    path.write_bytes(content.encode("utf-8"))
+    whole_fonts, whole_unparsed_events, error, _ = parse_file(str(path), context=ParseContext(full_tags=True))
+    assert error is None and whole_unparsed_events
+    assert parse_parts(str(path), parts_count, full_tags=True) == (
+        whole_fonts.fonts, [event for event, _ in whole_unparsed_events])
+
+
+def test_files_with_embedded_fonts_are_read_by_the_first_part(tmp_path):
+    path = tmp_path / "fonts.ass"
+    path.write_text(HEADER + dialogues(500) + "[Fonts]\nfontname: a.ttf\n" + "\n".join(uuencode(b"abc")) + "\n",
+                    encoding="utf-8")
+    whole_fonts = parse_file(str(path))[0]
+    first_fonts = parse_file(str(path), part=(0, 3))[0]
+    assert first_fonts.fonts == whole_fonts.fonts
+    fonts, unparsed_events, error, _ = parse_file(str(path), part=(2, 3))
+    assert not fonts.fonts and not unparsed_events and error is None
+
+
+def test_other_formats_are_read_by_the_first_part(tmp_path):
+    path = tmp_path / "sub.srt"
+    path.write_text("".join("{}\n00:00:01,000 --> 00:00:02,000\n{}\n\n".format(i + 1, chr(0x4e00 + i))
+                            for i in range(100)), encoding="utf-8")
+    whole_fonts = parse_file(str(path))[0]
+    assert parse_file(str(path), part=(0, 2))[0].fonts == whole_fonts.fonts
+    fonts, unparsed_events, error, _ = parse_file(str(path), part=(1, 2))
+    assert not fonts.fonts and not unparsed_events and error is None
+
+
+def test_split_task_only_reads_the_size(tmp_path):
+    path = tmp_path / "big.ass"
+    path.write_bytes(b"x" * 1000)
+    assert split_task((str(path), None, False), 1000) is None
+    assert [task[4] for task in split_task((str(path), None, True), 300)] == [(0, 4), (1, 4), (2, 4), (3, 4)]
+    assert [task[2] for task in split_task((str(path), None, True), 300)] == [True, False, False, False]
+
+
+def test_split_collection_is_the_same(tmp_path):
+    paths = []
+    for i, content in enumerate(SPLIT_FILES):
+        path = tmp_path / "{}.ass".format(i)
+        path.write_bytes(content.encode("utf-8"))
+        paths.append(str(path))
+    serial = collect_fonts(paths, prefetch_depth=0)
+    split = collect_fonts(paths, jobs=2, split_size=6000)
+    assert split.summary["split_files"] == len(paths)
+    assert list(split.fonts.frequencies()) == list(serial.fonts.frequencies())
+    assert [event for event, _ in split.unparsed_events] == [event for event, _ in serial.unparsed_events]
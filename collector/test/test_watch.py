@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from collector import watch
+from collector.cache import ResultCache
+from collector.parsing import parse_file
+from collector.report import collect_fonts
+from collector.test.conftest import write_subtitle
+from collector.watch import WatchedCollection, watch_fonts
+
+
+def frequencies(report):
+    return {font_key: frequency for font_key, frequency in report.fonts.frequencies()}
+
+
+def test_removed_files_retract_their_characters(tmp_path):
+    a = write_subtitle(tmp_path / "a.ass", "aab", "{\\fnOther}x")
+    b = write_subtitle(tmp_path / "b.ass", "abc")
+    collection = WatchedCollection()
+    collection.put(a, *parse_file(a))
+    collection.put(b, *parse_file(b))
+    assert frequencies(collection.report([a, b])) == frequencies(collect_fonts([a, b], prefetch_depth=0))
+
+    # Characters used by both files keep the counts of the other one
+    collection.remove(a)
+    assert frequencies(collection.report([b])) == {("Arial", False, False): [("a", 1), ("b", 1), ("c", 1)]}
+    assert ("Other", False, False) not in collection.references
+    # Removing a file twice or an unknown file changes nothing
+    collection.remove(a)
+    collection.remove(str(tmp_path / "unknown.ass"))
+    assert frequencies(collection.report([b])) == {("Arial", False, False): [("a", 1), ("b", 1), ("c", 1)]}
+
+    collection.remove(b)
+    assert not collection.references and not collection.results
+
+
+def test_modified_files_replace_their_characters(tmp_path):
+    a = write_subtitle(tmp_path / "a.ass", "aab")
+    b = write_subtitle(tmp_path / "b.ass", "{\\fnOther}b")
+    collection = WatchedCollection()
+    collection.put(a, *parse_file(a))
+    collection.put(b, *parse_file(b))
+
+    write_subtitle(tmp_path / "a.ass", "{\\fnOther}bd", "c")
+    collection.put(a, *parse_file(a))
+    report = collection.report([a, b])
+    # Fonts are in the order of the files, like a new collection
+    assert list(report.fonts.items()) == list(collect_fonts([a, b], prefetch_depth=0).fonts.items())
+    assert frequencies(report) == {("Other", False, False): [("b", 2), ("d", 1)],
+                                   ("Arial", False, False): [("c", 1)]}
+
+
+class StopWatching(Exception):
+    pass
+
+
+def test_watch_collects_added_modified_and_deleted_files(tmp_path, monkeypatch):
+    directory = tmp_path / "subs"
+    directory.mkdir()
+    write_subtitle(directory / "a.ass", "ab", mtime=10 ** 9)
+    write_subtitle(directory / "b.ass", "bc", mtime=10 ** 9)
+
+    # Every sleep between two walks makes the next change
+    changes = [
+        lambda: write_subtitle(directory / "c.ass", "{\\fnOther}z", mtime=10 ** 9),
+        lambda: write_subtitle(directory / "a.ass", "aa", mtime=2 * 10 ** 9),
+        lambda: os.remove(str(directory / "b.ass")),
+        # Nothing changed, nothing is written
+        lambda: None,
+        lambda: [os.remove(str(directory / name)) for name in ("a.ass", "c.ass")],
+    ]
+
+    def sleep(interval):
+        if not changes:
+            raise StopWatching
+        changes.pop(0)()
+
+    monkeypatch.setattr(watch.time, "sleep", sleep)
+    written = []
+
+    def write(report, collection):
+        written.append(({os.path.basename(path) for path in report.files}, frequencies(report)))
+
+    with pytest.raises(StopWatching):
+        watch_fonts(str(directory), write, debounce=0, prefetch_depth=0)
+
+    arial = ("Arial", False, False)
+    assert written == [
+        ({"a.ass", "b.ass"}, {arial: [("b", 2), ("a", 1), ("c", 1)]}),
+        ({"a.ass", "b.ass", "c.ass"}, {arial: [("b", 2), ("a", 1), ("c", 1)], ("Other", False, False): [("z", 1)]}),
+        ({"a.ass", "b.ass", "c.ass"}, {arial: [("a", 2), ("b", 1), ("c", 1)], ("Other", False, False): [("z", 1)]}),
+        ({"a.ass", "c.ass"}, {arial: [("a", 2)], ("Other", False, False): [("z", 1)]}),
+        (set(), {}),
+    ]
+
+
+def test_deleted_files_are_removed_from_the_cache(tmp_path, monkeypatch):
+    directory = tmp_path / "subs"
+    paths = [write_subtitle(directory / name, "ab", mtime=10 ** 9) for name in ("a.ass", "b.ass")]
+    cache_path = str(tmp_path / "cache.pickle")
+    cache = ResultCache(cache_path)
+
+    changes = [lambda: os.remove(paths[0])]
+
+    def sleep(interval):
+        if not changes:
+            raise StopWatching
+        changes.pop(0)()
+
+    monkeypatch.setattr(watch.time, "sleep", sleep)
+    cached_files = []
+
+    def write(report, collection):
+        cache.save()
+        cached_files.append((sorted(cache.entries), sorted(cache.used_entries)))
+
+    with pytest.raises(StopWatching):
+        watch_fonts(str(directory), write, cache=cache, debounce=0, prefetch_depth=0)
+
+    assert cached_files == [(paths, paths), (paths[1:], paths[1:])]
+    assert sorted(ResultCache(cache_path).entries) == paths[1:]
@@ -0,0 +1,158 @@
+import time
+from collections import Counter
+
+from .archives import ArchiveError, file_signature
+from .duplicates import find_duplicates
+from .files import walk_subtitles
+from .fonts import DEFAULT_MEMO_SIZE
+from .logs import LogMessage, logger
+from .parsing import PARALLEL_CHUNK_SIZE, parse_files
+from .prefetch import DEFAULT_PREFETCH_DEPTH
+from .split import DEFAULT_SPLIT_SIZE
+from .report import CollectionReport
+
+
+def stat_signatures(full_file_paths, ignored=frozenset()):
+    # Map every file to its (size, mtime) signature, files which disappeared meanwhile are skipped
+    signatures = {}
+    for full_file_path in full_file_paths:
+        if full_file_path in ignored:
+            continue
+        try:
+            signatures[full_file_path] = file_signature(full_file_path)
+        except (OSError, ArchiveError):
+            continue
+    return signatures
+
+
+class WatchedCollection:
+    """
+    Results of every collected file, which can be replaced or removed one file at a time.
+
+    Every character of a font counts its uses in all the files, so removing a file
+    retracts its characters and counts without merging the other files again.
+    """
+
+    def __init__(self):
+        # (file_fonts, unparsed_events, error, style_table) of every file
+        self.results = {}
+        # Uses of every character in all the files, keyed by font then character
+        self.references = {}
+        self.summary = Counter()
+
+    def put(self, full_file_path, file_fonts, unparsed_events, error, style_table):
+        self.remove(full_file_path)
+        self.results[full_file_path] = (file_fonts, unparsed_events, error, style_table)
+        for font_key, characters in file_fonts.fonts.items():
+            counts = self.references.get(font_key)
+            if counts is None:
+                counts = self.references[font_key] = Counter()
+            counts.update(characters)
+
+    def remove(self, full_file_path):
+        result = self.results.pop(full_file_path, None)
+        if result is None:
+            return
+        for font_key, characters in result[0].fonts.items():
+            counts = self.references[font_key]
+            for character, count in characters.items():
+                if counts[character] == count:
+                    del counts[character]
+                else:
+                    counts[character] -= count
+            if not counts:
+                del self.references[font_key]
+
+    def report(self, full_file_paths):
+        """
+        Build the CollectionReport of the files, in the given order.
+
+        Fonts are in the order they are first used, like collect_fonts() of the same files.
+        """
+
+        report = CollectionReport()
+        report.summary = self.summary
+        for full_file_path in full_file_paths:
+            file_fonts, unparsed_events, error, style_table = self.results[full_file_path]
+            report.files.append(full_file_path)
+            for font_key in file_fonts.fonts:
+                if font_key not in report.fonts.fonts:
+                    report.fonts.fonts[font_key] = Counter(self.references[font_key])
+            report.unparsed_events.extend(unparsed_events)
+            if error is not None:
+                report.errors[full_file_path] = error
+        return report
+
+    def file_results(self, full_file_paths):
+        # Yield (full_file_path, file_fonts, unparsed_events, error, style_table) like parse_files()
+        for full_file_path in full_file_paths:
+            yield (full_file_path, *self.results[full_file_path])
+
+
+def watch_fonts(directory, write, *, include=('*.ass',), exclude=(), max_depth=None, archives=False,
+                ignored=frozenset(), jobs=1, cache=None, memo_size=DEFAULT_MEMO_SIZE, scan=True, full_tags=False,
+                dedupe=False, prefetch_depth=DEFAULT_PREFETCH_DEPTH, split_size=DEFAULT_SPLIT_SIZE,
+                interval=1.0, debounce=1.0):
+    """
+    Keep collecting the fonts of the files under directory until interrupted.
+
+    The directory is walked every interval seconds and files are compared by
+    (size, mtime). Once nothing changed for debounce seconds, only the added and
+    modified files are parsed, the deleted files are removed, and write is called
+    with the CollectionReport of all the files and the WatchedCollection. Deleted files are
+    removed from cache too, so it does not keep growing. ignored is a set of full paths
+    which are never collected, e.g. the written files. The other arguments are
+    the same as walk_subtitles() and collect_fonts().
+    """
+
+    collection = WatchedCollection()
+
+    # Signatures of the collected files, and of the files found by the last walk
+    collected = None
+    found = None
+    changed_at = 0.0
+
+    while True:
+        signatures = stat_signatures(walk_subtitles(directory, include, exclude, max_depth, archives), ignored)
+        now = time.monotonic()
+        if signatures != found:
+            found = signatures
+            changed_at = now
+
+        # The first walk is collected at once, then wait for a burst of saves to end
+        if collected is None or (found != collected and now - changed_at >= debounce):
+            collected = collected or {}
+            deleted_files = [full_file_path for full_file_path in collected if full_file_path not in found]
+            changed_files = [full_file_path for full_file_path, signature in found.items()
+                             if collected.get(full_file_path) != signature]
+            added_count = sum(1 for full_file_path in changed_files if full_file_path not in collected)
+
+            for full_file_path in deleted_files:
+                collection.remove(full_file_path)
+                if cache is not None:
+                    cache.remove(full_file_path)
+
+            # Starting worker processes is not worth it for a few saved files
+            update_jobs = jobs if len(changed_files) > PARALLEL_CHUNK_SIZE else 1
+            # Only the changed files are compared, an unchanged original is not parsed again anyway
+            duplicates = find_duplicates(changed_files, cache) if dedupe else None
+            for file_result in parse_files(changed_files, update_jobs, cache, memo_size, collection.summary,
+                                           scan, full_tags, duplicates, prefetch_depth, split_size):
+                collection.put(*file_result)
+
+            collected = found
+
+            logger.info(LogMessage('{ADDED} added, {MODIFIED} modified, {DELETED} deleted files', {
+                'ADDED': added_count,
+                'MODIFIED': len(changed_files) - added_count,
+                'DELETED': len(deleted_files),
+            }))
+
+            if not found:
+                logger.warning('Cannot find any ass files.')
+
+            # Write the empty result too when the last files were deleted
+            if found or deleted_files:
+                write(collection.report(found), collection)
+
+        time.sleep(interval)
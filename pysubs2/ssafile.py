@@ -1,5 +1,9 @@
 from __future__ import print_function, unicode_literals, division
-from collections import MutableSequence, OrderedDict
+from collections import OrderedDict
+try:
+    from collections.abc import MutableSequence
+except ImportError:
+    from collections import MutableSequence
 import io
 from io import open
 from itertools import starmap, chain
@@ -41,6 +45,8 @@ class SSAFile(MutableSequence):
         self.styles = OrderedDict([("Default", SSAStyle.DEFAULT_STYLE.copy())]) #: Dict of :class:`SSAStyle` instances.
         self.info = self.DEFAULT_INFO.copy() #: Dict with script metadata, ie. ``[Script Info]``.
         self.aegisub_project = OrderedDict() #: Dict with Aegisub project, ie. ``[Aegisub Project Garbage]``.
+        self.fonts = OrderedDict() #: Dict of embedded font files, name to content bytes, ie. ``[Fonts]``.
+        self.graphics = OrderedDict() #: Dict of embedded picture files, name to content bytes, ie. ``[Graphics]``.
         self.fps = None #: Framerate used when reading the file, if applicable.
         self.format = None #: Format of source subtitle file, if applicable, eg. ``"srt"``.
 
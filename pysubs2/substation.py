@@ -1,4 +1,5 @@
 from __future__ import print_function, division, unicode_literals
+import base64
 import re
 from numbers import Number
 from .formatbase import FormatBase
@@ -17,6 +18,9 @@ def ssa_to_ass_alignment(i):
 
 SECTION_HEADING = re.compile(r"^.{,3}\[[^\]]+\]") # allow for UTF-8 BOM, which is 3 bytes
 
+# Encoded lines of embedded files may look like headings, but they have no lower case letters or spaces
+ATTACHMENT_SECTION_HEADING = re.compile(r"^.{,3}\[[^\]]*[a-z ][^\]]*\]")
+
 STYLE_FORMAT_LINE = {
     "ass": "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic,"
            " Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment,"
@@ -75,6 +79,34 @@ def ssa_rgb_to_color(s):
     b = (x >> 16) & 0xff
     return Color(r, g, b)
 
+#: Length of the UUencoded lines of embedded files, as written by Aegisub.
+UUENCODED_LINE_LENGTH = 80
+
+# SubStation UUencoding maps every 6 bits to the characters 33 to 96, in the same order as base64,
+# so whole blocks are converted with the C implementation of base64 instead of a loop per character
+_BASE64_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+_UUENCODED_ALPHABET = "".join(chr(33 + i) for i in range(64))
+_UUDECODE_TABLE = {ord(u): ord(b) for u, b in zip(_UUENCODED_ALPHABET, _BASE64_ALPHABET)}
+_UUENCODE_TABLE = {ord(b): ord(u) for u, b in zip(_UUENCODED_ALPHABET, _BASE64_ALPHABET)}
+
+def uudecode(lines):
+    """
+    Decode the lines of a file embedded in the [Fonts] or [Graphics] section.
+
+    Lines are decoded as one block, a last group of 2 or 3 characters holds 1 or 2 bytes.
+
+    """
+    text = "".join(line.strip() for line in lines).translate(_UUDECODE_TABLE)
+    if len(text) % 4 == 1:
+        # A single character does not hold a whole byte
+        text = text[:-1]
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+def uuencode(data):
+    """Encode a file to embed in the [Fonts] or [Graphics] section, returns a list of lines."""
+    text = base64.b64encode(data).decode("ascii").rstrip("=").translate(_UUENCODE_TABLE)
+    return [text[i:i+UUENCODED_LINE_LENGTH] for i in range(0, len(text), UUENCODED_LINE_LENGTH)]
+
 def is_valid_field_content(s):
     """
     Returns True if string s can be stored in a SubStation field.
@@ -176,16 +208,48 @@ class SubstationFormat(FormatBase):
         subs.info.clear()
         subs.aegisub_project.clear()
         subs.styles.clear()
+        subs.fonts.clear()
+        subs.graphics.clear()
 
         inside_info_section = False
         inside_aegisub_section = False
+        inside_fonts_section = False
+        inside_graphics_section = False
+
+        # Name, encoded lines and target dict of the embedded file being read
+        attachment_name = None
+        attachment_lines = []
+        attachments = None
+
+        def end_attachment():
+            if attachment_name is not None:
+                attachments[attachment_name] = uudecode(attachment_lines)
 
         for line in fp:
             line = line.strip()
 
-            if SECTION_HEADING.match(line):
+            if inside_fonts_section or inside_graphics_section:
+                heading = ATTACHMENT_SECTION_HEADING
+            else:
+                heading = SECTION_HEADING
+
+            if heading.match(line):
+                end_attachment()
+                attachment_name = None
                 inside_info_section = "Info" in line
                 inside_aegisub_section = "Aegisub" in line
+                inside_fonts_section = "[Fonts]" in line
+                inside_graphics_section = "[Graphics]" in line
+            elif inside_fonts_section or inside_graphics_section:
+                # Encoded lines use the characters 33 to 96, so they never start with a lower case name
+                prefix = "fontname:" if inside_fonts_section else "filename:"
+                if line.startswith(prefix):
+                    end_attachment()
+                    attachment_name = line[len(prefix):].strip()
+                    attachment_lines = []
+                    attachments = subs.fonts if inside_fonts_section else subs.graphics
+                elif line and attachment_name is not None:
+                    attachment_lines.append(line)
             elif inside_info_section or inside_aegisub_section:
                 if line.startswith(";"): continue # skip comments
                 try:
@@ -211,6 +275,8 @@ class SubstationFormat(FormatBase):
                 ev = SSAEvent(**field_dict)
                 subs.events.append(ev)
 
+        end_attachment()
+
 
     @classmethod
     def to_file(cls, subs, fp, format_, header_notice=NOTICE, **kwargs):
@@ -260,6 +326,15 @@ class SubstationFormat(FormatBase):
             fields = [field_to_string(f, getattr(sty, f), sty) for f in STYLE_FIELDS[format_]]
             print("Style: %s" % name, *fields, sep=",", file=fp)
 
+        for heading, prefix, attachments in (("[Fonts]", "fontname", subs.fonts),
+                                             ("[Graphics]", "filename", subs.graphics)):
+            if attachments:
+                print("\n" + heading, file=fp)
+                for name, data in attachments.items():
+                    print(prefix, name, sep=": ", file=fp)
+                    for line in uuencode(data):
+                        print(line, file=fp)
+
         print("\n[Events]", file=fp)
         print(EVENT_FORMAT_LINE[format_], file=fp)
         for ev in subs.events: